@@ -1,22 +1,148 @@
 import json
 
-from src.steps.s01_initialize import step_01_initialize
+from src.steps.s01_initialize import load_master_data
 from src.steps.s02_fetch_devio import step_02_fetch_devio
-from src.steps.s03_fetch_notion import step_03_fetch_notion
+from src.steps.s03_fetch_notion import (
+    NotionScan,
+    PageWriteError,
+    create_client,
+    fetch_filter_properties,
+    scan_pages,
+    sync_pages,
+)
 from src.steps.s04_upload import step_04_upload
 from src.utils.logger import create_logger, logging_function
+from src.utils.master_data_store import MasterDataStore
+from src.utils.models import Changeset, EnvironmentVariables, MasterData
+from src.utils.step_scheduler import Stage, StageTiming, StepScheduler
 
 logger = create_logger(__name__)
 
 
-@logging_function(logger)
-def main():
-    env, master_data = step_01_initialize()
-    flag_devio = step_02_fetch_devio(env=env, master_data=master_data)
-    logger.debug("start fetch notion")
-    flag_notion = step_03_fetch_notion(env=env, master_data=master_data)
+def prepare_notion(*, env: EnvironmentVariables):
+    client_notion = create_client(env=env)
+    filter_properties = fetch_filter_properties(
+        data_source_id=env.notion_data_source_id, client=client_notion
+    )
+    return client_notion, filter_properties
+
+
+def scan_notion(
+    *,
+    env: EnvironmentVariables,
+    master_data: MasterData,
+    client_notion,
+    filter_properties: list[str],
+) -> NotionScan:
+    return scan_pages(
+        env=env,
+        master_data=master_data,
+        client=client_notion,
+        filter_properties=filter_properties,
+    )
+
+
+def sync_notion(
+    *,
+    env: EnvironmentVariables,
+    master_data: MasterData,
+    client_notion,
+    scan_notion: NotionScan,
+    changeset_devio: Changeset,
+) -> tuple[Changeset, PageWriteError | None]:
+    # 記事の更新が終わってから実行し、変更のあった記事を差分の突き合わせに使う
+    try:
+        changeset = sync_pages(
+            env=env,
+            master_data=master_data,
+            client=client_notion,
+            scan=scan_notion,
+            changed_post_urls=changeset_devio.posts,
+        )
+    except PageWriteError as e:
+        # 書き込めたページを保存するため、例外は upload の後で送出し直す
+        return e.changeset, e
+    return changeset, None
+
 
-    step_04_upload(env=env, master_data=master_data)
+def upload(
+    *,
+    env: EnvironmentVariables,
+    master_data: MasterData,
+    store: MasterDataStore,
+    changeset_devio: Changeset,
+    changeset_notion: Changeset,
+    error_notion: PageWriteError | None,
+):
+    step_04_upload(
+        env=env,
+        master_data=master_data,
+        changeset=changeset_devio.merge(changeset_notion),
+        store=store,
+    )
+    if error_notion is not None:
+        raise error_notion
+
+
+# master_data の取得と Notion のプロパティ取得、
+# Contentful からの記事の取得と Notion のページの取得はそれぞれ並行して実行される
+STAGES = [
+    Stage(
+        name="load_master_data",
+        func=load_master_data,
+        inputs=("env",),
+        outputs=("master_data", "store"),
+    ),
+    Stage(
+        name="prepare_notion",
+        func=prepare_notion,
+        inputs=("env",),
+        outputs=("client_notion", "filter_properties"),
+    ),
+    Stage(
+        name="fetch_devio",
+        func=step_02_fetch_devio,
+        inputs=("env", "master_data"),
+        outputs=("changeset_devio",),
+    ),
+    Stage(
+        name="scan_notion",
+        func=scan_notion,
+        inputs=("env", "master_data", "client_notion", "filter_properties"),
+        outputs=("scan_notion",),
+    ),
+    Stage(
+        name="sync_notion",
+        func=sync_notion,
+        inputs=(
+            "env",
+            "master_data",
+            "client_notion",
+            "scan_notion",
+            "changeset_devio",
+        ),
+        outputs=("changeset_notion", "error_notion"),
+    ),
+    Stage(
+        name="upload",
+        func=upload,
+        inputs=(
+            "env",
+            "master_data",
+            "store",
+            "changeset_devio",
+            "changeset_notion",
+            "error_notion",
+        ),
+    ),
+]
+
+
+@logging_function(logger)
+def main() -> list[StageTiming]:
+    scheduler = StepScheduler(stages=STAGES)
+    scheduler.run(values={"env": EnvironmentVariables()})
+    return scheduler.timings
 
 
 if __name__ == "__main__":
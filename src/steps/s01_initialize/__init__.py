@@ -1,3 +1,3 @@
-from .s01_initialize import step_01_initialize
+from .s01_initialize import load_master_data, step_01_initialize
 
-__all__ = ["step_01_initialize"]
+__all__ = ["step_01_initialize", "load_master_data"]
@@ -1,11 +1,23 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import TypedDict
+from functools import partial
+from itertools import batched, islice
+from math import ceil
+from time import time
+from typing import Callable, Iterable, Iterator, TypedDict
+from urllib.parse import urlsplit
 
 import orjson
 
-from src.utils.interval_http_client import http_client_contentful
+from src.utils.entity_cache import CacheEntry, EntityCache
+from src.utils.interval_http_client import (
+    ResponseValidatorCache,
+    http_client_contentful,
+)
 from src.utils.logger import create_logger, logging_function
-from src.utils.models import Author, EnvironmentVariables, MasterData, Post
+from src.utils.models import Author, Changeset, EnvironmentVariables, MasterData, Post
+from src.utils.rate_limiter import rate_limiter
 
 
 class ResponseEntries(TypedDict):
@@ -15,87 +27,435 @@ class ResponseEntries(TypedDict):
     items: list[dict]
 
 
+class PagePosts(TypedDict):
+    total: int
+    posts: list[Post]
+    latest_updated_at: str  # 304 で前回の結果を使った場合は空文字
+    # sys.updatedAt の順に取得した場合の最後の記事の sys.updatedAt (次のページの取得に使う)
+    last_updated_at: str
+
+
 LIMIT_POSTS = 300
+LIMIT_IDS_PER_REQUEST = 100
+KIND_AUTHOR = "author"
+KIND_THUMBNAIL = "thumbnail"
+# 有効期限のこの割合を過ぎたキャッシュは、期限切れになる前にバックグラウンドで取得し直す
+REFRESH_RATIO = 0.8
 
 logger = create_logger(__name__)
 
 
 @logging_function(logger)
-def step_02_fetch_devio(*, env: EnvironmentVariables, master_data: MasterData) -> bool:
-    """DevIOからre:Inventの特集カテゴリの記事を収集する
+def step_02_fetch_devio(
+    *, env: EnvironmentVariables, master_data: MasterData
+) -> Changeset:
+    """DevIOからre:Inventの特集カテゴリの記事を収集し、master_dataの変更内容を返す
 
     注意: master_dataは中身を更新されます (副作用)
     """
-    mapping_all_posts = fetch_mapping_all_posts(
-        base_url=env.base_url_api_contentful,
-        reference_category=env.reference_category,
-        contentful_token=env.contentful_token,
+    rate_limiter.configure(
+        host=urlsplit(env.base_url_api_contentful).netloc,
+        requests_per_sec=env.contentful_requests_per_sec,
+        burst=env.contentful_burst,
+    )
+    # 同時にリクエストするのは、記事のページを取得するスレッド (contentful_max_workers) と
+    # 著者・サムネイルを取得するスレッド (contentful_max_workers + 1)
+    http_client_contentful.configure(
+        max_connections=env.contentful_max_workers * 2 + 1,
+        timeout_sec=env.contentful_timeout_sec,
     )
+    validator_cache = ResponseValidatorCache(validators=master_data.http_validators)
+    entity_cache = EntityCache(
+        path=env.entity_cache_path, max_entries=env.entity_cache_max_entries
+    )
+    ttl_sec_author = env.entity_cache_ttl_hours_author * 3600
+    ttl_sec_thumbnail = env.entity_cache_ttl_hours_thumbnail * 3600
+    now = time()
 
-    union_authors, union_thumbnail_ids, flag_update_post = (
-        update_posts_and_parse_not_existing_resources(
-            mapping_all_posts=mapping_all_posts, master_data=master_data
+    try:
+        author_ids_refresh = parse_ids_to_refresh(
+            ids=master_data.authors.keys(),
+            entries=entity_cache.get_many(
+                kind=KIND_AUTHOR, ids=master_data.authors.keys()
+            ),
+            ttl_sec=ttl_sec_author,
+            now=now,
+        )
+        thumbnail_ids_refresh = parse_ids_to_refresh(
+            ids=master_data.thumbnails.keys(),
+            entries=entity_cache.get_many(
+                kind=KIND_THUMBNAIL, ids=master_data.thumbnails.keys()
+            ),
+            ttl_sec=ttl_sec_thumbnail,
+            now=now,
         )
-    )
 
-    mapping_authors = fetch_mapping_authors(
-        base_url=env.base_url_api_contentful,
-        union_authors=union_authors,
-        contentful_token=env.contentful_token,
+        # 1ワーカーは期限の近いキャッシュの取得し直しに、残りは新たに見つかった著者・サムネイルの取得に使う
+        with ThreadPoolExecutor(max_workers=env.contentful_max_workers + 1) as executor:
+            # 期限の近い著者・サムネイルは、記事の取得と並行してバックグラウンドで取得し直す
+            future_refresh = executor.submit(
+                refresh_authors_and_thumbnails,
+                base_url=env.base_url_api_contentful,
+                author_ids=author_ids_refresh,
+                thumbnail_ids=thumbnail_ids_refresh,
+                contentful_token=env.contentful_token,
+                validator_cache=validator_cache,
+                master_data=master_data,
+            )
+
+            fetcher_authors = BatchFetcher(
+                executor=executor,
+                fetch=lambda ids: fetch_mapping_authors(
+                    base_url=env.base_url_api_contentful,
+                    union_authors=ids,
+                    contentful_token=env.contentful_token,
+                    validator_cache=validator_cache,
+                    cached_authors=master_data.authors,
+                ),
+            )
+            fetcher_thumbnails = BatchFetcher(
+                executor=executor,
+                fetch=lambda ids: fetch_mapping_thumbnails(
+                    base_url=env.base_url_api_contentful,
+                    union_thumbnail_ids=ids,
+                    contentful_token=env.contentful_token,
+                    validator_cache=validator_cache,
+                    cached_thumbnails=master_data.thumbnails,
+                ),
+            )
+            mapping_authors_restored = {}
+            mapping_thumbnails_restored = {}
+            updated_post_urls = set()
+            latest_updated_at = ""
+
+            # 記事はページを受け取った順に反映し、見つかった著者・サムネイルはその場で取得を始める
+            updated_since = parse_updated_since(env=env, master_data=master_data)
+            if updated_since:
+                pages = iterate_pages_posts_updated_since(
+                    base_url=env.base_url_api_contentful,
+                    reference_category=env.reference_category,
+                    contentful_token=env.contentful_token,
+                    updated_since=updated_since,
+                    validator_cache=validator_cache,
+                    cached_posts=master_data.posts,
+                )
+            else:
+                pages = iterate_pages_posts(
+                    base_url=env.base_url_api_contentful,
+                    reference_category=env.reference_category,
+                    contentful_token=env.contentful_token,
+                    max_workers=env.contentful_max_workers,
+                    validator_cache=validator_cache,
+                    cached_posts=master_data.posts,
+                )
+            for page in pages:
+                c_authors, c_thumbnail_ids, c_updated_post_urls = (
+                    update_posts_and_parse_not_existing_resources(
+                        posts=page["posts"], master_data=master_data
+                    )
+                )
+                updated_post_urls.update(c_updated_post_urls)
+                # ISO 8601 (UTC) の文字列なので辞書順の比較で新旧を判定できる
+                latest_updated_at = max(latest_updated_at, page["latest_updated_at"])
+
+                # master_data に無くても、キャッシュに期限内のものがあればそれを使う
+                c_authors = {
+                    x
+                    for x in c_authors
+                    if x not in fetcher_authors.seen
+                    and x not in mapping_authors_restored
+                }
+                c_authors_restored, c_authors = restore_from_cache(
+                    ids=c_authors,
+                    entries=entity_cache.get_many(kind=KIND_AUTHOR, ids=c_authors),
+                    ttl_sec=ttl_sec_author,
+                    now=now,
+                )
+                mapping_authors_restored.update(c_authors_restored)
+                fetcher_authors.add(ids=c_authors)
+
+                c_thumbnail_ids = {
+                    x
+                    for x in c_thumbnail_ids
+                    if x not in fetcher_thumbnails.seen
+                    and x not in mapping_thumbnails_restored
+                }
+                c_thumbnails_restored, c_thumbnail_ids = restore_from_cache(
+                    ids=c_thumbnail_ids,
+                    entries=entity_cache.get_many(
+                        kind=KIND_THUMBNAIL, ids=c_thumbnail_ids
+                    ),
+                    ttl_sec=ttl_sec_thumbnail,
+                    now=now,
+                )
+                mapping_thumbnails_restored.update(c_thumbnails_restored)
+                fetcher_thumbnails.add(ids=c_thumbnail_ids)
+
+            mapping_authors = fetcher_authors.result()
+            mapping_thumbnails = fetcher_thumbnails.result()
+            mapping_authors_refreshed, mapping_thumbnails_refreshed = (
+                future_refresh.result()
+            )
+
+        mapping_authors = {**mapping_authors_refreshed, **mapping_authors}
+        mapping_thumbnails = {**mapping_thumbnails_refreshed, **mapping_thumbnails}
+        entity_cache.put_many(
+            kind=KIND_AUTHOR,
+            values={k: v.model_dump_json() for k, v in mapping_authors.items()},
+            fetched_at=now,
+        )
+        entity_cache.put_many(
+            kind=KIND_THUMBNAIL, values=mapping_thumbnails, fetched_at=now
+        )
+        entity_cache.evict()
+    finally:
+        entity_cache.close()
+
+    updated_author_ids, updated_thumbnail_ids = update_thumbnails_and_authors(
+        mapping_authors={
+            **{
+                k: Author.model_validate_json(v)
+                for k, v in mapping_authors_restored.items()
+            },
+            **mapping_authors,
+        },
+        mapping_thumbnails={**mapping_thumbnails_restored, **mapping_thumbnails},
+        master_data=master_data,
     )
 
-    mapping_thumbnails = fetch_mapping_thumbnails(
-        base_url=env.base_url_api_contentful,
-        union_thumbnail_ids=union_thumbnail_ids,
-        contentful_token=env.contentful_token,
+    # 著者・サムネイルまで反映し終えてから進める (途中で失敗した場合は次回に再取得させる)
+    is_cursor_updated = (
+        latest_updated_at > master_data.contentful_updated_at
+        or validator_cache.validators_next != master_data.http_validators
     )
-
-    flag_update_author_and_thumbnail = update_thumbnails_and_authors(
-        mapping_authors=mapping_authors,
-        mapping_thumbnails=mapping_thumbnails,
-        master_data=master_data,
+    if latest_updated_at > master_data.contentful_updated_at:
+        master_data.contentful_updated_at = latest_updated_at
+    master_data.http_validators = validator_cache.validators_next
+
+    return Changeset(
+        posts=updated_post_urls,
+        authors=updated_author_ids,
+        thumbnails=updated_thumbnail_ids,
+        cursors=is_cursor_updated,
     )
 
-    return flag_update_post or flag_update_author_and_thumbnail
 
+@logging_function(logger)
+def parse_ids_to_refresh(
+    *, ids: Iterable[str], entries: dict[str, CacheEntry], ttl_sec: float, now: float
+) -> set[str]:
+    # キャッシュに無いもの (キャッシュを消した場合など) も取得し直す
+    return {
+        x
+        for x in ids
+        if x not in entries or now - entries[x].fetched_at >= ttl_sec * REFRESH_RATIO
+    }
 
-def fetch_mapping_all_posts(
-    *, base_url: str, reference_category: str, contentful_token: str
-) -> dict[str, Post]:
-    total = 0
-    index = 0
-    is_first = True
 
-    result = {}
-    while is_first or index * LIMIT_POSTS <= total:
-        if is_first:
-            is_first = False
-        url = create_url_fetching_posts(
-            base_url=base_url, reference_category=reference_category, index=index
+@logging_function(logger)
+def restore_from_cache(
+    *, ids: set[str], entries: dict[str, CacheEntry], ttl_sec: float, now: float
+) -> tuple[dict[str, str], set[str]]:
+    """期限内のキャッシュがあるものはその値を、無いものは取得が必要なIDとして返す"""
+    restored = {}
+    remaining = set()
+    for x in ids:
+        entry = entries.get(x)
+        if entry and now - entry.fetched_at < ttl_sec:
+            restored[x] = entry.value
+        else:
+            remaining.add(x)
+    return restored, remaining
+
+
+def refresh_authors_and_thumbnails(
+    *,
+    base_url: str,
+    author_ids: set[str],
+    thumbnail_ids: set[str],
+    contentful_token: str,
+    validator_cache: ResponseValidatorCache,
+    master_data: MasterData,
+) -> tuple[dict[str, Author], dict[str, str]]:
+    # バックグラウンドでの更新に失敗しても、master_data の値を使い続けるだけなので処理は止めない
+    try:
+        mapping_authors = fetch_mapping_authors(
+            base_url=base_url,
+            union_authors=author_ids,
+            contentful_token=contentful_token,
+            validator_cache=validator_cache,
+            cached_authors=master_data.authors,
+        )
+        mapping_thumbnails = fetch_mapping_thumbnails(
+            base_url=base_url,
+            union_thumbnail_ids=thumbnail_ids,
+            contentful_token=contentful_token,
+            validator_cache=validator_cache,
+            cached_thumbnails=master_data.thumbnails,
+        )
+        return mapping_authors, mapping_thumbnails
+    except Exception as e:
+        logger.warning(
+            "failed to refresh authors and thumbnails",
+            exc_info=True,
+            data={"ErrorType": str(type(e)), "ErrorMessage": str(e)},
+        )
+        return {}, {}
+
+
+@logging_function(logger)
+def parse_updated_since(
+    *, env: EnvironmentVariables, master_data: MasterData
+) -> str | None:
+    if env.contentful_full_scan or not master_data.contentful_updated_at:
+        return None
+    return master_data.contentful_updated_at
+
+
+def iterate_pages_posts(
+    *,
+    base_url: str,
+    reference_category: str,
+    contentful_token: str,
+    max_workers: int,
+    validator_cache: ResponseValidatorCache,
+    cached_posts: dict[str, Post],
+) -> Iterator[PagePosts]:
+    """全ての記事をページ単位で skip の順に返す
+
+    呼び出し側がページを処理している間も、max_workers ページ先までを並列に先読みする
+    (保持するのは max_workers + 1 ページ分まで)。
+    """
+    fetch = partial(
+        fetch_page_posts,
+        base_url=base_url,
+        reference_category=reference_category,
+        contentful_token=contentful_token,
+        updated_since=None,
+        validator_cache=validator_cache,
+        cached_posts=cached_posts,
+    )
+
+    # 1ページ目で total が判明したら、残りのページは並列に取得する
+    first_page: PagePosts = fetch(skip=0)
+    indexes = iter(range(1, ceil(first_page["total"] / LIMIT_POSTS)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # 取得を始めた順に返すので、反映結果は逐次取得時と同じになる
+        futures = deque(
+            executor.submit(fetch, skip=x * LIMIT_POSTS)
+            for x in islice(indexes, max_workers)
         )
+        yield first_page
+        while futures:
+            page = futures.popleft().result()
+            for index in islice(indexes, 1):
+                futures.append(executor.submit(fetch, skip=index * LIMIT_POSTS))
+            yield page
+
 
-        resp = http_client_contentful.get(
-            url=url, headers={"Authorization": f"Bearer {contentful_token}"}
+def iterate_pages_posts_updated_since(
+    *,
+    base_url: str,
+    reference_category: str,
+    contentful_token: str,
+    updated_since: str,
+    validator_cache: ResponseValidatorCache,
+    cached_posts: dict[str, Post],
+) -> Iterator[PagePosts]:
+    """updated_since 以降に更新された記事を sys.updatedAt の順に1ページずつ返す
+
+    skip で読み進めると、取得中に更新された記事が末尾へ移って以降の位置が1つずつずれ、
+    記事を取りこぼしたまま記録する時刻だけが進んでしまう。そのため、ページの最後の記事の
+    sys.updatedAt 以降を取得し直して読み進める (同時刻の記事は再取得されるが差分判定で無視される)。
+    1ページ全てが同時刻の記事だった場合のみ、同時刻の記事を skip で読み進める。
+    """
+    cursor = updated_since
+    skip = 0
+    while True:
+        page = fetch_page_posts(
+            base_url=base_url,
+            reference_category=reference_category,
+            contentful_token=contentful_token,
+            skip=skip,
+            updated_since=cursor,
+            validator_cache=validator_cache,
+            cached_posts=cached_posts,
         )
+        yield page
+        if skip + len(page["posts"]) >= page["total"]:
+            return
+        if page["last_updated_at"] > cursor:
+            cursor, skip = page["last_updated_at"], 0
+        else:
+            skip += len(page["posts"])
 
-        binary = resp.read()
-        raw: ResponseEntries = orjson.loads(binary)
-        total = raw["total"]
 
-        for item in raw["items"]:
-            post = convert_to_post(item=item)
-            result[post.url] = post
+def fetch_page_posts(
+    *,
+    base_url: str,
+    reference_category: str,
+    contentful_token: str,
+    skip: int,
+    updated_since: str | None,
+    validator_cache: ResponseValidatorCache,
+    cached_posts: dict[str, Post],
+) -> PagePosts:
+    url = create_url_fetching_posts(
+        base_url=base_url,
+        reference_category=reference_category,
+        skip=skip,
+        updated_since=updated_since,
+    )
 
-        index += 1
+    validator = validator_cache.get(url=url)
+    if validator and not all(x in cached_posts for x in validator.keys):
+        validator = None
+    resp = http_client_contentful.get(
+        url=url,
+        headers={"Authorization": f"Bearer {contentful_token}"},
+        validator=validator,
+    )
+    if resp.status_code == 304:
+        # 前回から変わっていないので、前回変換した記事をそのまま使う
+        validator_cache.keep(url=url)
+        return PagePosts(
+            total=validator.total,
+            posts=[cached_posts[x] for x in validator.keys],
+            latest_updated_at="",
+            last_updated_at=validator.cursor,
+        )
 
-    return result
+    binary = resp.read()
+    raw: ResponseEntries = orjson.loads(binary)
+    posts = [convert_to_post(item=x) for x in raw["items"]]
+    last_updated_at = raw["items"][-1]["sys"]["updatedAt"] if raw["items"] else ""
+    validator_cache.put(
+        url=url,
+        resp=resp,
+        keys=[x.url for x in posts],
+        total=raw["total"],
+        cursor=last_updated_at,
+    )
+    return PagePosts(
+        total=raw["total"],
+        posts=posts,
+        latest_updated_at=max(
+            (x["sys"]["updatedAt"] for x in raw["items"]), default=""
+        ),
+        last_updated_at=last_updated_at,
+    )
 
 
 @logging_function(logger)
 def create_url_fetching_posts(
-    *, base_url: str, reference_category: str, index: int
+    *, base_url: str, reference_category: str, skip: int, updated_since: str | None
 ) -> str:
-    return f"{base_url}/public/entries?fields.referenceCategory.en-US.sys.id={reference_category}&content_type=blogPost&skip={index * LIMIT_POSTS}&limit={LIMIT_POSTS}"
+    url = f"{base_url}/public/entries?fields.referenceCategory.en-US.sys.id={reference_category}&content_type=blogPost&skip={skip}&limit={LIMIT_POSTS}"
+    if updated_since:
+        # 同時刻に更新された記事を取りこぼさないよう gte で取得する (再取得しても差分判定で無視される)
+        # 同時刻の記事を skip で読み進める場合に並びが変わらないよう、sys.id でも並べる
+        url += f"&sys.updatedAt[gte]={updated_since}&order=sys.updatedAt,sys.id"
+    return url
 
 
 @logging_function(logger)
@@ -141,19 +501,19 @@ def convert_to_post(*, item: dict) -> Post:
 
 @logging_function(logger)
 def update_posts_and_parse_not_existing_resources(
-    *, mapping_all_posts: dict[str, Post], master_data: MasterData
-) -> tuple[set[str], set[str], bool]:
-    # master_data.postsに副作用あり
+    *, posts: Iterable[Post], master_data: MasterData
+) -> tuple[set[str], set[str], set[str]]:
+    # master_data.postsに副作用あり (同じURLの記事が複数ある場合は後のものが残る)
 
     union_authors = set()
     union_thumbnail_ids = set()
 
-    flag_update = False
-    for post_id, post_value in mapping_all_posts.items():
-        m_post = master_data.posts.get(post_id)
+    updated_post_urls = set()
+    for post_value in posts:
+        m_post = master_data.posts.get(post_value.url)
         if m_post is None or post_value != m_post:
             master_data.posts[post_value.url] = post_value
-            flag_update = True
+            updated_post_urls.add(post_value.url)
         if post_value.author_id not in master_data.authors:
             union_authors.add(post_value.author_id)
         if (
@@ -162,31 +522,93 @@ def update_posts_and_parse_not_existing_resources(
         ):
             union_thumbnail_ids.add(post_value.thumbnail_id)
 
-    return union_authors, union_thumbnail_ids, flag_update
+    return union_authors, union_thumbnail_ids, updated_post_urls
+
+
+class BatchFetcher:
+    """受け取ったIDを LIMIT_IDS_PER_REQUEST 件ずつまとめ、揃ったものからバックグラウンドで取得する"""
+
+    executor: ThreadPoolExecutor
+    fetch: Callable[[set[str]], dict]
+    seen: set[str]  # 一度でも受け取ったID (重複して取得しない)
+    pending: set[str]
+    futures: list[Future[dict]]
+
+    def __init__(
+        self, *, executor: ThreadPoolExecutor, fetch: Callable[[set[str]], dict]
+    ):
+        self.executor = executor
+        self.fetch = fetch
+        self.seen = set()
+        self.pending = set()
+        self.futures = []
+
+    def add(self, *, ids: Iterable[str]):
+        for x in ids:
+            if x in self.seen:
+                continue
+            self.seen.add(x)
+            self.pending.add(x)
+            if len(self.pending) >= LIMIT_IDS_PER_REQUEST:
+                self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.futures.append(self.executor.submit(self.fetch, self.pending))
+            self.pending = set()
+
+    def result(self) -> dict:
+        """残りのIDも取得し、全ての取得結果をまとめて返す"""
+        self.flush()
+        result = {}
+        for future in self.futures:
+            result.update(future.result())
+        return result
 
 
 @logging_function(logger)
 def fetch_mapping_authors(
-    *, base_url: str, union_authors: set[str], contentful_token: str
+    *,
+    base_url: str,
+    union_authors: set[str],
+    contentful_token: str,
+    validator_cache: ResponseValidatorCache,
+    cached_authors: dict[str, Author],
 ) -> dict[str, Author]:
     result = {}
     headers = {"Authorization": f"Bearer {contentful_token}"}
 
-    for author_id in union_authors:
-        url = create_url_fetching_author(base_url=base_url, author_id=author_id)
-        resp = http_client_contentful.get(url=url, headers=headers)
+    for author_ids in batched(sorted(union_authors), LIMIT_IDS_PER_REQUEST):
+        url = create_url_fetching_authors(base_url=base_url, author_ids=author_ids)
+        validator = validator_cache.get(url=url)
+        if validator and not all(x in cached_authors for x in validator.keys):
+            validator = None
+        resp = http_client_contentful.get(url=url, headers=headers, validator=validator)
+        if resp.status_code == 304:
+            validator_cache.keep(url=url)
+            for author_id in validator.keys:
+                result[author_id] = cached_authors[author_id]
+            continue
+
         binary = resp.read()
         raw: ResponseEntries = orjson.loads(binary)
-        author = convert_to_author(payload=raw)
-        if author:
-            result[author.id] = author
+        keys = []
+        for item in raw["items"]:
+            # 1件ずつ取得した時と同じ形に揃えて convert_to_author に渡す
+            author = convert_to_author(
+                payload={"total": 1, "skip": 0, "limit": 1, "items": [item]}
+            )
+            if author:
+                result[author.id] = author
+                keys.append(author.id)
+        validator_cache.put(url=url, resp=resp, keys=keys)
 
     return result
 
 
 @logging_function(logger)
-def create_url_fetching_author(*, base_url: str, author_id: str) -> str:
-    return f"{base_url}/entries?sys.id={author_id}&content_type=authorProfile"
+def create_url_fetching_authors(*, base_url: str, author_ids: tuple[str, ...]) -> str:
+    return f"{base_url}/entries?sys.id[in]={','.join(author_ids)}&content_type=authorProfile&limit={LIMIT_IDS_PER_REQUEST}"
 
 
 @logging_function(logger)
@@ -210,27 +632,49 @@ def convert_to_author(*, payload: ResponseEntries) -> Author | None:
 
 @logging_function(logger)
 def fetch_mapping_thumbnails(
-    *, base_url: str, union_thumbnail_ids: set[str], contentful_token: str
+    *,
+    base_url: str,
+    union_thumbnail_ids: set[str],
+    contentful_token: str,
+    validator_cache: ResponseValidatorCache,
+    cached_thumbnails: dict[str, str],
 ) -> dict[str, str]:
     result = {}
     headers = {"Authorization": f"Bearer {contentful_token}"}
 
-    for thumbnail_id in union_thumbnail_ids:
-        url = create_url_thumbnail(base_url=base_url, thumbnail_id=thumbnail_id)
+    for thumbnail_ids in batched(sorted(union_thumbnail_ids), LIMIT_IDS_PER_REQUEST):
+        url = create_url_thumbnails(base_url=base_url, thumbnail_ids=thumbnail_ids)
+        validator = validator_cache.get(url=url)
+        if validator and not all(x in cached_thumbnails for x in validator.keys):
+            validator = None
 
-        resp = http_client_contentful.get(url=url, headers=headers)
+        resp = http_client_contentful.get(url=url, headers=headers, validator=validator)
+        if resp.status_code == 304:
+            validator_cache.keep(url=url)
+            for thumbnail_id in validator.keys:
+                result[thumbnail_id] = cached_thumbnails[thumbnail_id]
+            continue
 
         binary = resp.read()
-        raw = orjson.loads(binary)
-        base = raw["fields"]["file"]["en-US"]["url"]
-        result[thumbnail_id] = f"https:{base}"
+        raw: ResponseEntries = orjson.loads(binary)
+        for asset in raw["items"]:
+            result[asset["sys"]["id"]] = convert_to_thumbnail_url(asset=asset)
+        validator_cache.put(
+            url=url, resp=resp, keys=[x["sys"]["id"] for x in raw["items"]]
+        )
 
     return result
 
 
 @logging_function(logger)
-def create_url_thumbnail(*, base_url: str, thumbnail_id: str) -> str:
-    return f"{base_url}/assets/{thumbnail_id}"
+def create_url_thumbnails(*, base_url: str, thumbnail_ids: tuple[str, ...]) -> str:
+    return f"{base_url}/assets?sys.id[in]={','.join(thumbnail_ids)}&limit={LIMIT_IDS_PER_REQUEST}"
+
+
+@logging_function(logger)
+def convert_to_thumbnail_url(*, asset: dict) -> str:
+    base = asset["fields"]["file"]["en-US"]["url"]
+    return f"https:{base}"
 
 
 @logging_function(logger)
@@ -239,18 +683,19 @@ def update_thumbnails_and_authors(
     mapping_authors: dict[str, Author],
     mapping_thumbnails: dict[str, str],
     master_data: MasterData,
-) -> bool:
-    flag_update = False
+) -> tuple[set[str], set[str]]:
+    updated_author_ids = set()
     for author_id, author_value in mapping_authors.items():
         m_author_value = master_data.authors.get(author_id)
         if m_author_value is None or author_value != m_author_value:
             master_data.authors[author_id] = author_value
-            flag_update = True
+            updated_author_ids.add(author_id)
 
+    updated_thumbnail_ids = set()
     for thumbnail_id, thumbnail_url in mapping_thumbnails.items():
         m_thumbnail_url = master_data.thumbnails.get(thumbnail_id)
         if m_thumbnail_url is None or thumbnail_url != m_thumbnail_url:
             master_data.thumbnails[thumbnail_id] = thumbnail_url
-            flag_update = True
+            updated_thumbnail_ids.add(thumbnail_id)
 
-    return flag_update
+    return updated_author_ids, updated_thumbnail_ids
@@ -1,3 +1,19 @@
-from .s03_fetch_notion import step_03_fetch_notion
+from .s03_fetch_notion import (
+    NotionScan,
+    PageWriteError,
+    create_client,
+    fetch_filter_properties,
+    scan_pages,
+    step_03_fetch_notion,
+    sync_pages,
+)
 
-__all__ = ["step_03_fetch_notion"]
+__all__ = [
+    "step_03_fetch_notion",
+    "create_client",
+    "fetch_filter_properties",
+    "scan_pages",
+    "sync_pages",
+    "NotionScan",
+    "PageWriteError",
+]
@@ -1,55 +1,266 @@
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from sys import intern
+from typing import Callable, Iterable, Mapping, TypedDict
+
 from notion_client import Client
-from notion_client.helpers import collect_paginated_api
 
-from src.utils.logger import create_logger, logging_function
-from src.utils.models import EnvironmentVariables, MasterData, MetaPost
-from src.utils.notion import create_notion_client
+from src.utils.logger import create_logger, logging_function, logging_settings
+from src.utils.models import Changeset, EnvironmentVariables, MasterData, MetaPost
+from src.utils.notion import create_notion_client, iterate_paginated_api_prefetched
+
+# convert_to_meta_post が参照するプロパティ (これ以外はクエリ結果に含めない)
+PROPERTY_NAMES_META_POST = (
+    "title",
+    "old_title",
+    "url",
+    "category",
+    "tags",
+    "fixed",
+    "unixtime_ms",
+)
 
 logger = create_logger(__name__)
 
 
+class NotionScan(TypedDict):
+    meta_posts: dict[str, MetaPost]  # key: url
+    categories: dict[str, str]  # key: id, value: name
+    tags: dict[str, str]  # key: id, value: name
+    latest_edited_time: str
+    is_full_scan: bool
+    scanned_at: datetime
+
+
+class PageWriteError(Exception):
+    """ページの作成・更新の一部が失敗した
+
+    成功した書き込みは master_data に反映済みで、その変更内容を changeset に持つ。
+    呼び出し側は changeset の分を保存してから例外を送出し直す
+    (保存しないと、作成済みのページが次回の全件突き合わせで重複して作成される)。
+    """
+
+    errors: list[Exception]
+    changeset: Changeset
+
+    def __init__(self, *, errors: list[Exception], changeset: Changeset):
+        super().__init__(f"failed to write {len(errors)} pages to Notion")
+        self.errors = errors
+        self.changeset = changeset
+
+
 @logging_function(logger)
-def step_03_fetch_notion(*, env: EnvironmentVariables, master_data: MasterData) -> bool:
-    client = create_notion_client(notion_token=env.notion_token)
-    mapping_meta_posts, mapping_categories, mapping_tags = list_pages(
+def step_03_fetch_notion(
+    *,
+    env: EnvironmentVariables,
+    master_data: MasterData,
+    changed_post_urls: Iterable[str] | None = None,
+) -> Changeset:
+    client = create_client(env=env)
+    filter_properties = fetch_filter_properties(
         data_source_id=env.notion_data_source_id, client=client
     )
-    union_insert, union_update = parse_process_target_post_urls(
-        mapping_meta_posts=mapping_meta_posts, master_data=master_data
+    scan = scan_pages(
+        env=env,
+        master_data=master_data,
+        client=client,
+        filter_properties=filter_properties,
+    )
+    return sync_pages(
+        env=env,
+        master_data=master_data,
+        client=client,
+        scan=scan,
+        changed_post_urls=changed_post_urls,
+    )
+
+
+@logging_function(logger)
+def create_client(*, env: EnvironmentVariables) -> Client:
+    return create_notion_client(
+        notion_token=env.notion_token,
+        requests_per_sec=env.notion_requests_per_sec,
+        burst=env.notion_burst,
+        base_url=env.base_url_api_notion,
+    )
+
+
+@logging_function(logger, with_return=False)
+def scan_pages(
+    *,
+    env: EnvironmentVariables,
+    master_data: MasterData,
+    client: Client,
+    filter_properties: list[str],
+) -> NotionScan:
+    """データソースのページを取得する
+
+    master_data は差分取得の起点を読むだけなので、step_02_fetch_devio と並行して実行してよい。
+    """
+    dt_now = datetime.now(tz=timezone.utc)
+    is_full_scan = is_required_full_scan(
+        env=env, master_data=master_data, dt_now=dt_now
     )
-    flag_insert = insert_meta_posts(
+    mapping_meta_posts, mapping_categories, mapping_tags, latest_edited_time = (
+        list_pages(
+            data_source_id=env.notion_data_source_id,
+            client=client,
+            filter_properties=filter_properties,
+            edited_since=None if is_full_scan else master_data.notion_last_edited_time,
+        )
+    )
+    return NotionScan(
+        meta_posts=mapping_meta_posts,
+        categories=mapping_categories,
+        tags=mapping_tags,
+        latest_edited_time=latest_edited_time,
+        is_full_scan=is_full_scan,
+        scanned_at=dt_now,
+    )
+
+
+@logging_function(logger)
+def sync_pages(
+    *,
+    env: EnvironmentVariables,
+    master_data: MasterData,
+    client: Client,
+    scan: NotionScan,
+    changed_post_urls: Iterable[str] | None = None,
+) -> Changeset:
+    """取得したページと記事を突き合わせてページを作成・更新し、master_data に反映する
+
+    記事 (master_data.posts) を参照するため、step_02_fetch_devio の完了後に実行する。
+    changed_post_urls (step_02_fetch_devio で変更のあった記事) を渡した場合、
+    差分取得時は変更のあった記事・ページと、ページの無い記事だけを突き合わせる。
+    """
+    mapping_meta_posts: Mapping[str, MetaPost] = scan["meta_posts"]
+    target_urls: Iterable[str] = master_data.posts.keys()
+    if not scan["is_full_scan"]:
+        # 差分取得時は変更のあったページのみなので、前回までの内容に重ねて参照する (コピーはしない)
+        mapping_meta_posts = ChainMap(mapping_meta_posts, master_data.meta_posts)
+        if changed_post_urls is not None:
+            target_urls = parse_incremental_target_urls(
+                changed_post_urls=changed_post_urls,
+                scanned_urls=scan["meta_posts"].keys(),
+                master_data=master_data,
+            )
+
+    union_insert, union_update, updated_urls = parse_process_target_post_urls(
+        target_urls=target_urls,
+        mapping_meta_posts=mapping_meta_posts,
+        master_data=master_data,
+    )
+    pages_inserted, errors_inserted = insert_meta_posts(
         union_insert=union_insert,
         notion_data_source_id=env.notion_data_source_id,
         master_data=master_data,
         client=client,
+        max_workers=env.notion_max_workers,
     )
 
-    flag_update = update_meta_posts(
-        union_update=union_update, master_data=master_data, client=client
+    pages_updated, errors_updated = update_meta_posts(
+        union_update=union_update,
+        master_data=master_data,
+        client=client,
+        max_workers=env.notion_max_workers,
     )
 
-    master_data.categories = mapping_categories
-    master_data.tags = mapping_tags
+    is_categories_changed = merge_mapping(
+        target=master_data.categories,
+        source=scan["categories"],
+        is_replace=scan["is_full_scan"],
+    )
+    is_tags_changed = merge_mapping(
+        target=master_data.tags, source=scan["tags"], is_replace=scan["is_full_scan"]
+    )
+    # 書き込み結果は最後にまとめて master_data へ反映する
+    written_urls, is_categories_written, is_tags_written = apply_written_pages(
+        pages=pages_inserted + pages_updated, master_data=master_data
+    )
+    is_cursor_updated = scan["is_full_scan"]
+    if scan["latest_edited_time"] > master_data.notion_last_edited_time:
+        master_data.notion_last_edited_time = scan["latest_edited_time"]
+        is_cursor_updated = True
+    if scan["is_full_scan"]:
+        master_data.notion_reconciled_at = scan["scanned_at"].isoformat()
+
+    changeset = Changeset(
+        meta_posts=updated_urls | written_urls,
+        categories=is_categories_changed or is_categories_written,
+        tags=is_tags_changed or is_tags_written,
+        cursors=is_cursor_updated,
+    )
+    errors = errors_inserted + errors_updated
+    if errors:
+        # 書き込めなかった記事は差分の突き合わせでは対象にならないので、次回は全件を突き合わせる
+        master_data.notion_reconciled_at = ""
+        changeset = changeset.merge(Changeset(cursors=True))
+        raise PageWriteError(errors=errors, changeset=changeset) from errors[0]
+    return changeset
 
-    return flag_insert or flag_update
+
+@logging_function(logger, with_args=False)
+def merge_mapping(
+    *, target: dict[str, str], source: dict[str, str], is_replace: bool
+) -> bool:
+    """source を target にその場でマージし、target が変わったかを返す
+
+    is_replace=True の場合は source に無いキーを target から削除する (全件取得時)。
+    """
+    is_changed = False
+    if is_replace:
+        for key in [x for x in target if x not in source]:
+            del target[key]
+            is_changed = True
+    for key, value in source.items():
+        if target.get(key) != value:
+            target[key] = value
+            is_changed = True
+    return is_changed
 
 
 @logging_function(logger)
+def is_required_full_scan(
+    *, env: EnvironmentVariables, master_data: MasterData, dt_now: datetime
+) -> bool:
+    # 差分取得ではNotion側で削除されたページを検知できないため、定期的に全件取得する
+    if env.notion_full_scan or not master_data.notion_last_edited_time:
+        return True
+    if not master_data.notion_reconciled_at:
+        return True
+    dt_reconciled = datetime.fromisoformat(master_data.notion_reconciled_at)
+    interval = timedelta(hours=env.notion_full_reconcile_interval_hours)
+    return dt_now - dt_reconciled >= interval
+
+
+@logging_function(logger)
+def fetch_filter_properties(*, data_source_id: str, client: Client) -> list[str]:
+    # filter_properties にはプロパティ名ではなくプロパティIDを指定する
+    data_source = client.data_sources.retrieve(data_source_id=data_source_id)
+    properties: dict[str, dict] = data_source["properties"]
+    return [properties[x]["id"] for x in PROPERTY_NAMES_META_POST]
+
+
+# 生のページは大きいため、引数は記録しない (必要な場合は LOG_NOTION_RAW_PAGES で記録する)
+@logging_function(logger, with_args=False)
 def convert_to_meta_post(
     *, page: dict
 ) -> tuple[MetaPost, dict[str, str], dict[str, str]]:
     props: dict = page["properties"]
 
+    # カテゴリ・タグのIDと名前は多くのページで繰り返されるため、intern して同じ文字列を共有する
     def parse_category() -> tuple[str | None, str | None]:
         select: dict[str, str] | None = props["category"]["select"]
         if select is None:
             return None, None
         else:
-            return select["id"], select["name"]
+            return intern(select["id"]), intern(select["name"])
 
     def parse_tags() -> dict[str, str]:
         multi_select: list[dict[str, str]] = props["tags"]["multi_select"]
-        return {x["id"]: x["name"] for x in multi_select}
+        return {intern(x["id"]): intern(x["name"]) for x in multi_select}
 
     category_id, category_name = parse_category()
     if category_id:
@@ -74,32 +285,85 @@ def convert_to_meta_post(
 
 @logging_function(logger)
 def list_pages(
-    *, data_source_id: str, client: Client
-) -> tuple[dict[str, MetaPost], dict[str, str], dict[str, str]]:
+    *,
+    data_source_id: str,
+    client: Client,
+    filter_properties: list[str],
+    edited_since: str | None = None,
+) -> tuple[dict[str, MetaPost], dict[str, str], dict[str, str], str]:
+    """データソースのページを取得し、ページの last_edited_time の最大値とあわせて返す
+
+    edited_since を指定した場合は、その時刻以降に編集されたページのみを取得する。
+    次のページを先読みしながら、受け取ったページから順に変換する。
+    """
     mapping_meta_posts = {}
     mapping_categories = {}
     mapping_tags = {}
+    latest_edited_time = ""
+
+    kwargs = {}
+    if edited_since:
+        # last_edited_time は分単位に丸められているため on_or_after で取得する
+        kwargs["filter"] = {
+            "timestamp": "last_edited_time",
+            "last_edited_time": {"on_or_after": edited_since},
+        }
 
-    for page in collect_paginated_api(
-        client.data_sources.query, data_source_id=data_source_id
+    for page in iterate_paginated_api_prefetched(
+        client.data_sources.query,
+        data_source_id=data_source_id,
+        filter_properties=filter_properties,
+        **kwargs,
     ):
-        logger.debug("fetching page", data={"page": page})
+        if logging_settings.log_notion_raw_pages:
+            logger.debug("fetching page", data={"page": page})
         c_post, c_mapping_categories, c_mapping_tags = convert_to_meta_post(page=page)
         mapping_meta_posts[c_post.url] = c_post
-        mapping_categories = {**mapping_categories, **c_mapping_categories}
-        mapping_tags = {**mapping_tags, **c_mapping_tags}
+        # ページごとに辞書を作り直すとページ数の2乗になるため、その場で追加する
+        mapping_categories.update(c_mapping_categories)
+        mapping_tags.update(c_mapping_tags)
+        latest_edited_time = max(latest_edited_time, page["last_edited_time"])
 
-    return mapping_meta_posts, mapping_categories, mapping_tags
+    return mapping_meta_posts, mapping_categories, mapping_tags, latest_edited_time
 
 
-@logging_function(logger)
+@logging_function(logger, with_args=False)
+def parse_incremental_target_urls(
+    *,
+    changed_post_urls: Iterable[str],
+    scanned_urls: Iterable[str],
+    master_data: MasterData,
+) -> set[str]:
+    """差分取得時に突き合わせる記事のURL
+
+    前回の実行で全ての記事はページと突き合わせ済みなので、それ以降に変わり得るのは
+    記事が変わったもの、ページが変わったもの、ページがまだ無いものに限られる。
+    キーだけを使うので、遅延読み込みの記事・メタ情報を検証せずに済む。
+    """
+    return (
+        set(changed_post_urls)
+        | set(scanned_urls)
+        | (master_data.posts.keys() - master_data.meta_posts.keys())
+    )
+
+
+# mapping_meta_posts は ChainMap の場合があり、そのままでは要約されずに全件が記録されるため引数は記録しない
+@logging_function(logger, with_args=False)
 def parse_process_target_post_urls(
-    *, mapping_meta_posts: dict[str, MetaPost], master_data: MasterData
-) -> tuple[set[str], set[str]]:
+    *,
+    target_urls: Iterable[str],
+    mapping_meta_posts: Mapping[str, MetaPost],
+    master_data: MasterData,
+) -> tuple[set[str], set[str], set[str]]:
+    """target_urls のうち、作成が必要なURL、更新が必要なURL、Notion側で変更されていたURLを返す"""
     union_insert = set()
     union_update = set()
+    updated_urls = set()
 
-    for url, post in master_data.posts.items():
+    for url in target_urls:
+        post = master_data.posts.get(url)
+        if post is None:
+            continue
         meta_post_current = mapping_meta_posts.get(url)
 
         if meta_post_current is None:
@@ -113,11 +377,12 @@ def parse_process_target_post_urls(
 
         if meta_post_prev != meta_post_current:
             master_data.meta_posts[url] = meta_post_current
+            updated_urls.add(url)
 
         if post.title != meta_post_current.old_title:
             union_update.add(url)
 
-    return union_insert, union_update
+    return union_insert, union_update, updated_urls
 
 
 @logging_function(logger)
@@ -127,11 +392,9 @@ def insert_meta_posts(
     notion_data_source_id: str,
     master_data: MasterData,
     client: Client,
-) -> bool:
-    # 副作用: master_data.meta_posts
-    flag = False
-    for url in union_insert:
-        flag = True
+    max_workers: int,
+) -> tuple[list[dict], list[Exception]]:
+    def create_page(url: str) -> dict:
         post = master_data.posts[url]
         props = {
             "title": {"title": [{"text": {"content": post.title}}]},
@@ -139,24 +402,18 @@ def insert_meta_posts(
             "url": {"url": post.url},
             "unixtime_ms": {"number": post.unixtime},
         }
-        page = client.pages.create(
+        return client.pages.create(
             parent={"data_source_id": notion_data_source_id}, properties=props
         )
-        meta_post, mapping_categories, mapping_tags = convert_to_meta_post(page=page)
-        master_data.meta_posts[url] = meta_post
-        master_data.categories = {**master_data.categories, **mapping_categories}
-        master_data.tags = {**master_data.tags, **mapping_tags}
-    return flag
+
+    return write_pages(function=create_page, urls=union_insert, max_workers=max_workers)
 
 
 @logging_function(logger)
 def update_meta_posts(
-    *, union_update: set[str], master_data: MasterData, client: Client
-) -> bool:
-    # 副作用: master_data.meta_posts
-    flag = False
-    for url in union_update:
-        flag = True
+    *, union_update: set[str], master_data: MasterData, client: Client, max_workers: int
+) -> tuple[list[dict], list[Exception]]:
+    def update_page(url: str) -> dict:
         post = master_data.posts[url]
         meta_post_prev = master_data.meta_posts[url]
         props = {
@@ -164,11 +421,51 @@ def update_meta_posts(
             "old_title": {"rich_text": [{"text": {"content": post.title}}]},
             "fixed": {"checkbox": False},
         }
-        page = client.pages.update(page_id=meta_post_prev.notion_id, properties=props)
-        meta_post_cur, mapping_categories, mapping_tags = convert_to_meta_post(
-            page=page
+        return client.pages.update(page_id=meta_post_prev.notion_id, properties=props)
+
+    return write_pages(function=update_page, urls=union_update, max_workers=max_workers)
+
+
+def write_pages(
+    *, function: Callable[[str], dict], urls: Iterable[str], max_workers: int
+) -> tuple[list[dict], list[Exception]]:
+    """URL ごとにページを書き込み、書き込んだページ (URL の順) と失敗した例外を返す
+
+    1件失敗しても残りの書き込みは続け、成功したページを master_data に反映できるようにする。
+    """
+    mapping_pages = {}
+    errors = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(function, url): url for url in urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                mapping_pages[url] = future.result()
+            except Exception as e:
+                logger.warning(
+                    "failed to write page", data={"url": url, "error": repr(e)}
+                )
+                errors.append(e)
+    return [mapping_pages[x] for x in sorted(mapping_pages)], errors
+
+
+@logging_function(logger, with_args=False)
+def apply_written_pages(
+    *, pages: list[dict], master_data: MasterData
+) -> tuple[set[str], bool, bool]:
+    """書き込んだURLと、カテゴリ・タグがそれぞれ変わったかを返す"""
+    # 副作用: master_data.meta_posts, master_data.categories, master_data.tags
+    written_urls = set()
+    is_categories_changed = False
+    is_tags_changed = False
+    for page in pages:
+        meta_post, mapping_categories, mapping_tags = convert_to_meta_post(page=page)
+        master_data.meta_posts[meta_post.url] = meta_post
+        is_categories_changed |= merge_mapping(
+            target=master_data.categories, source=mapping_categories, is_replace=False
+        )
+        is_tags_changed |= merge_mapping(
+            target=master_data.tags, source=mapping_tags, is_replace=False
         )
-        master_data.meta_posts[url] = meta_post_cur
-        master_data.categories = {**master_data.categories, **mapping_categories}
-        master_data.tags = {**master_data.tags, **mapping_tags}
-    return flag
+        written_urls.add(meta_post.url)
+    return written_urls, is_categories_changed, is_tags_changed
@@ -1,21 +1,37 @@
 from __future__ import annotations
 
+from bisect import bisect_left
 from hashlib import sha256
-from io import BytesIO
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Iterable, NamedTuple
 
 import boto3
 import orjson
-from compression.zstd import compress
 
+from src.utils.build_data_indexes import create_build_data_indexes
+from src.utils.build_data_store import BuildDataStore
+from src.utils.content_encoding import Encoding, encode_variants, upload_variants
 from src.utils.logger import create_logger, logging_function
-from src.utils.methods import create_key_build_data, create_key_master_data
-from src.utils.models import EnvironmentVariables, MasterData, MetaPost, Post
-from src.utils.models.build_data import BuildData, Card
+from src.utils.master_data_store import MasterDataStore
+from src.utils.methods import create_key_build_data
+from src.utils.models import (
+    Author,
+    CardCacheEntry,
+    Changeset,
+    EnvironmentVariables,
+    MasterData,
+    MetaPost,
+    Post,
+)
+from src.utils.models.build_data import BuildData, Card, EncodedObject
 
 if TYPE_CHECKING:
     from mypy_boto3_s3 import S3Client
 
+# build_data.json は同じキーで更新されるので、毎回更新を確認させる
+CACHE_CONTROL_BUILD_DATA = "no-cache"
+# カードの作り方 (convert_to_card) を変えた場合に上げ、前回までに作ったカードを作り直させる
+CARD_VERSION = 1
+
 logger = create_logger(__name__)
 
 
@@ -24,92 +40,355 @@ def step_04_upload(
     *,
     env: EnvironmentVariables,
     master_data: MasterData,
+    changeset: Changeset,
+    store: MasterDataStore,
     client_s3: S3Client = boto3.client("s3"),
 ):
-    build_data = create_build_data(master_data=master_data)
-    binary_build_data = orjson.dumps(build_data.model_dump())
-    hash_build_data = calculate_sha256(binary_build_data=binary_build_data)
-    if hash_build_data != master_data.prev_hash:
-        upload_build_data(
-            binary_build_data=binary_build_data,
-            bucket=env.bucket_name,
-            key_prefix=env.key_prefix,
-            client=client_s3,
+    if changeset.is_content_changed:
+        written_urls, changed_urls = update_cards(
+            master_data=master_data, changeset=changeset
+        )
+        changeset = changeset.merge(Changeset(cards=written_urls | changed_urls))
+        cards_root_hash = calculate_cards_root_hash(master_data=master_data, env=env)
+        if cards_root_hash == master_data.cards_root_hash:
+            logger.info("no card changed, skip building build_data")
+            store.save(master_data=master_data, changeset=changeset)
+            return
+        logger.info(
+            "cards changed",
+            data={"count": len(changed_urls), "urls": sorted(changed_urls)},
         )
-        master_data.prev_hash = hash_build_data
-    upload_master_data(
-        master_data=master_data,
-        bucket=env.bucket_name,
-        key_prefix=env.key_prefix,
-        client=client_s3,
+        build_data = create_build_data(master_data=master_data)
+        if env.build_data_output in ("single", "both"):
+            binary_build_data = orjson.dumps(build_data.model_dump())
+            hash_build_data = calculate_sha256(binary_build_data=binary_build_data)
+            # 圧縮方式の設定を変えた場合は、内容が同じでも圧縮版を置き直す
+            if (
+                hash_build_data != master_data.prev_hash
+                or master_data.build_data_variants.keys()
+                != set(env.build_data_encodings)
+            ):
+                master_data.build_data_variants = upload_build_data(
+                    binary_build_data=binary_build_data,
+                    bucket=env.bucket_name,
+                    key_prefix=env.key_prefix,
+                    encodings=env.build_data_encodings,
+                    client=client_s3,
+                )
+                master_data.prev_hash = hash_build_data
+        if env.build_data_output in ("sharded", "both"):
+            # 変更の有無はシャードごとのハッシュで判定するので prev_hash は使わない
+            BuildDataStore(
+                bucket=env.bucket_name,
+                key_prefix=env.key_prefix,
+                client=client_s3,
+                encodings=env.build_data_encodings,
+            ).publish(build_data=build_data)
+        master_data.cards_root_hash = cards_root_hash
+    else:
+        logger.info("no content changed, skip building build_data")
+    store.save(master_data=master_data, changeset=changeset)
+
+
+class CardSources(NamedTuple):
+    """カードの作成元のレコード"""
+
+    meta_post: MetaPost
+    post: Post
+    author: Author
+    post_thumbnail: str
+
+
+def parse_card_sources(*, url: str, master_data: MasterData) -> CardSources | None:
+    """カードの作成元を返す (カードにならない記事の場合は None を返す)"""
+    meta_post = master_data.meta_posts.get(url)
+    if meta_post is None or not meta_post.fixed:
+        return None
+    post = master_data.posts.get(url)
+    if post is None:
+        return None
+    return CardSources(
+        meta_post=meta_post,
+        post=post,
+        author=master_data.authors[post.author_id],
+        post_thumbnail=post.thumbnail_url or master_data.thumbnails[post.thumbnail_id],
     )
 
 
-@logging_function(logger)
-def convert_to_card(*, meta_post: MetaPost, master_data: MasterData):
-    post = master_data.posts[meta_post.url]
-    author = master_data.authors[post.author_id]
+def calculate_card_source_hash(*, sources: CardSources) -> str:
+    """作成元のレコードのハッシュ (カードの作り方を変えた場合は CARD_VERSION を上げる)"""
+    return sha256(
+        orjson.dumps(
+            [
+                CARD_VERSION,
+                sources.meta_post.model_dump(),
+                sources.post.model_dump(),
+                sources.author.model_dump(),
+                sources.post_thumbnail,
+            ]
+        )
+    ).hexdigest()
 
-    def parse_post_url() -> str:
-        return meta_post.url
 
-    def parse_post_title() -> str:
-        return meta_post.title
+def convert_to_card(*, sources: CardSources) -> Card:
+    meta_post, post, author, post_thumbnail = sources
+    return Card(
+        post_url=meta_post.url,
+        post_title=meta_post.title,
+        post_date=post.date,
+        post_thumbnail=post_thumbnail,
+        post_unixtime=post.unixtime,
+        author_url=author.url,
+        author_name=author.name,
+        author_thumbnail=author.thumbnail_url,
+        meta_category=meta_post.category,
+        meta_tags=meta_post.tags,
+    )
 
-    def parse_post_date() -> str:
-        return post.date
 
-    def parse_post_thumbnail() -> str:
-        if post.thumbnail_url:
-            return post.thumbnail_url
-        else:
-            return master_data.thumbnails[post.thumbnail_id]
+@logging_function(logger, with_args=False, with_return=False)
+def create_build_data(*, master_data: MasterData) -> BuildData:
+    """update_cards で最新にしたカードから build_data を作る
 
-    def parse_post_unixtime() -> str:
-        return post.unixtime
+    カードは公開日時、URL の順に並べる (シャードに分けて公開する場合と同じ順)。
+    マスターデータの読み込み順に依らないので、実行ごとに並びが変わらない。
+    """
+    all_cards = sorted(
+        (x.card for x in master_data.cards.values()),
+        key=lambda x: (x.post_unixtime, x.post_url),
+    )
+    return BuildData(
+        cards=all_cards,
+        categories=master_data.categories,
+        tags=master_data.tags,
+        indexes=create_build_data_indexes(cards=all_cards),
+    )
 
-    def parse_author_url() -> str:
-        return author.url
 
-    def parse_author_name() -> str:
-        return author.name
+@logging_function(logger, with_args=False)
+def update_cards(
+    *, master_data: MasterData, changeset: Changeset
+) -> tuple[set[str], set[str]]:
+    """変更の影響を受けるカードを更新し、(カードを書き換えたURL, ハッシュの変わったURL) を返す
 
-    def parse_author_thumbnail() -> str:
-        return author.thumbnail_url
+    作成元のレコードのハッシュが前回と同じカードは作り直さない。
+    前回のカードが無い (初回) か、件数の比較でキャッシュと card_digests の食い違いが分かった場合は
+    全ての記事を対象にし、バケットのハッシュと著者・サムネイルからカードへの参照を作り直す。
+    カードにならなくなった記事のカードは削除するので、キャッシュはカードの件数を超えない。
+    作り直した参照を保存させるため、全ての記事を対象にした場合は全てのカードを書き換えたものとして返す。
+    """
+    # 副作用: master_data.cards, master_data.card_digests, master_data.card_bucket_hashes,
+    #   master_data.card_urls_by_author, master_data.card_urls_by_thumbnail
+    full = (
+        not master_data.cards_root_hash
+        or len(master_data.cards) != len(master_data.card_digests)
+        or (bool(master_data.card_digests) and not master_data.card_bucket_hashes)
+        or (bool(master_data.cards) and not master_data.card_urls_by_author)
+    )
+    if full:
+        urls = (
+            set(master_data.meta_posts)
+            | set(master_data.card_digests)
+            | set(master_data.cards)
+        )
+        rebuild_card_indexes(master_data=master_data)
+    else:
+        urls = parse_affected_card_urls(master_data=master_data, changeset=changeset)
 
-    def parse_meta_category() -> str:
-        return meta_post.category
+    written_urls = set()
+    changed_urls = set()
+    for url in urls:
+        sources = parse_card_sources(url=url, master_data=master_data)
+        cached = master_data.cards.get(url)
+        if sources is None:
+            # カードにならなくなった記事
+            if cached is not None:
+                del master_data.cards[url]
+                remove_card_refs(master_data=master_data, url=url, entry=cached)
+                written_urls.add(url)
+            if update_card_digest(master_data=master_data, url=url, digest=None):
+                changed_urls.add(url)
+            continue
+        source_hash = calculate_card_source_hash(sources=sources)
+        author_id = sources.post.author_id
+        thumbnail_id = None if sources.post.thumbnail_url else sources.post.thumbnail_id
+        if (
+            cached is not None
+            and cached.source_hash == source_hash
+            and cached.author_id == author_id
+            and cached.thumbnail_id == thumbnail_id
+            and url in master_data.card_digests
+        ):
+            if full:
+                add_card_refs(master_data=master_data, url=url, entry=cached)
+            continue
+        card = convert_to_card(sources=sources)
+        entry = CardCacheEntry(
+            source_hash=source_hash,
+            card=card,
+            author_id=author_id,
+            thumbnail_id=thumbnail_id,
+        )
+        if cached is not None:
+            remove_card_refs(master_data=master_data, url=url, entry=cached)
+        master_data.cards[url] = entry
+        add_card_refs(master_data=master_data, url=url, entry=entry)
+        written_urls.add(url)
+        digest = sha256(orjson.dumps(card.model_dump())).hexdigest()
+        if update_card_digest(master_data=master_data, url=url, digest=digest):
+            changed_urls.add(url)
+    logger.info(
+        "updated cards",
+        data={
+            "full": full,
+            "count_targets": len(urls),
+            "count_rebuilt": len(written_urls),
+            "count_cached": len(master_data.cards),
+        },
+    )
+    if full:
+        written_urls.update(master_data.cards)
+    return written_urls, changed_urls
 
-    def parse_meta_tags() -> str:
-        return meta_post.tags
 
-    return Card(
-        post_url=parse_post_url(),
-        post_title=parse_post_title(),
-        post_date=parse_post_date(),
-        post_thumbnail=parse_post_thumbnail(),
-        post_unixtime=parse_post_unixtime(),
-        author_url=parse_author_url(),
-        author_name=parse_author_name(),
-        author_thumbnail=parse_author_thumbnail(),
-        meta_category=parse_meta_category(),
-        meta_tags=parse_meta_tags(),
+@logging_function(logger, with_args=False)
+def rebuild_card_indexes(*, master_data: MasterData):
+    """card_digests からバケットのハッシュを作り直し、カードへの参照を空にする
+
+    参照は全ての記事を対象にした update_cards の中で、カードごとに登録し直す。
+    """
+    # 副作用: master_data.card_bucket_hashes, master_data.card_urls_by_author,
+    #   master_data.card_urls_by_thumbnail
+    bucket_hashes: dict[str, int] = {}
+    for url, digest in master_data.card_digests.items():
+        bucket = calculate_card_bucket(url=url)
+        bucket_hashes[bucket] = bucket_hashes.get(
+            bucket, 0
+        ) ^ calculate_card_entry_hash(url=url, digest=digest)
+    master_data.card_bucket_hashes = {
+        bucket: f"{value:064x}" for bucket, value in bucket_hashes.items() if value
+    }
+    master_data.card_urls_by_author = {}
+    master_data.card_urls_by_thumbnail = {}
+
+
+def calculate_card_bucket(*, url: str) -> str:
+    """カードのバケット (URL の sha256 の先頭2文字、256通り)"""
+    return sha256(url.encode()).hexdigest()[:2]
+
+
+def calculate_card_entry_hash(*, url: str, digest: str) -> int:
+    return int(sha256(f"{url}\t{digest}".encode()).hexdigest(), 16)
+
+
+def update_card_digest(
+    *, master_data: MasterData, url: str, digest: str | None
+) -> bool:
+    """card_digests を更新し、差分だけをバケットのハッシュに反映する (変わった場合は True を返す)
+
+    バケットのハッシュはバケット内のカードのハッシュの XOR なので、
+    前回のハッシュを XOR で取り除き、新しいハッシュを XOR で加えれば済む。
+    """
+    # 副作用: master_data.card_digests, master_data.card_bucket_hashes
+    prev = master_data.card_digests.get(url)
+    if prev == digest:
+        return False
+    bucket = calculate_card_bucket(url=url)
+    value = int(master_data.card_bucket_hashes.get(bucket, "0"), 16)
+    if prev is not None:
+        value ^= calculate_card_entry_hash(url=url, digest=prev)
+        del master_data.card_digests[url]
+    if digest is not None:
+        value ^= calculate_card_entry_hash(url=url, digest=digest)
+        master_data.card_digests[url] = digest
+    if value:
+        master_data.card_bucket_hashes[bucket] = f"{value:064x}"
+    else:
+        master_data.card_bucket_hashes.pop(bucket, None)
+    return True
+
+
+def add_card_refs(*, master_data: MasterData, url: str, entry: CardCacheEntry):
+    # 副作用: master_data.card_urls_by_author, master_data.card_urls_by_thumbnail
+    add_card_url(mapping=master_data.card_urls_by_author, key=entry.author_id, url=url)
+    if entry.thumbnail_id is not None:
+        add_card_url(
+            mapping=master_data.card_urls_by_thumbnail, key=entry.thumbnail_id, url=url
+        )
+
+
+def remove_card_refs(*, master_data: MasterData, url: str, entry: CardCacheEntry):
+    # 副作用: master_data.card_urls_by_author, master_data.card_urls_by_thumbnail
+    remove_card_url(
+        mapping=master_data.card_urls_by_author, key=entry.author_id, url=url
     )
+    if entry.thumbnail_id is not None:
+        remove_card_url(
+            mapping=master_data.card_urls_by_thumbnail, key=entry.thumbnail_id, url=url
+        )
 
 
-@logging_function(logger)
-def create_build_data(*, master_data: MasterData) -> BuildData:
-    all_cards = []
-    for meta_post in master_data.meta_posts.values():
-        logger.debug("meta_post", data={"meta_post": meta_post})
-        if not meta_post.fixed:
-            continue
-        card = convert_to_card(meta_post=meta_post, master_data=master_data)
-        all_cards.append(card)
+def add_card_url(*, mapping: dict[str, list[str]], key: str, url: str):
+    """URL の順を保って追加する (書き出す内容を実行ごとに変えないため)"""
+    urls = mapping.setdefault(key, [])
+    i = bisect_left(urls, url)
+    if i == len(urls) or urls[i] != url:
+        urls.insert(i, url)
 
-    return BuildData(
-        cards=all_cards, categories=master_data.categories, tags=master_data.tags
+
+def remove_card_url(*, mapping: dict[str, list[str]], key: str, url: str):
+    urls = mapping.get(key)
+    if urls is None:
+        return
+    i = bisect_left(urls, url)
+    if i < len(urls) and urls[i] == url:
+        del urls[i]
+    if not urls:
+        del mapping[key]
+
+
+@logging_function(logger, with_args=False)
+def parse_affected_card_urls(
+    *, master_data: MasterData, changeset: Changeset
+) -> set[str]:
+    """変更の影響を受けるカードのURL
+
+    著者・サムネイルの変更は、card_urls_by_author / card_urls_by_thumbnail から
+    それを参照するカードだけを引く。
+    """
+    urls = changeset.posts | changeset.meta_posts
+    for author_id in changeset.authors:
+        urls.update(master_data.card_urls_by_author.get(author_id, []))
+    for thumbnail_id in changeset.thumbnails:
+        urls.update(master_data.card_urls_by_thumbnail.get(thumbnail_id, []))
+    return urls
+
+
+@logging_function(logger, with_args=False)
+def calculate_cards_root_hash(
+    *, master_data: MasterData, env: EnvironmentVariables
+) -> str:
+    """バケットごとのハッシュとカテゴリ・タグ、出力の設定をまとめたハッシュ
+
+    カードごとのハッシュは update_card_digest でバケットのハッシュに反映済みなので、
+    ここでは最大256個のバケットをつなげるだけで、記事数によらない。
+    出力の設定を含めるので、設定を変えた場合も build_data を作り直す。
+    """
+    h = sha256()
+    for bucket in sorted(master_data.card_bucket_hashes):
+        h.update(f"{bucket}\t{master_data.card_bucket_hashes[bucket]}\n".encode())
+    h.update(
+        orjson.dumps(
+            {
+                "categories": master_data.categories,
+                "tags": master_data.tags,
+                "build_data_output": env.build_data_output,
+                "build_data_encodings": env.build_data_encodings,
+            },
+            option=orjson.OPT_SORT_KEYS,
+        )
     )
+    return h.hexdigest()
 
 
 @logging_function(logger, with_args=False)
@@ -117,23 +396,36 @@ def calculate_sha256(*, binary_build_data: bytes) -> str:
     return sha256(binary_build_data).hexdigest()
 
 
-@logging_function(logger)
+@logging_function(logger, with_args=False)
 def upload_build_data(
-    *, binary_build_data: bytes, bucket: str, key_prefix: str, client: S3Client
-):
-    io = BytesIO(binary_build_data)
-    client.upload_fileobj(
-        Fileobj=io, Bucket=bucket, Key=create_key_build_data(key_prefix=key_prefix)
-    )
-
+    *,
+    binary_build_data: bytes,
+    bucket: str,
+    key_prefix: str,
+    encodings: Iterable[Encoding],
+    client: S3Client,
+) -> dict[str, EncodedObject]:
+    """build_data.json と、その圧縮版 (build_data.json.gz など) をアップロードする
 
-@logging_function(logger)
-def upload_master_data(
-    *, master_data: MasterData, bucket: str, key_prefix: str, client: S3Client
-):
-    binary_raw = orjson.dumps(master_data.model_dump())
-    binary_compressed = compress(data=binary_raw, level=3)
-    io = BytesIO(binary_compressed)
-    client.upload_fileobj(
-        Fileobj=io, Bucket=bucket, Key=create_key_master_data(key_prefix=key_prefix)
+    圧縮版のサイズとハッシュを返す。
+    """
+    key = create_key_build_data(key_prefix=key_prefix)
+    variants = encode_variants(binaries={key: binary_build_data}, encodings=encodings)[
+        key
+    ]
+    # 未圧縮の build_data.json は従来どおり置き、Content-Encoding に対応しないクライアントに使わせる
+    client.put_object(
+        Body=binary_build_data,
+        Bucket=bucket,
+        Key=key,
+        ContentType="application/json",
+        CacheControl=CACHE_CONTROL_BUILD_DATA,
+    )
+    return upload_variants(
+        client=client,
+        bucket=bucket,
+        key=key,
+        variants=variants,
+        content_type="application/json",
+        cache_control=CACHE_CONTROL_BUILD_DATA,
     )
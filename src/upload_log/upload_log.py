@@ -1,19 +1,20 @@
 from __future__ import annotations
 
 from datetime import datetime
-from io import BytesIO
+from io import RawIOBase
 from logging import DEBUG
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, BinaryIO
 from zoneinfo import ZoneInfo
 
 import boto3
 from aws_lambda_powertools import Logger
-from compression.zstd import compress
+from boto3.s3.transfer import TransferConfig
+from compression.zstd import ZstdCompressor
 from pydantic_settings import BaseSettings
 
-from src.utils.logger import logging_function
+from src.utils.logger import logging_function, logging_settings
 from src.utils.logger.create_logger import custom_default
-from src.utils.variables import FILENAME_LOG
+from src.utils.logger.log_writer import list_log_filenames
 
 if TYPE_CHECKING:
     from mypy_boto3_s3 import S3Client
@@ -22,6 +23,11 @@ if TYPE_CHECKING:
 class EnvironmentVariables(BaseSettings):
     bucket_name: str
     key_prefix: str  # Github Organization名を使用する
+    log_compression_level: int = 3  # 未圧縮のログをアップロード時に圧縮する場合のレベル
+
+
+SIZE_CHUNK = 8 * 1024 * 1024  # S3のマルチパートアップロードの1パートの大きさ
+MAX_CONCURRENCY_UPLOAD = 2
 
 
 jst = ZoneInfo("Asia/Tokyo")
@@ -36,11 +42,71 @@ def upload_log(*, client: S3Client = boto3.client("s3")):
     logger.debug("environment variables", data={"env": env})
     dt_now = datetime.now(tz=jst)
     key = generate_key(key_prefix=env.key_prefix, dt=dt_now)
-    binary_raw = load_log()
-    binary_compressed = compress_log(binary=binary_raw)
-    exec_upload(
-        binary=binary_compressed, bucket=env.bucket_name, key=key, client=client
+    # 書き込み時に zstd で圧縮済みであれば、そのままアップロードする
+    compression_level = (
+        None if logging_settings.log_compression else env.log_compression_level
     )
+    stream = LogStream(
+        filenames=list_log_filenames(), compression_level=compression_level
+    )
+    exec_upload(fileobj=stream, bucket=env.bucket_name, key=key, client=client)
+
+
+class LogStream(RawIOBase):
+    """ログファイルを古い順にチャンク単位で読み、必要であれば zstd で圧縮しながら返す
+
+    ローテートされたファイルも含めて1つのストリームとして読めるので、
+    ログ全体をメモリに載せずにアップロードできる。
+    """
+
+    filenames: list[str]
+    file: BinaryIO | None = None
+    compressor: ZstdCompressor | None = None
+    buffer: bytearray
+    is_finished: bool = False
+
+    def __init__(self, *, filenames: list[str], compression_level: int | None):
+        super().__init__()
+        self.filenames = list(filenames)
+        if compression_level is not None:
+            self.compressor = ZstdCompressor(level=compression_level)
+        self.buffer = bytearray()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self.buffer and not self.is_finished:
+            self.fill()
+        size = min(len(b), len(self.buffer))
+        b[:size] = self.buffer[:size]
+        del self.buffer[:size]
+        return size
+
+    def fill(self):
+        if self.file is None:
+            if not self.filenames:
+                if self.compressor:
+                    self.buffer += self.compressor.flush(ZstdCompressor.FLUSH_FRAME)
+                self.is_finished = True
+                return
+            self.file = open(self.filenames.pop(0), "rb")
+
+        chunk = self.file.read(SIZE_CHUNK)
+        if not chunk:
+            self.file.close()
+            self.file = None
+            return
+        if self.compressor:
+            self.buffer += self.compressor.compress(chunk)
+        else:
+            self.buffer += chunk
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+        super().close()
 
 
 @logging_function(logger)
@@ -56,20 +122,18 @@ def generate_key(*, key_prefix: str, dt: datetime) -> str:
     return f"{key_prefix}/logs/{generate_rfid(dt=dt)}__{text_date}.log"
 
 
-@logging_function(logger, with_return=False)
-def load_log() -> bytes:
-    with open(FILENAME_LOG, "rb") as f:
-        return f.read()
-
-
-@logging_function(logger, with_args=False, with_return=False)
-def compress_log(*, binary: bytes) -> bytes:
-    return compress(data=binary, level=22)
-
-
 @logging_function(logger, with_args=False)
-def exec_upload(*, binary: bytes, bucket: str, key: str, client: S3Client):
-    io = BytesIO(binary)
+def exec_upload(*, fileobj: BinaryIO, bucket: str, key: str, client: S3Client):
+    # 読み込んだ分から順にマルチパートでアップロードされるため、メモリ使用量は
+    # SIZE_CHUNK * MAX_CONCURRENCY_UPLOAD 程度に収まる
     client.upload_fileobj(
-        Fileobj=io, Bucket=bucket, Key=key, ExtraArgs={"StorageClass": "ONEZONE_IA"}
+        Fileobj=fileobj,
+        Bucket=bucket,
+        Key=key,
+        ExtraArgs={"StorageClass": "ONEZONE_IA"},
+        Config=TransferConfig(
+            multipart_threshold=SIZE_CHUNK,
+            multipart_chunksize=SIZE_CHUNK,
+            max_concurrency=MAX_CONCURRENCY_UPLOAD,
+        ),
     )
@@ -0,0 +1,3 @@
+from .create_build_data_indexes import create_build_data_indexes
+
+__all__ = ["create_build_data_indexes"]
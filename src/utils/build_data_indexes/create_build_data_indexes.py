@@ -0,0 +1,33 @@
+from src.utils.logger import create_logger, logging_function
+from src.utils.models.build_data import BuildDataIndexes, Card
+
+logger = create_logger(__name__)
+
+
+@logging_function(logger, with_args=False, with_return=False)
+def create_build_data_indexes(*, cards: list[Card]) -> BuildDataIndexes:
+    """cards の位置を、公開日時の新しい順と、カテゴリ・タグ・著者ごとに並べる
+
+    公開日時が同じ場合は URL の順にして、同じカードからは同じ索引になるようにする。
+    """
+    by_date = sorted(
+        range(len(cards)),
+        key=lambda i: (-cards[i].post_unixtime, cards[i].post_url),
+    )
+    by_category = {}
+    by_tag = {}
+    by_author = {}
+    # 公開日時の順に追加するので、各リストも公開日時の順になる
+    for i in by_date:
+        card = cards[i]
+        by_category.setdefault(card.meta_category, []).append(i)
+        for tag in card.meta_tags:
+            by_tag.setdefault(tag, []).append(i)
+        by_author.setdefault(card.author_url, []).append(i)
+
+    return BuildDataIndexes(
+        by_date=by_date,
+        by_category=dict(sorted(by_category.items())),
+        by_tag=dict(sorted(by_tag.items())),
+        by_author=dict(sorted(by_author.items())),
+    )
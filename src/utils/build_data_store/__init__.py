@@ -0,0 +1,3 @@
+from .build_data_store import BuildDataStore
+
+__all__ = ["BuildDataStore"]
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from typing import TYPE_CHECKING, Iterable
+
+import orjson
+
+from src.utils.build_data_indexes import create_build_data_indexes
+from src.utils.content_encoding import (
+    EncodedVariant,
+    Encoding,
+    encode_variants,
+    upload_variants,
+)
+from src.utils.logger import create_logger, logging_function
+from src.utils.methods import (
+    create_key_build_data_manifest,
+    create_key_build_data_shard,
+)
+from src.utils.models.build_data import (
+    BuildData,
+    BuildDataManifest,
+    BuildDataShardInfo,
+    Card,
+    EncodedObject,
+)
+
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+
+MAX_WORKERS = 8
+# シャードはキーに内容のハッシュを含み上書きされないので、クライアントは期限無くキャッシュしてよい
+CACHE_CONTROL_SHARD = "public, max-age=31536000, immutable"
+# マニフェストは同じキーで更新されるので、毎回更新を確認させる
+CACHE_CONTROL_MANIFEST = "no-cache"
+
+logger = create_logger(__name__)
+
+
+def parse_shard_name(*, card: Card) -> str:
+    """カードは公開月ごとのシャードに分ける (post_date は "YYYY.MM.DD")"""
+    return card.post_date[:7].replace(".", "-")
+
+
+class BuildDataStore:
+    """build_data をマニフェストと公開月ごとのシャードに分けて S3 に公開する
+
+    シャードのキーには内容のハッシュを含めるので、内容の変わったシャードだけをアップロードすれば済む。
+    アップロードするシャードは encodings の方式でも圧縮し、拡張子を付けたキーに並べて置く。
+    参照されなくなったシャードは、古いマニフェストを読んだクライアントのために1世代残してから削除する。
+    """
+
+    bucket: str
+    key_prefix: str
+    client: S3Client
+    encodings: list[Encoding]
+
+    def __init__(
+        self,
+        *,
+        bucket: str,
+        key_prefix: str,
+        client: S3Client,
+        encodings: Iterable[Encoding] = (),
+    ):
+        self.bucket = bucket
+        self.key_prefix = key_prefix
+        self.client = client
+        self.encodings = list(encodings)
+
+    @logging_function(logger, with_args=False)
+    def publish(self, *, build_data: BuildData) -> bool:
+        """build_data を公開し、マニフェストを更新したかを返す"""
+        manifest_current = self.load_manifest()
+        mapping_cards = group_cards(build_data=build_data)
+        # 索引の位置は、シャード名の順にシャードのカードを連結した並びでの位置
+        indexes = create_build_data_indexes(
+            cards=[x for cards in mapping_cards.values() for x in cards]
+        )
+
+        shards_next = {}
+        binaries_upload = {}
+        for name, cards in mapping_cards.items():
+            binary = orjson.dumps([x.model_dump() for x in cards])
+            count = len(cards)
+            hash_shard = sha256(binary).hexdigest()
+            info_current = manifest_current.shards.get(name)
+            if (
+                info_current is not None
+                and info_current.sha256 == hash_shard
+                and info_current.encodings.keys() == set(self.encodings)
+            ):
+                shards_next[name] = info_current
+                continue
+            key = create_key_build_data_shard(
+                key_prefix=self.key_prefix, name=name, sha256=hash_shard
+            )
+            shards_next[name] = BuildDataShardInfo(
+                key=key, sha256=hash_shard, count=count
+            )
+            binaries_upload[name] = binary
+
+        if (
+            not binaries_upload
+            and shards_next.keys() == manifest_current.shards.keys()
+            and build_data.categories == manifest_current.categories
+            and build_data.tags == manifest_current.tags
+            and indexes == manifest_current.indexes
+        ):
+            logger.info("build_data shards are not changed, skip publishing")
+            return False
+
+        # 圧縮は内容の変わったシャードだけ、変わった時に1度だけ行う
+        mapping_variants = encode_variants(
+            binaries=binaries_upload, encodings=self.encodings
+        )
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            mapping_encoded = dict(
+                zip(
+                    binaries_upload,
+                    executor.map(
+                        lambda name: self.upload_shard(
+                            key=shards_next[name].key,
+                            binary=binaries_upload[name],
+                            variants=mapping_variants[name],
+                        ),
+                        binaries_upload,
+                    ),
+                )
+            )
+        for name, encoded in mapping_encoded.items():
+            shards_next[name].encodings = encoded
+
+        keys_next = {x for info in shards_next.values() for x in parse_keys(info=info)}
+        keys_retired = sorted(
+            x
+            for info in manifest_current.shards.values()
+            for x in parse_keys(info=info)
+            if x not in keys_next
+        )
+        manifest = BuildDataManifest(
+            shards=shards_next,
+            categories=build_data.categories,
+            tags=build_data.tags,
+            indexes=indexes,
+            retired_keys=keys_retired,
+        )
+        self.upload_manifest(manifest=manifest)
+
+        # 1世代前に参照されなくなったシャードは、新しいマニフェストの公開後に削除する
+        for key in manifest_current.retired_keys:
+            if key not in keys_next and key not in keys_retired:
+                self.client.delete_object(Bucket=self.bucket, Key=key)
+        logger.info(
+            "published build_data shards",
+            data={
+                "count_shards": len(shards_next),
+                "count_uploaded": len(binaries_upload),
+                "count_retired": len(keys_retired),
+            },
+        )
+        return True
+
+    @logging_function(logger, with_return=False)
+    def load_manifest(self) -> BuildDataManifest:
+        try:
+            resp = self.client.get_object(
+                Bucket=self.bucket,
+                Key=create_key_build_data_manifest(key_prefix=self.key_prefix),
+            )
+        except self.client.exceptions.NoSuchKey:
+            return BuildDataManifest()
+        return BuildDataManifest.model_validate_json(resp["Body"].read())
+
+    def upload_shard(
+        self, *, key: str, binary: bytes, variants: dict[Encoding, EncodedVariant]
+    ) -> dict[str, EncodedObject]:
+        self.client.put_object(
+            Body=binary,
+            Bucket=self.bucket,
+            Key=key,
+            ContentType="application/json",
+            CacheControl=CACHE_CONTROL_SHARD,
+        )
+        return upload_variants(
+            client=self.client,
+            bucket=self.bucket,
+            key=key,
+            variants=variants,
+            content_type="application/json",
+            cache_control=CACHE_CONTROL_SHARD,
+        )
+
+    @logging_function(logger)
+    def upload_manifest(self, *, manifest: BuildDataManifest):
+        self.client.put_object(
+            Body=orjson.dumps(manifest.model_dump(), option=orjson.OPT_SORT_KEYS),
+            Bucket=self.bucket,
+            Key=create_key_build_data_manifest(key_prefix=self.key_prefix),
+            ContentType="application/json",
+            CacheControl=CACHE_CONTROL_MANIFEST,
+        )
+
+
+def parse_keys(*, info: BuildDataShardInfo) -> list[str]:
+    """シャードと、その圧縮版のキー"""
+    return [info.key, *(x.key for x in info.encodings.values())]
+
+
+@logging_function(logger, with_args=False, with_return=False)
+def group_cards(*, build_data: BuildData) -> dict[str, list[Card]]:
+    """カードをシャード名の順に、シャードごとに分けて返す
+
+    master_data の読み込み順に依らず同じ内容が同じハッシュになるよう、
+    シャード内のカードは公開日時と URL の順に並べる。
+    """
+    mapping_cards: dict[str, list[Card]] = {}
+    for card in build_data.cards:
+        mapping_cards.setdefault(parse_shard_name(card=card), []).append(card)
+    return {
+        name: sorted(mapping_cards[name], key=lambda x: (x.post_unixtime, x.post_url))
+        for name in sorted(mapping_cards)
+    }
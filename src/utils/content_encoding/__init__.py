@@ -0,0 +1,10 @@
+from .encode_variants import SUFFIXES, EncodedVariant, Encoding, encode_variants
+from .upload_variants import upload_variants
+
+__all__ = [
+    "EncodedVariant",
+    "Encoding",
+    "SUFFIXES",
+    "encode_variants",
+    "upload_variants",
+]
@@ -0,0 +1,109 @@
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from time import perf_counter
+from typing import Iterable, Literal, NamedTuple
+
+import brotli
+import compression.zstd as zstd
+
+from src.utils.logger import create_logger, logging_function
+
+type Encoding = Literal["gzip", "br", "zstd"]
+
+# 変更のあった時だけ1度圧縮して配信し続けるので、時間がかかっても圧縮率の高い設定にする
+LEVEL_GZIP = 9
+QUALITY_BROTLI = 11
+LEVEL_ZSTD = 19
+SUFFIXES: dict[Encoding, str] = {"gzip": ".gz", "br": ".br", "zstd": ".zst"}
+MAX_WORKERS = 4
+
+logger = create_logger(__name__)
+
+
+class EncodedVariant(NamedTuple):
+    encoding: Encoding
+    binary: bytes
+    sha256: str
+    duration_sec: float  # 圧縮にかかった秒数
+
+
+def encode(*, binary: bytes, encoding: Encoding) -> EncodedVariant:
+    counter_start = perf_counter()
+    if encoding == "gzip":
+        # mtime を固定し、同じ内容が同じ bytes (同じハッシュ) になるようにする
+        encoded = gzip.compress(binary, compresslevel=LEVEL_GZIP, mtime=0)
+    elif encoding == "br":
+        encoded = brotli.compress(binary, quality=QUALITY_BROTLI)
+    elif encoding == "zstd":
+        encoded = zstd.compress(binary, level=LEVEL_ZSTD)
+    else:
+        raise ValueError(f"unsupported encoding: {encoding}")
+    return EncodedVariant(
+        encoding=encoding,
+        binary=encoded,
+        sha256=sha256(encoded).hexdigest(),
+        duration_sec=perf_counter() - counter_start,
+    )
+
+
+@logging_function(logger, with_args=False, with_return=False)
+def encode_variants(
+    *,
+    binaries: dict[str, bytes],
+    encodings: Iterable[Encoding],
+    max_workers: int = MAX_WORKERS,
+) -> dict[str, dict[Encoding, EncodedVariant]]:
+    """binaries の各値を encodings それぞれで並列に圧縮する
+
+    戻り値は binaries と同じキーごとに、Content-Encoding をキーとした圧縮結果を持つ。
+    圧縮ライブラリはいずれも圧縮中に GIL を解放するため、スレッドで並列に処理できる。
+    """
+    encodings = list(encodings)
+    items = [(name, x) for name in binaries for x in encodings]
+    counter_start = perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        variants = list(
+            executor.map(
+                lambda item: encode(binary=binaries[item[0]], encoding=item[1]), items
+            )
+        )
+
+    result = {name: {} for name in binaries}
+    for (name, encoding), variant in zip(items, variants):
+        result[name][encoding] = variant
+    report_variants(
+        binaries=binaries,
+        variants=result,
+        encodings=encodings,
+        duration_sec=perf_counter() - counter_start,
+    )
+    return result
+
+
+def report_variants(
+    *,
+    binaries: dict[str, bytes],
+    variants: dict[str, dict[Encoding, EncodedVariant]],
+    encodings: list[Encoding],
+    duration_sec: float,
+):
+    """圧縮方式ごとのサイズ・圧縮率・所要時間をログに記録する"""
+    size_raw = sum(len(x) for x in binaries.values())
+    report = {}
+    for encoding in encodings:
+        size = sum(len(v[encoding].binary) for v in variants.values())
+        report[encoding] = {
+            "size": size,
+            "ratio": size / size_raw if size_raw else 0,
+            "duration_sec": sum(v[encoding].duration_sec for v in variants.values()),
+        }
+    logger.info(
+        "encoded variants",
+        data={
+            "count": len(binaries),
+            "size_raw": size_raw,
+            "duration_sec": duration_sec,
+            "encodings": report,
+        },
+    )
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from src.utils.models.build_data import EncodedObject
+
+from .encode_variants import SUFFIXES, EncodedVariant, Encoding
+
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+
+
+def upload_variants(
+    *,
+    client: S3Client,
+    bucket: str,
+    key: str,
+    variants: dict[Encoding, EncodedVariant],
+    content_type: str,
+    cache_control: str,
+) -> dict[Encoding, EncodedObject]:
+    """圧縮した内容を、key に圧縮方式ごとの拡張子を付けたキーへアップロードする
+
+    Content-Encoding を付けるので、そのまま配信すればブラウザが展開する。
+    """
+    result = {}
+    for encoding, variant in variants.items():
+        key_variant = key + SUFFIXES[encoding]
+        client.put_object(
+            Body=variant.binary,
+            Bucket=bucket,
+            Key=key_variant,
+            ContentType=content_type,
+            ContentEncoding=encoding,
+            CacheControl=cache_control,
+        )
+        result[encoding] = EncodedObject(
+            key=key_variant, size=len(variant.binary), sha256=variant.sha256
+        )
+    return result
@@ -0,0 +1,3 @@
+from .entity_cache import CacheEntry, EntityCache
+
+__all__ = ["CacheEntry", "EntityCache"]
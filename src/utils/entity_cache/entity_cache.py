@@ -0,0 +1,83 @@
+import os
+import sqlite3
+from itertools import batched
+from typing import Iterable, NamedTuple
+
+from src.utils.logger import create_logger, logging_function
+
+LIMIT_IDS_PER_QUERY = 500  # SQLite のプレースホルダー数の上限に収まるように分割する
+
+logger = create_logger(__name__)
+
+
+class CacheEntry(NamedTuple):
+    value: str
+    fetched_at: float  # unixtime (秒)
+
+
+class EntityCache:
+    """著者・サムネイルなどの取得結果を実行をまたいで保持する SQLite のキャッシュ
+
+    kind ごとに id と値 (文字列) と取得日時を保存する。
+    件数が max_entries を超えた分は取得日時の古いものから削除する。
+    """
+
+    connection: sqlite3.Connection
+    max_entries: int
+
+    def __init__(self, *, path: str, max_entries: int):
+        if dirname := os.path.dirname(path):
+            os.makedirs(dirname, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.max_entries = max_entries
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS entities ("
+                " kind TEXT NOT NULL,"
+                " id TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (kind, id))"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_entities_fetched_at"
+                " ON entities (fetched_at)"
+            )
+
+    @logging_function(logger, with_return=False)
+    def get_many(self, *, kind: str, ids: Iterable[str]) -> dict[str, CacheEntry]:
+        result = {}
+        for chunk_ids in batched(sorted(ids), LIMIT_IDS_PER_QUERY):
+            placeholders = ",".join("?" * len(chunk_ids))
+            cursor = self.connection.execute(
+                "SELECT id, value, fetched_at FROM entities"
+                f" WHERE kind = ? AND id IN ({placeholders})",
+                (kind, *chunk_ids),
+            )
+            for entity_id, value, fetched_at in cursor:
+                result[entity_id] = CacheEntry(value=value, fetched_at=fetched_at)
+        return result
+
+    @logging_function(logger, with_args=False)
+    def put_many(self, *, kind: str, values: dict[str, str], fetched_at: float):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO entities (kind, id, value, fetched_at)"
+                " VALUES (?, ?, ?, ?)",
+                [(kind, k, v, fetched_at) for k, v in values.items()],
+            )
+
+    @logging_function(logger)
+    def evict(self) -> int:
+        """max_entries を超えた分を取得日時の古い順に削除し、削除した件数を返す"""
+        with self.connection:
+            cursor = self.connection.execute(
+                "DELETE FROM entities WHERE rowid IN ("
+                " SELECT rowid FROM entities ORDER BY fetched_at DESC"
+                " LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            return cursor.rowcount
+
+    def close(self):
+        self.connection.close()
@@ -1,6 +1,12 @@
 from .interval_http_client import IntervalHttpClient
+from .rate_limited_transport import RateLimitedTransport
+from .response_validator_cache import ResponseValidatorCache
 
-http_client_contentful = IntervalHttpClient(0.2)
-http_client_notion = IntervalHttpClient(0.5)
+http_client_contentful = IntervalHttpClient()
 
-__all__ = ["IntervalHttpClient", "http_client_contentful", "http_client_notion"]
+__all__ = [
+    "IntervalHttpClient",
+    "RateLimitedTransport",
+    "ResponseValidatorCache",
+    "http_client_contentful",
+]
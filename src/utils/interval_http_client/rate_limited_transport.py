@@ -0,0 +1,91 @@
+from time import sleep
+
+from httpx import HTTPTransport, Request, Response, TransportError
+
+from src.utils.logger import create_logger, logging_function
+from src.utils.rate_limiter import (
+    MAX_RETRY_COUNT,
+    RETRYABLE_STATUS_CODES,
+    RateLimiter,
+    calculate_backoff,
+)
+from src.utils.rate_limiter import rate_limiter as default_rate_limiter
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD"})
+
+logger = create_logger(__name__)
+
+
+class RateLimitedTransport(HTTPTransport):
+    """ホストごとのレート制限に従ってリクエストを送るトランスポート
+
+    コネクションプールを持ち、複数スレッドから同時に使ってよい。
+    Contentful と Notion の両方のクライアントで使う。
+    """
+
+    rate_limiter: RateLimiter
+
+    def __init__(
+        self, *args, rate_limiter: RateLimiter = default_rate_limiter, **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    @logging_function(logger)
+    def handle_request(
+        self,
+        request: Request,
+    ) -> Response:
+        host = request.url.netloc.decode()
+        count = 0
+        while True:
+            self.rate_limiter.acquire(host=host)
+            try:
+                response = super().handle_request(request=request)
+            except TransportError as e:
+                # 接続の失敗やタイムアウトは、再送しても副作用の無いリクエストに限って再試行する
+                if count >= MAX_RETRY_COUNT or request.method not in IDEMPOTENT_METHODS:
+                    raise
+                wait_sec = calculate_backoff(count=count)
+                logger.debug(
+                    "retry request after transport error",
+                    data={
+                        "url": str(request.url),
+                        "error": repr(e),
+                        "wait_sec": wait_sec,
+                    },
+                )
+                sleep(wait_sec)
+                count += 1
+                continue
+            if (
+                response.status_code not in RETRYABLE_STATUS_CODES
+                or count >= MAX_RETRY_COUNT
+                or not is_retryable_request(request=request, response=response)
+            ):
+                return response
+
+            wait_sec = calculate_backoff(
+                count=count, retry_after=response.headers.get("Retry-After")
+            )
+            logger.debug(
+                "retry request",
+                data={
+                    "url": str(request.url),
+                    "status": response.status_code,
+                    "wait_sec": wait_sec,
+                },
+            )
+            response.close()
+            # 同じホストへの他スレッドのリクエストもまとめて待たせる
+            self.rate_limiter.block(host=host, seconds=wait_sec)
+            count += 1
+
+
+@logging_function(logger, with_args=False)
+def is_retryable_request(*, request: Request, response: Response) -> bool:
+    # 429 はリクエストが処理されていないので、作成系でも再送して問題ない
+    if response.status_code == 429:
+        return True
+    # 5xx の場合は処理済みの可能性があるため、ページ作成 (POST /v1/pages) は再送しない
+    return not (request.method == "POST" and request.url.path == "/v1/pages")
@@ -0,0 +1,52 @@
+from threading import Lock
+
+from httpx import Response
+
+from src.utils.models import HttpValidator
+
+
+class ResponseValidatorCache:
+    """前回のレスポンスの ETag / Last-Modified を保持し、条件付きリクエストに使う
+
+    今回の実行で使ったURLの分だけを validators_next に残すため、
+    使われなくなったURLの検証子は次回の保存時に消える。複数スレッドから使ってよい。
+    """
+
+    validators_prev: dict[str, HttpValidator]  # key: url
+    validators_next: dict[str, HttpValidator]  # key: url
+    lock: Lock
+
+    def __init__(self, *, validators: dict[str, HttpValidator]):
+        self.validators_prev = validators
+        self.validators_next = {}
+        self.lock = Lock()
+
+    def get(self, *, url: str) -> HttpValidator | None:
+        return self.validators_prev.get(url)
+
+    def keep(self, *, url: str):
+        """304 が返ってきた場合に、前回の検証子を引き継ぐ"""
+        with self.lock:
+            self.validators_next[url] = self.validators_prev[url]
+
+    def put(
+        self,
+        *,
+        url: str,
+        resp: Response,
+        keys: list[str],
+        total: int = 0,
+        cursor: str = "",
+    ):
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        if etag is None and last_modified is None:
+            return
+        with self.lock:
+            self.validators_next[url] = HttpValidator(
+                etag=etag,
+                last_modified=last_modified,
+                keys=keys,
+                total=total,
+                cursor=cursor,
+            )
@@ -1,4 +1,5 @@
 from .create_logger import create_logger
 from .logging_function import logging_function
+from .logging_settings import LoggingSettings, logging_settings
 
-__all__ = ["create_logger", "logging_function"]
+__all__ = ["create_logger", "logging_function", "LoggingSettings", "logging_settings"]
@@ -1,7 +1,7 @@
 from base64 import b64encode
 from dataclasses import asdict, is_dataclass
 from decimal import Decimal
-from logging import DEBUG, FileHandler
+from logging import DEBUG
 
 import orjson
 from aws_lambda_powertools import Logger
@@ -10,7 +10,8 @@ from compression.zstd import compress
 from pydantic import BaseModel
 
 from src.utils.models import EnvironmentVariables, MasterData
-from src.utils.variables import FILENAME_LOG
+
+from .log_writer import LogWriterHandler, get_log_writer
 
 
 def custom_default(obj):
@@ -65,7 +66,7 @@ def create_logger(name: str) -> Logger:
         service=name,
         level=DEBUG,
         use_rfc3339=True,
-        logger_handler=FileHandler(FILENAME_LOG),
+        logger_handler=LogWriterHandler(writer=get_log_writer()),
         json_deserializer=orjson.loads,
         json_serializer=lambda x: orjson.dumps(x, default=custom_default).decode(),
     )
@@ -0,0 +1,165 @@
+import atexit
+import os
+from logging import Handler, LogRecord
+from queue import Empty, SimpleQueue
+from threading import Lock, Thread
+from typing import BinaryIO
+
+from compression.zstd import ZstdCompressor
+
+from src.utils.variables import FILENAME_LOG, FILENAME_LOG_COMPRESSED
+
+from .logging_settings import logging_settings
+
+MAX_COUNT_BATCH_RECORDS = 1000
+COMPRESSION_LEVEL = 3
+SENTINEL = None
+
+
+class LogWriter:
+    """ログをバックグラウンドのスレッドでまとめてファイルへ書き込む
+
+    put() はキューに積むだけなので、呼び出し元がディスクI/Oで待たされることはない。
+    compression=True の場合は zstd で逐次圧縮しながら書き込む。
+    ファイルが max_bytes を超えたら filename.1, filename.2, ... とローテートする。
+    """
+
+    filename: str
+    compression: bool
+    max_bytes: int
+    backup_count: int
+    queue: SimpleQueue
+    thread: Thread
+    file: BinaryIO | None = None
+    compressor: ZstdCompressor | None = None
+    size: int = 0
+
+    def __init__(
+        self, *, filename: str, compression: bool, max_bytes: int, backup_count: int
+    ):
+        self.filename = filename
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue = SimpleQueue()
+        self.thread = Thread(target=self.run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, text: str):
+        self.queue.put(text)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(SENTINEL)
+            self.thread.join()
+
+    def run(self):
+        self.open()
+        while True:
+            # 1件目が来るまでは待ち、その後はキューに溜まっている分をまとめて書き込む
+            batch = [self.queue.get()]
+            while len(batch) < MAX_COUNT_BATCH_RECORDS:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+
+            is_closing = SENTINEL in batch
+            texts = [x for x in batch if x is not SENTINEL]
+            if texts:
+                self.write(binary="".join(f"{x}\n" for x in texts).encode())
+            if is_closing:
+                self.finish()
+                return
+
+    def open(self):
+        self.file = open(self.filename, "ab")
+        self.size = self.file.tell()
+        if self.compression:
+            self.compressor = ZstdCompressor(level=COMPRESSION_LEVEL)
+
+    def write(self, *, binary: bytes):
+        if self.compressor:
+            # ブロック単位でフラッシュし、異常終了しても書き込み済みの分は展開できるようにする
+            binary = self.compressor.compress(binary) + self.compressor.flush(
+                ZstdCompressor.FLUSH_BLOCK
+            )
+        self.file.write(binary)
+        self.file.flush()
+        self.size += len(binary)
+        if self.size >= self.max_bytes:
+            self.finish()
+            self.rotate()
+            self.open()
+
+    def finish(self):
+        if self.compressor:
+            self.file.write(self.compressor.flush(ZstdCompressor.FLUSH_FRAME))
+            self.compressor = None
+        self.file.close()
+        self.file = None
+
+    def rotate(self):
+        for index in range(self.backup_count - 1, 0, -1):
+            src = f"{self.filename}.{index}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.filename}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.filename, f"{self.filename}.1")
+        else:
+            os.remove(self.filename)
+
+
+class LogWriterHandler(Handler):
+    """整形したレコードを LogWriter に渡すだけのハンドラー"""
+
+    writer: LogWriter
+
+    def __init__(self, *, writer: LogWriter):
+        super().__init__()
+        self.writer = writer
+
+    def emit(self, record: LogRecord):
+        try:
+            self.writer.put(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+lock_log_writer = Lock()
+log_writer: LogWriter | None = None
+
+
+def get_log_writer() -> LogWriter:
+    """プロセス内で共有する LogWriter を返す (初回呼び出し時に作成する)"""
+    global log_writer
+    with lock_log_writer:
+        if log_writer is None:
+            log_writer = LogWriter(
+                filename=get_filename_log(),
+                compression=logging_settings.log_compression,
+                max_bytes=logging_settings.log_max_bytes,
+                backup_count=logging_settings.log_backup_count,
+            )
+            atexit.register(log_writer.close)
+        return log_writer
+
+
+def get_filename_log() -> str:
+    if logging_settings.log_compression:
+        return FILENAME_LOG_COMPRESSED
+    return FILENAME_LOG
+
+
+def list_log_filenames() -> list[str]:
+    """存在するログファイルを古い順に返す
+
+    圧縮している場合、zstd のフレームは連結しても展開できるので、この順に連結すれば1つのログになる
+    """
+    filename = get_filename_log()
+    candidates = [
+        f"{filename}.{index}"
+        for index in range(logging_settings.log_backup_count, 0, -1)
+    ]
+    candidates.append(filename)
+    return [x for x in candidates if os.path.exists(x)]
@@ -1,10 +1,15 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from functools import wraps
+from random import random
+from time import perf_counter
 from typing import Callable
 from uuid import uuid7
 
 from aws_lambda_powertools import Logger
 
+from .logging_settings import logging_settings
+from .summarize_value import summarize_value
+
 
 def logging_function(
     logger: Logger,
@@ -16,6 +21,51 @@ def logging_function(
     def decorator(func: Callable) -> Callable:
         @wraps(func)
         def process(*args, **kwargs):
+            # 計装の重さは呼び出しごとに logging_settings を見て切り替える
+            level = logging_settings.logging_function_level
+            if level == "off":
+                return func(*args, **kwargs)
+            if level == "full" or (
+                level == "sampled"
+                and random() < logging_settings.logging_function_sample_rate
+            ):
+                return process_full(args=args, kwargs=kwargs)
+            return process_timing(args=args, kwargs=kwargs)
+
+        def process_timing(*, args: tuple, kwargs: dict):
+            function_name = func.__name__
+            counter_start = perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                # 失敗した場合は調査のために引数も記録する
+                logger.debug(
+                    f"failed function `{function_name}`",
+                    data={
+                        "FunctionName": function_name,
+                        "Duration": str(
+                            timedelta(seconds=perf_counter() - counter_start)
+                        ),
+                        "Args": (summarize_value(args),),
+                        "KwArgs": summarize_value(kwargs),
+                        "Error": {"type": str(type(e)), "message": str(e)},
+                    },
+                    exc_info=True,
+                )
+                raise
+            if write:
+                logger.debug(
+                    f"succeeded function `{function_name}`",
+                    data={
+                        "FunctionName": function_name,
+                        "Duration": str(
+                            timedelta(seconds=perf_counter() - counter_start)
+                        ),
+                    },
+                )
+            return result
+
+        def process_full(*, args: tuple, kwargs: dict):
             function_name = func.__name__
             call_id = str(uuid7())
             dt_start = datetime.now(tz=timezone.utc)
@@ -26,10 +76,13 @@ def logging_function(
                 "CallID": call_id,
                 "StartTime": str(dt_start),
             }
+            # 大きな引数は要約し、開始時と終了時の両方で使い回す
+            summarized_args = None
+            if with_args:
+                summarized_args = (summarize_value(args),), summarize_value(kwargs)
             try:
                 if with_args:
-                    data_start["Args"] = (args,)
-                    data_start["KwArgs"] = kwargs
+                    data_start["Args"], data_start["KwArgs"] = summarized_args
                 if write:
                     logger.debug(
                         f"start function `{function_name}` ({call_id})", data=data_start
@@ -53,10 +106,14 @@ def logging_function(
                     "Duration": str(delta),
                 }
                 if with_return and not err:
-                    data_end["Return"] = result
+                    data_end["Return"] = summarize_value(result)
                 if with_args or err:
-                    data_end["Args"] = (args,)
-                    data_end["KwArgs"] = kwargs
+                    if summarized_args is None:
+                        summarized_args = (
+                            (summarize_value(args),),
+                            summarize_value(kwargs),
+                        )
+                    data_end["Args"], data_end["KwArgs"] = summarized_args
                 if err:
                     data_end["Error"] = {
                         "type": str(type(err)),
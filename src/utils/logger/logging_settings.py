@@ -0,0 +1,26 @@
+from typing import Literal
+
+from pydantic_settings import BaseSettings
+
+
+class LoggingSettings(BaseSettings):
+    # off: 記録しない / timing: 所要時間のみ /
+    # sampled: 所要時間に加えて一部の呼び出しのみ引数・戻り値も / full: すべての呼び出しで引数・戻り値も
+    logging_function_level: Literal["off", "timing", "sampled", "full"] = "full"
+    # sampled の場合に引数・戻り値も記録する割合
+    logging_function_sample_rate: float = 0.01
+    # これより要素数の多いコレクションは要約する
+    logging_function_max_items: int = 20
+    # これより長い文字列・バイト列は要約する
+    logging_function_max_chars: int = 4096
+    # Trueの場合は Notion から取得したページをそのまま記録する
+    log_notion_raw_pages: bool = False
+    # Trueの場合はログを zstd で圧縮しながら書き込む
+    log_compression: bool = True
+    # これを超えたらログファイルをローテートする
+    log_max_bytes: int = 256 * 1024 * 1024
+    # ローテートして残すログファイルの数
+    log_backup_count: int = 4
+
+
+logging_settings = LoggingSettings()
@@ -0,0 +1,46 @@
+from itertools import islice
+
+from .logging_settings import logging_settings
+
+MAX_DEPTH = 3
+COUNT_SAMPLE_ITEMS = 3
+
+
+def summarize_value(value, *, depth: int = 0):
+    """ログに出力する値が大きい場合に、構造だけを残した要約に置き換える"""
+    max_items = logging_settings.logging_function_max_items
+    max_chars = logging_settings.logging_function_max_chars
+
+    if isinstance(value, (bytes, bytearray)):
+        if len(value) > max_chars:
+            return {"type": str(type(value)), "length": len(value)}
+        return value
+    if isinstance(value, str):
+        if len(value) > max_chars:
+            return f"{value[:max_chars]}... ({len(value)} chars)"
+        return value
+    if not isinstance(value, (dict, list, tuple, set, frozenset)):
+        return value
+
+    if depth >= MAX_DEPTH:
+        return {"type": str(type(value)), "length": len(value)}
+    if len(value) > max_items:
+        if isinstance(value, dict):
+            sample = {
+                k: summarize_value(v, depth=depth + 1)
+                for k, v in islice(value.items(), COUNT_SAMPLE_ITEMS)
+            }
+        else:
+            sample = [
+                summarize_value(x, depth=depth + 1)
+                for x in islice(value, COUNT_SAMPLE_ITEMS)
+            ]
+        return {"type": str(type(value)), "length": len(value), "sample": sample}
+
+    if isinstance(value, dict):
+        return {k: summarize_value(v, depth=depth + 1) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return tuple(summarize_value(x, depth=depth + 1) for x in value)
+    if isinstance(value, list):
+        return [summarize_value(x, depth=depth + 1) for x in value]
+    return value
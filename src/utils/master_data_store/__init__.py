@@ -0,0 +1,5 @@
+from .compact_records import CompactRecords
+from .lazy_records import LazyRecords
+from .master_data_store import MasterDataStore
+
+__all__ = ["MasterDataStore", "LazyRecords", "CompactRecords"]
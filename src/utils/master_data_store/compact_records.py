@@ -0,0 +1,86 @@
+import sys
+from collections.abc import Iterator, MutableMapping
+
+from pydantic import BaseModel
+
+
+def pack_model(*, value: BaseModel, interned_fields: frozenset[str]) -> tuple:
+    """検証済みのモデルをフィールドの順に並べたタプルにする
+
+    interned_fields の文字列は sys.intern して、同じ値のレコード間で共有する。
+    リストは変更されないようにタプルにする。
+    """
+    row = []
+    # __dict__ にはフィールドの値がフィールドの順に入っている
+    for name, v in value.__dict__.items():
+        if name in interned_fields:
+            if isinstance(v, str):
+                v = sys.intern(v)
+            elif isinstance(v, list):
+                v = [sys.intern(x) if isinstance(x, str) else x for x in v]
+        if isinstance(v, list):
+            v = tuple(v)
+        row.append(v)
+    return tuple(row)
+
+
+class CompactRecords[T: BaseModel](MutableMapping[str, T]):
+    """レコードをフィールドの値のタプルで保持し、参照された時点でモデルを組み立てるマッピング
+
+    モデルのインスタンスごとの __dict__ や検証用の情報を持たないので、記事数が多くてもメモリを抑えられる。
+    キーは sys.intern するので、記事とメタ情報で同じ URL の文字列を共有する。
+    検証は読み込み時と代入されたモデルの生成時に済んでいるものとして、組み立てる際は再検証しない。
+    取り出したモデルは参照のたびに作り直すので、変更する場合は代入し直す。
+    """
+
+    model: type[T]
+    fields: tuple[str, ...]
+    interned_fields: frozenset[str]
+    rows: dict[str, tuple]
+
+    def __init__(
+        self,
+        *,
+        model: type[T],
+        interned_fields: frozenset[str] = frozenset(),
+        rows: dict[str, tuple] | None = None,
+    ):
+        self.model = model
+        self.fields = tuple(model.model_fields)
+        self.interned_fields = interned_fields
+        self.rows = {} if rows is None else rows
+
+    def __getitem__(self, key: str) -> T:
+        return self.model.model_construct(
+            _fields_set=set(self.fields), **self.unpack(self.rows[key])
+        )
+
+    def __setitem__(self, key: str, value: T):
+        self.rows[sys.intern(key)] = pack_model(
+            value=value, interned_fields=self.interned_fields
+        )
+
+    def __delitem__(self, key: str):
+        del self.rows[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.rows
+
+    def __repr__(self) -> str:
+        return f"CompactRecords(model={self.model.__name__}, count={len(self.rows)})"
+
+    def unpack(self, row: tuple) -> dict:
+        return {
+            name: list(v) if isinstance(v, tuple) else v
+            for name, v in zip(self.fields, row)
+        }
+
+    def dump_raw(self, key: str) -> dict:
+        """書き出し用に JSON 互換の dict を返す (モデルは組み立てない)"""
+        return self.unpack(self.rows[key])
@@ -0,0 +1,54 @@
+from collections.abc import Iterator, MutableMapping
+
+from pydantic import BaseModel
+
+
+class LazyRecords[T: BaseModel](MutableMapping[str, T]):
+    """JSON から読み込んだままの dict を保持し、参照された時点で検証するマッピング
+
+    値は未検証の dict か検証済みのモデルのどちらかで、順序は読み込み時のまま保つ。
+    参照されなかったレコードは書き出し時にも dict のまま使うため、
+    ほとんどのレコードに触れない実行では検証とモデルの生成を省ける。
+    """
+
+    model: type[T]
+    data: dict[str, dict | T]
+
+    def __init__(self, *, model: type[T], raw: dict[str, dict]):
+        self.model = model
+        self.data = raw
+
+    def __getitem__(self, key: str) -> T:
+        value = self.data[key]
+        if isinstance(value, dict):
+            value = self.data[key] = self.model.model_validate(value)
+        return value
+
+    def __setitem__(self, key: str, value: T):
+        self.data[key] = value
+
+    def __delitem__(self, key: str):
+        del self.data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.data
+
+    def __repr__(self) -> str:
+        count_validated = sum(1 for v in self.data.values() if not isinstance(v, dict))
+        return (
+            f"LazyRecords(model={self.model.__name__}, "
+            f"count={len(self.data)}, validated={count_validated})"
+        )
+
+    def dump_raw(self, key: str) -> dict:
+        """書き出し用に JSON 互換の dict を返す (未検証のものはそのまま返す)"""
+        value = self.data[key]
+        if isinstance(value, dict):
+            return value
+        return value.model_dump(mode="json")
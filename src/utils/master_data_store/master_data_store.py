@@ -0,0 +1,448 @@
+from __future__ import annotations
+
+import sys
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from typing import TYPE_CHECKING, NamedTuple
+
+import compression.zstd as zstd
+import orjson
+from botocore.exceptions import ClientError
+from pydantic import BaseModel, TypeAdapter
+
+from src.utils.logger import create_logger, logging_function
+from src.utils.methods import (
+    create_key_master_data,
+    create_key_master_data_manifest,
+    create_key_master_data_shard,
+)
+from src.utils.models import (
+    Author,
+    CardCacheEntry,
+    Changeset,
+    MasterData,
+    MasterDataManifest,
+    MetaPost,
+    Post,
+    ShardInfo,
+)
+
+from .compact_records import CompactRecords, pack_model
+from .lazy_records import LazyRecords
+
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+
+SHARD_AUTHORS = "authors"
+SHARD_THUMBNAILS = "thumbnails"
+SHARD_META_POSTS = "meta_posts"
+SHARD_STATE = "state"  # categories, tags, http_validators
+SHARD_CARD_DIGESTS = "card_digests"
+SHARD_CARDS = "cards"
+SHARD_CARD_BUCKET_HASHES = "card_bucket_hashes"
+SHARD_CARD_URLS_BY_AUTHOR = "card_urls_by_author"
+SHARD_CARD_URLS_BY_THUMBNAIL = "card_urls_by_thumbnail"
+PREFIX_SHARD_POSTS = "posts/"
+MAX_WORKERS = 8
+COMPRESSION_LEVEL = 3
+
+ADAPTER_POSTS = TypeAdapter(dict[str, Post])
+ADAPTER_AUTHORS = TypeAdapter(dict[str, Author])
+ADAPTER_THUMBNAILS = TypeAdapter(dict[str, str])
+ADAPTER_META_POSTS = TypeAdapter(dict[str, MetaPost])
+ADAPTER_CARDS = TypeAdapter(dict[str, CardCacheEntry])
+ADAPTER_CARD_URLS = TypeAdapter(dict[str, list[str]])
+
+logger = create_logger(__name__)
+
+
+class RecordSpec(NamedTuple):
+    """遅延読み込み・コンパクトな保持の対象のシャードのモデル"""
+
+    model: type[BaseModel]
+    interned_fields: frozenset[str]  # 複数のレコードで同じ値になりやすいフィールド
+
+
+RECORD_SPEC_POSTS = RecordSpec(
+    model=Post, interned_fields=frozenset({"url", "author_id", "thumbnail_id", "date"})
+)
+RECORD_SPEC_AUTHORS = RecordSpec(model=Author, interned_fields=frozenset({"id"}))
+RECORD_SPEC_META_POSTS = RecordSpec(
+    model=MetaPost, interned_fields=frozenset({"url", "category", "tags"})
+)
+
+
+def parse_record_spec(*, name: str) -> RecordSpec | None:
+    if name.startswith(PREFIX_SHARD_POSTS):
+        return RECORD_SPEC_POSTS
+    return {
+        SHARD_AUTHORS: RECORD_SPEC_AUTHORS,
+        SHARD_META_POSTS: RECORD_SPEC_META_POSTS,
+    }.get(name)
+
+
+def create_compact_records(
+    *, spec: RecordSpec, rows: dict[str, tuple]
+) -> CompactRecords:
+    return CompactRecords(
+        model=spec.model, interned_fields=spec.interned_fields, rows=rows
+    )
+
+
+def parse_shard_adapter(*, name: str) -> tuple[TypeAdapter, bool]:
+    """シャードの検証に使う TypeAdapter と、遅延読み込みの対象かを返す"""
+    if name.startswith(PREFIX_SHARD_POSTS):
+        return ADAPTER_POSTS, True
+    if name == SHARD_AUTHORS:
+        return ADAPTER_AUTHORS, True
+    if name == SHARD_META_POSTS:
+        return ADAPTER_META_POSTS, True
+    if name == SHARD_CARDS:
+        # build_data を作る時は全てのカードを使うので遅延読み込みしない
+        return ADAPTER_CARDS, False
+    if name in (SHARD_CARD_URLS_BY_AUTHOR, SHARD_CARD_URLS_BY_THUMBNAIL):
+        return ADAPTER_CARD_URLS, False
+    # thumbnails, card_digests, card_bucket_hashes (いずれも dict[str, str])
+    return ADAPTER_THUMBNAILS, False
+
+
+def dump_records(*, records: Mapping, keys: list[str], adapter: TypeAdapter) -> bytes:
+    """keys の順に並べたレコードを JSON にする
+
+    遅延読み込みで未検証のレコードやコンパクトに保持したレコードは、モデルを介さず dict から書き出す。
+    モデルのフィールド順で保存しているので、どちらの経路でも同じ bytes になる。
+    """
+    if isinstance(records, (LazyRecords, CompactRecords)):
+        return orjson.dumps({k: records.dump_raw(k) for k in keys})
+    return adapter.dump_json({k: records[k] for k in keys})
+
+
+def parse_shard_name_post(*, post: Post) -> str:
+    """記事は公開月ごとのシャードに分ける (post.date は "YYYY.MM.DD")"""
+    return PREFIX_SHARD_POSTS + post.date[:7].replace(".", "-")
+
+
+class MasterDataStore:
+    """master_data をマニフェストとシャードに分けて S3 に保存する
+
+    シャードのキーには内容のハッシュを含めて上書きしないようにし、
+    マニフェストを条件付きで書き込んだ時点で保存が確定する。
+    保存時は Changeset で変更のあったシャードだけを書き直す。
+    参照されなくなったシャードは、古いマニフェストを読んだ実行のために1世代残してから削除する。
+    マニフェストが無く旧形式の master_data.zstd.json がある場合はそちらを読み込み、
+    次の保存で全シャードを書き出す。
+    """
+
+    bucket: str
+    key_prefix: str
+    client: S3Client
+    manifest: MasterDataManifest | None  # None の場合は全シャードを書き出す
+    etag: str | None
+    shard_names_post: dict[str, str]  # key: url, value: 読み込み時のシャード名
+    lazy: bool  # True の場合は記事・著者・メタ情報を参照されるまで検証しない
+    compact: bool  # True の場合は記事・著者・メタ情報をタプルで保持する
+
+    def __init__(
+        self,
+        *,
+        bucket: str,
+        key_prefix: str,
+        client: S3Client,
+        lazy: bool = False,
+        compact: bool = False,
+    ):
+        if lazy and compact:
+            raise ValueError("lazy and compact cannot be enabled at the same time")
+        self.bucket = bucket
+        self.key_prefix = key_prefix
+        self.client = client
+        self.lazy = lazy
+        self.compact = compact
+        self.manifest = None
+        self.etag = None
+        self.shard_names_post = {}
+
+    @logging_function(logger, with_return=False)
+    def load(self) -> MasterData:
+        try:
+            resp = self.client.get_object(
+                Bucket=self.bucket,
+                Key=create_key_master_data_manifest(key_prefix=self.key_prefix),
+            )
+        except self.client.exceptions.NoSuchKey:
+            return self.load_legacy()
+        self.manifest = MasterDataManifest.model_validate_json(resp["Body"].read())
+        self.etag = resp["ETag"]
+
+        names = list(self.manifest.shards)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            shards = executor.map(lambda n: self.download_shard(name=n), names)
+            mapping_shards = dict(zip(names, shards))
+
+        posts = {}
+        for name, shard in mapping_shards.items():
+            if not name.startswith(PREFIX_SHARD_POSTS):
+                continue
+            posts.update(shard)
+            for url in shard:
+                self.shard_names_post[url] = name
+        authors = mapping_shards.get(SHARD_AUTHORS, {})
+        meta_posts = mapping_shards.get(SHARD_META_POSTS, {})
+        if self.lazy:
+            posts = LazyRecords(model=Post, raw=posts)
+            authors = LazyRecords(model=Author, raw=authors)
+            meta_posts = LazyRecords(model=MetaPost, raw=meta_posts)
+        if self.compact:
+            posts = create_compact_records(spec=RECORD_SPEC_POSTS, rows=posts)
+            authors = create_compact_records(spec=RECORD_SPEC_AUTHORS, rows=authors)
+            meta_posts = create_compact_records(
+                spec=RECORD_SPEC_META_POSTS, rows=meta_posts
+            )
+        state = mapping_shards.get(SHARD_STATE) or MasterData()
+        # 各シャードは検証済み (遅延読み込みの場合は参照時に検証する) なので再検証しない
+        return MasterData.model_construct(
+            posts=posts,
+            authors=authors,
+            thumbnails=mapping_shards.get(SHARD_THUMBNAILS, {}),
+            meta_posts=meta_posts,
+            categories=state.categories,
+            tags=state.tags,
+            http_validators=state.http_validators,
+            card_digests=mapping_shards.get(SHARD_CARD_DIGESTS, {}),
+            cards=mapping_shards.get(SHARD_CARDS, {}),
+            card_bucket_hashes=mapping_shards.get(SHARD_CARD_BUCKET_HASHES, {}),
+            card_urls_by_author=mapping_shards.get(SHARD_CARD_URLS_BY_AUTHOR, {}),
+            card_urls_by_thumbnail=mapping_shards.get(SHARD_CARD_URLS_BY_THUMBNAIL, {}),
+            prev_hash=self.manifest.prev_hash,
+            build_data_variants=self.manifest.build_data_variants,
+            cards_root_hash=self.manifest.cards_root_hash,
+            contentful_updated_at=self.manifest.contentful_updated_at,
+            notion_last_edited_time=self.manifest.notion_last_edited_time,
+            notion_reconciled_at=self.manifest.notion_reconciled_at,
+        )
+
+    @logging_function(logger, with_return=False)
+    def load_legacy(self) -> MasterData:
+        try:
+            resp = self.client.get_object(
+                Bucket=self.bucket,
+                Key=create_key_master_data(key_prefix=self.key_prefix),
+            )
+        except self.client.exceptions.NoSuchKey:
+            return MasterData()
+        return MasterData.model_validate_json(zstd.decompress(resp["Body"].read()))
+
+    def download_shard(self, *, name: str) -> dict | MasterData:
+        """シャードを取得し、bytes から直接検証する
+
+        遅延読み込みの場合は dict のまま返し、コンパクトに保持する場合は検証したモデルをタプルにして返す。
+        """
+        info = self.manifest.shards[name]
+        resp = self.client.get_object(Bucket=self.bucket, Key=info.key)
+        binary = zstd.decompress(resp["Body"].read())
+        if name == SHARD_STATE:
+            return MasterData.model_validate_json(binary)
+        adapter, is_lazy_target = parse_shard_adapter(name=name)
+        if self.lazy and is_lazy_target:
+            return orjson.loads(binary)
+        records = adapter.validate_json(binary)
+        if self.compact and (spec := parse_record_spec(name=name)) is not None:
+            # シャードごとにタプルにして、全レコードのモデルが同時にメモリに載らないようにする
+            return {
+                sys.intern(k): pack_model(value=v, interned_fields=spec.interned_fields)
+                for k, v in records.items()
+            }
+        return records
+
+    @logging_function(logger, with_args=False)
+    def save(self, *, master_data: MasterData, changeset: Changeset):
+        if self.manifest is not None and changeset.is_empty:
+            logger.info("nothing changed, skip saving master_data")
+            return
+        if self.manifest is None:
+            # 全シャードを書き出す
+            changeset = Changeset(
+                posts=set(master_data.posts),
+                authors=set(master_data.authors),
+                thumbnails=set(master_data.thumbnails),
+                meta_posts=set(master_data.meta_posts),
+                cursors=True,
+                cards=set(master_data.card_digests) | set(master_data.cards),
+            )
+        shard_names_post = self.parse_shard_names_post(
+            master_data=master_data, changeset=changeset
+        )
+        mapping_shards = self.dump_shards(
+            master_data=master_data,
+            names=self.parse_dirty_shard_names(
+                changeset=changeset, shard_names_post=shard_names_post
+            ),
+            shard_names_post=shard_names_post,
+        )
+
+        shards_current = {} if self.manifest is None else self.manifest.shards
+        shards_next = dict(shards_current)
+        items_upload = []
+        for name, (binary, count) in mapping_shards.items():
+            if count == 0:
+                shards_next.pop(name, None)
+                continue
+            hash_shard = sha256(binary).hexdigest()
+            info_current = shards_current.get(name)
+            if info_current is not None and info_current.sha256 == hash_shard:
+                continue
+            key = create_key_master_data_shard(
+                key_prefix=self.key_prefix, name=name, sha256=hash_shard
+            )
+            shards_next[name] = ShardInfo(key=key, sha256=hash_shard, count=count)
+            items_upload.append((key, binary))
+        keys_next = {info.key for info in shards_next.values()}
+        keys_retired = sorted(
+            info.key for info in shards_current.values() if info.key not in keys_next
+        )
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            list(executor.map(lambda item: self.upload_shard(*item), items_upload))
+
+        manifest = MasterDataManifest(
+            shards=dict(sorted(shards_next.items())),
+            prev_hash=master_data.prev_hash,
+            build_data_variants=master_data.build_data_variants,
+            cards_root_hash=master_data.cards_root_hash,
+            contentful_updated_at=master_data.contentful_updated_at,
+            notion_last_edited_time=master_data.notion_last_edited_time,
+            notion_reconciled_at=master_data.notion_reconciled_at,
+            retired_keys=keys_retired,
+        )
+        retired_keys_prev = [] if self.manifest is None else self.manifest.retired_keys
+        self.etag = self.upload_manifest(manifest=manifest)
+        self.manifest = manifest
+
+        # 直前のマニフェストを読んだ実行がまだシャードを取得している可能性があるので、
+        # 参照されなくなったシャードは1世代残し、その前の世代で参照されなくなったものを削除する
+        for key in retired_keys_prev:
+            if key not in keys_next and key not in keys_retired:
+                self.client.delete_object(Bucket=self.bucket, Key=key)
+        self.shard_names_post = shard_names_post
+
+    def parse_shard_names_post(
+        self, *, master_data: MasterData, changeset: Changeset
+    ) -> dict[str, str]:
+        """記事ごとの保存先シャード名を返す
+
+        変更の無い記事は読み込み時のシャード名を使い、記事そのものには触れない。
+        """
+        result = {}
+        for url in master_data.posts:
+            name = self.shard_names_post.get(url)
+            if name is None or url in changeset.posts:
+                name = parse_shard_name_post(post=master_data.posts[url])
+            result[url] = name
+        return result
+
+    @logging_function(logger, with_args=False)
+    def parse_dirty_shard_names(
+        self, *, changeset: Changeset, shard_names_post: dict[str, str]
+    ) -> set[str]:
+        names = set()
+        for url in changeset.posts:
+            names.add(shard_names_post[url])
+            # 公開日が変わった場合は移動元のシャードも書き直す
+            if (name_prev := self.shard_names_post.get(url)) is not None:
+                names.add(name_prev)
+        if changeset.authors:
+            names.add(SHARD_AUTHORS)
+        if changeset.thumbnails:
+            names.add(SHARD_THUMBNAILS)
+        if changeset.meta_posts:
+            names.add(SHARD_META_POSTS)
+        if changeset.cards:
+            names.add(SHARD_CARD_DIGESTS)
+            names.add(SHARD_CARDS)
+            names.add(SHARD_CARD_BUCKET_HASHES)
+            names.add(SHARD_CARD_URLS_BY_AUTHOR)
+            names.add(SHARD_CARD_URLS_BY_THUMBNAIL)
+        if changeset.categories or changeset.tags or changeset.cursors:
+            names.add(SHARD_STATE)
+        return names
+
+    def dump_shards(
+        self,
+        *,
+        master_data: MasterData,
+        names: set[str],
+        shard_names_post: dict[str, str],
+    ) -> dict[str, tuple[bytes, int]]:
+        """シャード名ごとに JSON の bytes と件数を返す"""
+        mapping_urls = {name: [] for name in names}
+        for url, name in shard_names_post.items():
+            if name in mapping_urls:
+                mapping_urls[name].append(url)
+        mapping_records = {
+            SHARD_AUTHORS: master_data.authors,
+            SHARD_THUMBNAILS: master_data.thumbnails,
+            SHARD_META_POSTS: master_data.meta_posts,
+            SHARD_CARD_DIGESTS: master_data.card_digests,
+            SHARD_CARDS: master_data.cards,
+            SHARD_CARD_BUCKET_HASHES: master_data.card_bucket_hashes,
+            SHARD_CARD_URLS_BY_AUTHOR: master_data.card_urls_by_author,
+            SHARD_CARD_URLS_BY_THUMBNAIL: master_data.card_urls_by_thumbnail,
+        }
+
+        result = {}
+        for name in sorted(names):
+            if name == SHARD_STATE:
+                # 読み込み順に依らず同じ内容が同じハッシュになるようにキーを整列する
+                binary = orjson.dumps(
+                    master_data.model_dump(
+                        mode="json", include={"categories", "tags", "http_validators"}
+                    ),
+                    option=orjson.OPT_SORT_KEYS,
+                )
+                result[name] = binary, 1
+                continue
+            if name.startswith(PREFIX_SHARD_POSTS):
+                records = master_data.posts
+                keys = sorted(mapping_urls[name])
+            else:
+                records = mapping_records[name]
+                keys = sorted(records)
+            adapter, _ = parse_shard_adapter(name=name)
+            binary = dump_records(records=records, keys=keys, adapter=adapter)
+            result[name] = binary, len(keys)
+        return result
+
+    def upload_shard(self, key: str, binary: bytes):
+        self.client.put_object(
+            Body=zstd.compress(binary, level=COMPRESSION_LEVEL),
+            Bucket=self.bucket,
+            Key=key,
+        )
+
+    @logging_function(logger)
+    def upload_manifest(self, *, manifest: MasterDataManifest) -> str:
+        """読み込んだ時点からマニフェストが書き換えられていない場合のみ書き込む
+
+        別の実行が先に書き込んでいた場合は上書きせずに例外を送出する。
+        """
+        # 初回は存在しないことを条件にする
+        condition = (
+            {"IfMatch": self.etag} if self.etag is not None else {"IfNoneMatch": "*"}
+        )
+        try:
+            resp = self.client.put_object(
+                Body=manifest.model_dump_json().encode(),
+                Bucket=self.bucket,
+                Key=create_key_master_data_manifest(key_prefix=self.key_prefix),
+                ContentType="application/json",
+                **condition,
+            )
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            if code in ("PreconditionFailed", "ConditionalRequestConflict"):
+                logger.warning(
+                    "master_data was modified by another run",
+                    data={"code": code, "etag": self.etag},
+                )
+            raise
+        return resp["ETag"]
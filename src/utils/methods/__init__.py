@@ -1,4 +1,15 @@
 from .create_key_build_data import create_key_build_data
+from .create_key_build_data_manifest import create_key_build_data_manifest
+from .create_key_build_data_shard import create_key_build_data_shard
 from .create_key_master_data import create_key_master_data
+from .create_key_master_data_manifest import create_key_master_data_manifest
+from .create_key_master_data_shard import create_key_master_data_shard
 
-__all__ = ["create_key_master_data", "create_key_build_data"]
+__all__ = [
+    "create_key_master_data",
+    "create_key_master_data_manifest",
+    "create_key_master_data_shard",
+    "create_key_build_data",
+    "create_key_build_data_manifest",
+    "create_key_build_data_shard",
+]
@@ -0,0 +1,9 @@
+from src.utils.logger import create_logger, logging_function
+from src.utils.variables import KEY_SUFFIX_BUILD_DATA_SHARDS
+
+logger = create_logger(__name__)
+
+
+@logging_function(logger)
+def create_key_build_data_shard(*, key_prefix: str, name: str, sha256: str) -> str:
+    return f"{key_prefix}/{KEY_SUFFIX_BUILD_DATA_SHARDS}/{name}.{sha256[:16]}.json"
@@ -1,7 +1,22 @@
 from .author import Author
+from .card_cache_entry import CardCacheEntry
+from .changeset import Changeset
 from .environment_variables import EnvironmentVariables
+from .http_validator import HttpValidator
 from .master_data import MasterData
+from .master_data_manifest import MasterDataManifest, ShardInfo
 from .meta_post import MetaPost
 from .post import Post
 
-__all__ = ["EnvironmentVariables", "Author", "Post", "MetaPost", "MasterData"]
+__all__ = [
+    "EnvironmentVariables",
+    "Author",
+    "Post",
+    "MetaPost",
+    "MasterData",
+    "HttpValidator",
+    "Changeset",
+    "MasterDataManifest",
+    "ShardInfo",
+    "CardCacheEntry",
+]
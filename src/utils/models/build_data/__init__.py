@@ -1,4 +1,15 @@
 from .build_data import BuildData
+from .build_data_indexes import BuildDataIndexes
+from .build_data_manifest import BuildDataManifest
+from .build_data_shard_info import BuildDataShardInfo
 from .card import Card
+from .encoded_object import EncodedObject
 
-__all__ = ["BuildData", "Card"]
+__all__ = [
+    "BuildData",
+    "BuildDataIndexes",
+    "BuildDataManifest",
+    "BuildDataShardInfo",
+    "Card",
+    "EncodedObject",
+]
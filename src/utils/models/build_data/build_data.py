@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 
+from .build_data_indexes import BuildDataIndexes
 from .card import Card
 
 
@@ -7,3 +8,4 @@ class BuildData(BaseModel):
     cards: list[Card]
     categories: dict[str, str]  # key: id, value: name
     tags: dict[str, str]  # key: id, value: name
+    indexes: BuildDataIndexes = BuildDataIndexes()
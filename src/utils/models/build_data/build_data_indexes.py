@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+
+class BuildDataIndexes(BaseModel):
+    """カードの並び順・絞り込みの索引 (値はいずれも cards の位置)
+
+    各リストは公開日時の新しい順に並んでいるので、絞り込んだ結果をそのまま表示できる。
+    """
+
+    by_date: list[int] = []
+    by_category: dict[str, list[int]] = {}  # key: category id
+    by_tag: dict[str, list[int]] = {}  # key: tag id
+    by_author: dict[str, list[int]] = {}  # key: author_url
@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+
+from .build_data_indexes import BuildDataIndexes
+from .build_data_shard_info import BuildDataShardInfo
+
+
+class BuildDataManifest(BaseModel):
+    version: int = 1
+    # key: シャード名 (公開月、例: "2025-12")
+    shards: dict[str, BuildDataShardInfo] = {}
+    categories: dict[str, str] = {}  # key: id, value: name
+    tags: dict[str, str] = {}  # key: id, value: name
+    # 位置は shards をキーの順に並べ、各シャードのカードを連結した並びでの位置
+    indexes: BuildDataIndexes = BuildDataIndexes()
+    # 1つ前のマニフェストまで参照されていたシャードのキー
+    # (古いマニフェストを読んだクライアントのために残しておき、次の更新で削除する)
+    retired_keys: list[str] = []
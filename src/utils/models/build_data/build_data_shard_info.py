@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+from .encoded_object import EncodedObject
+
+
+class BuildDataShardInfo(BaseModel):
+    """公開した build_data のシャード"""
+
+    key: str  # 内容の sha256 を含むので、同じキーの内容は変わらない
+    sha256: str
+    count: int
+    # key: Content-Encoding ("gzip", "br", "zstd")
+    encodings: dict[str, EncodedObject] = {}
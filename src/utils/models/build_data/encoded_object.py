@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+
+class EncodedObject(BaseModel):
+    """圧縮してアップロードしたオブジェクト"""
+
+    key: str
+    size: int  # 圧縮後の bytes
+    sha256: str  # 圧縮後の内容のハッシュ
@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+
+from .build_data.card import Card
+
+
+class CardCacheEntry(BaseModel):
+    source_hash: str  # カードの作成元 (記事・メタ情報・著者・サムネイル) の sha256
+    card: Card
+    author_id: str = ""
+    # post.thumbnail_url が無く、サムネイルを参照する場合の ID
+    thumbnail_id: str | None = None
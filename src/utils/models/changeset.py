@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from pydantic import BaseModel
+
+
+class Changeset(BaseModel):
+    posts: set[str] = set()  # key: url
+    authors: set[str] = set()  # key: id
+    thumbnails: set[str] = set()  # key: id
+    meta_posts: set[str] = set()  # key: url
+    categories: bool = False
+    tags: bool = False
+    cursors: bool = False  # 差分取得のカーソルなど、ビルドデータに影響しない変更
+    # key: url, カードとそのハッシュ (master_data.cards, card_digests) の変更
+    cards: set[str] = set()
+
+    @property
+    def is_content_changed(self) -> bool:
+        """ビルドデータに影響する変更があるか"""
+        return bool(
+            self.posts
+            or self.authors
+            or self.thumbnails
+            or self.meta_posts
+            or self.categories
+            or self.tags
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        """master_data を保存し直す必要が無いか"""
+        return not self.is_content_changed and not self.cursors and not self.cards
+
+    def merge(self, other: Changeset) -> Changeset:
+        return Changeset(
+            posts=self.posts | other.posts,
+            authors=self.authors | other.authors,
+            thumbnails=self.thumbnails | other.thumbnails,
+            meta_posts=self.meta_posts | other.meta_posts,
+            categories=self.categories or other.categories,
+            tags=self.tags or other.tags,
+            cursors=self.cursors or other.cursors,
+            cards=self.cards | other.cards,
+        )
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 
@@ -9,3 +11,25 @@ class EnvironmentVariables(BaseSettings):
     key_prefix: str  # Github Organization名を使用する
     reference_category: str
     base_url_api_contentful: str
+    base_url_api_notion: str = "https://api.notion.com"  # 検証時にスタブへ向ける
+    contentful_max_workers: int = 4
+    contentful_requests_per_sec: float = 5  # 全スレッド合計での平均リクエスト数
+    contentful_burst: int = 1  # 平均を超えて連続で送ってよいリクエスト数
+    contentful_timeout_sec: float = 60  # 接続・読み込み・接続の空き待ちそれぞれの上限
+    entity_cache_path: str = "cache/entity_cache.sqlite3"
+    entity_cache_max_entries: int = 100_000
+    entity_cache_ttl_hours_author: float = 24 * 7
+    entity_cache_ttl_hours_thumbnail: float = 24 * 30
+    contentful_full_scan: bool = False  # Trueの場合は差分ではなく全記事を取得する
+    notion_full_scan: bool = False  # Trueの場合は差分ではなく全ページを取得する
+    notion_full_reconcile_interval_hours: int = 24 * 7  # 全ページを取得し直す間隔
+    notion_max_workers: int = 3  # ページの作成・更新を同時に行う数
+    notion_requests_per_sec: float = 2.5  # 全スレッド合計での平均リクエスト数
+    notion_burst: int = 3  # 平均を超えて連続で送ってよいリクエスト数
+    master_data_lazy: bool = False  # Trueの場合は記事などを参照されるまで検証しない
+    # Trueの場合は記事などをタプルで保持してメモリを抑える
+    master_data_compact: bool = False
+    # single: build_data.json のみ / sharded: マニフェストと公開月ごとのシャードのみ / both: 両方
+    build_data_output: Literal["single", "sharded", "both"] = "single"
+    # build_data を圧縮してアップロードする方式 (Content-Encoding の値)
+    build_data_encodings: list[Literal["gzip", "br", "zstd"]] = ["gzip", "br", "zstd"]
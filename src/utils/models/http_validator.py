@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+
+class HttpValidator(BaseModel):
+    etag: str | None
+    last_modified: str | None
+    keys: list[str] = []  # レスポンスから変換したオブジェクトの master_data 上のキー
+    total: int = 0  # 一覧取得の場合のレスポンスの total
+    # 一覧取得の場合に続きを取得するための値 (最後の要素の sys.updatedAt など)
+    cursor: str = ""
@@ -1,6 +1,9 @@
 from pydantic import BaseModel
 
 from .author import Author
+from .build_data.encoded_object import EncodedObject
+from .card_cache_entry import CardCacheEntry
+from .http_validator import HttpValidator
 from .meta_post import MetaPost
 from .post import Post
 
@@ -13,3 +16,18 @@ class MasterData(BaseModel):
     categories: dict[str, str] = {}  # key: id, value: name
     tags: dict[str, str] = {}  # key: id, value: name
     prev_hash: str = ""
+    # key: encoding, value: prev_hash の build_data.json の圧縮版 (キー・サイズ・ハッシュ)
+    build_data_variants: dict[str, EncodedObject] = {}
+    contentful_updated_at: str = ""  # 取得済みの記事の sys.updatedAt の最大値
+    notion_last_edited_time: str = ""  # 取得済みのページの last_edited_time の最大値
+    notion_reconciled_at: str = ""  # 最後にNotionを全件取得した日時 (ISO 8601)
+    http_validators: dict[str, HttpValidator] = {}  # key: url
+    card_digests: dict[str, str] = {}  # key: url, value: カードの sha256
+    cards: dict[str, CardCacheEntry] = {}  # key: url, 前回までに作ったカード
+    # key: バケット (URL の sha256 の先頭2文字), value: バケット内のカードのハッシュの XOR
+    card_bucket_hashes: dict[str, str] = {}
+    # key: author id, value: カードの URL
+    card_urls_by_author: dict[str, list[str]] = {}
+    # key: thumbnail id, value: カードの URL
+    card_urls_by_thumbnail: dict[str, list[str]] = {}
+    cards_root_hash: str = ""  # card_digests とカテゴリ・タグをまとめたハッシュ
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+
+from .build_data.encoded_object import EncodedObject
+
+
+class ShardInfo(BaseModel):
+    key: str  # 内容の sha256 を含むので、同じキーの内容は変わらない
+    sha256: str
+    count: int
+
+
+class MasterDataManifest(BaseModel):
+    version: int = 1
+    # key: シャード名 (例: "authors", "posts/2025-12")
+    shards: dict[str, ShardInfo] = {}
+    prev_hash: str = ""
+    build_data_variants: dict[str, EncodedObject] = {}  # key: encoding
+    cards_root_hash: str = ""
+    contentful_updated_at: str = ""
+    notion_last_edited_time: str = ""
+    notion_reconciled_at: str = ""
+    # 参照されなくなったシャードのキー (古いマニフェストを読んだ実行のために1世代残してから削除する)
+    retired_keys: list[str] = []
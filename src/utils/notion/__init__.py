@@ -1,3 +1,4 @@
 from .create_notion_client import create_notion_client
+from .iterate_paginated_api_prefetched import iterate_paginated_api_prefetched
 
-__all__ = ["create_notion_client"]
+__all__ = ["create_notion_client", "iterate_paginated_api_prefetched"]
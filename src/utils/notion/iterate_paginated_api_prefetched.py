@@ -0,0 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterator
+
+
+def iterate_paginated_api_prefetched(
+    function: Callable[..., Any], **kwargs: Any
+) -> Iterator[Any]:
+    """notion_client.helpers.iterate_paginated_api と同様に結果を1件ずつ返す
+
+    ページを受け取った時点で次のページの取得をバックグラウンドで開始するため、
+    呼び出し側が現在のページを処理している間に次のページの通信が進む。
+    保持するのは処理中のページと取得中のページの2ページ分のみ。
+    """
+    next_cursor = kwargs.pop("start_cursor", None)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(function, **kwargs, start_cursor=next_cursor)
+        while future is not None:
+            response = future.result()
+            next_cursor = response.get("next_cursor")
+            if response.get("has_more") and next_cursor:
+                future = executor.submit(function, **kwargs, start_cursor=next_cursor)
+            else:
+                future = None
+            yield from response.get("results")
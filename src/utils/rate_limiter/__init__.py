@@ -0,0 +1,18 @@
+from .rate_limiter import (
+    MAX_RETRY_COUNT,
+    RETRYABLE_STATUS_CODES,
+    RateLimiter,
+    TokenBucket,
+    calculate_backoff,
+)
+
+rate_limiter = RateLimiter()
+
+__all__ = [
+    "MAX_RETRY_COUNT",
+    "RETRYABLE_STATUS_CODES",
+    "RateLimiter",
+    "TokenBucket",
+    "calculate_backoff",
+    "rate_limiter",
+]
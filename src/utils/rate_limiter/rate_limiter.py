@@ -0,0 +1,129 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from math import isnan
+from random import uniform
+from threading import Lock
+from time import monotonic, sleep
+
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRY_COUNT = 6
+BACKOFF_BASE_SEC = 1.0
+BACKOFF_MAX_SEC = 60.0
+DEFAULT_REQUESTS_PER_SEC = 1.0
+DEFAULT_BURST = 1
+
+
+class TokenBucket:
+    """平均 requests_per_sec 件/秒、最大 burst 件まで連続で送れるトークンバケット
+
+    複数スレッドから同時に使われることを想定している。
+    block() が呼ばれた場合は、その期間すべてのリクエストを止める。
+    """
+
+    requests_per_sec: float | int
+    burst: int
+    tokens: float
+    refilled_at: float
+    blocked_until: float = 0.0
+    lock: Lock
+
+    def __init__(self, *, requests_per_sec: float | int, burst: int):
+        self.requests_per_sec = requests_per_sec
+        self.burst = burst
+        self.tokens = burst
+        self.refilled_at = monotonic()
+        self.lock = Lock()
+
+    def acquire(self) -> float:
+        """トークンを1つ取得する。待機した秒数を返す"""
+        slept_sec = 0.0
+        while True:
+            with self.lock:
+                now = monotonic()
+                elapsed = now - self.refilled_at
+                self.tokens = min(
+                    self.burst, self.tokens + elapsed * self.requests_per_sec
+                )
+                self.refilled_at = now
+                wait_sec = self.blocked_until - now
+                if wait_sec <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return slept_sec
+                    wait_sec = (1 - self.tokens) / self.requests_per_sec
+            sleep(wait_sec)
+            slept_sec += wait_sec
+
+    def block(self, *, seconds: float):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, monotonic() + seconds)
+            self.tokens = 0
+
+
+class RateLimiter:
+    """ホストごとに TokenBucket を持つレートリミッター
+
+    Contentful と Notion のクライアントで共有する。
+    """
+
+    buckets: dict[str, TokenBucket]  # key: host (ポートを指定している場合は host:port)
+    slept_sec: dict[str, float]  # key: host, value: acquire で待機した秒数の合計
+    lock: Lock
+
+    def __init__(self):
+        self.buckets = {}
+        self.slept_sec = {}
+        self.lock = Lock()
+
+    def configure(self, *, host: str, requests_per_sec: float | int, burst: int):
+        with self.lock:
+            self.buckets[host] = TokenBucket(
+                requests_per_sec=requests_per_sec, burst=burst
+            )
+
+    def get_bucket(self, *, host: str) -> TokenBucket:
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(
+                    requests_per_sec=DEFAULT_REQUESTS_PER_SEC, burst=DEFAULT_BURST
+                )
+                self.buckets[host] = bucket
+            return bucket
+
+    def acquire(self, *, host: str) -> float:
+        slept_sec = self.get_bucket(host=host).acquire()
+        if slept_sec > 0:
+            with self.lock:
+                self.slept_sec[host] = self.slept_sec.get(host, 0.0) + slept_sec
+        return slept_sec
+
+    def block(self, *, host: str, seconds: float):
+        self.get_bucket(host=host).block(seconds=seconds)
+
+
+def calculate_backoff(*, count: int, retry_after: str | None = None) -> float:
+    """count 回目 (0始まり) の再試行までに待つ秒数
+
+    Retry-After があればそれに従い、なければ full jitter 付きの指数バックオフとする。
+    Retry-After が不正に大きい場合にホストへのリクエストを止め続けないよう、BACKOFF_MAX_SEC で打ち切る。
+    """
+    if retry_after:
+        seconds = parse_retry_after(retry_after=retry_after)
+        if seconds is not None:
+            return min(max(seconds, 0.0), BACKOFF_MAX_SEC)
+    return uniform(0, min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * 2**count))
+
+
+def parse_retry_after(*, retry_after: str) -> float | None:
+    """Retry-After (秒数または HTTP の日時) を秒数にする。解釈できない場合は None を返す"""
+    try:
+        seconds = float(retry_after)
+        return None if isnan(seconds) else seconds
+    except ValueError:
+        pass
+    try:
+        dt = parsedate_to_datetime(retry_after)
+        return (dt - datetime.now(tz=timezone.utc)).total_seconds()
+    except (TypeError, ValueError):
+        return None
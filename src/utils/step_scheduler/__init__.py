@@ -0,0 +1,3 @@
+from .step_scheduler import Stage, StageTiming, StepScheduler
+
+__all__ = ["Stage", "StageTiming", "StepScheduler"]
@@ -0,0 +1,119 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from time import perf_counter
+from typing import Any, Callable, NamedTuple
+
+from src.utils.logger import create_logger
+
+logger = create_logger(__name__)
+
+
+class Stage(NamedTuple):
+    """ワークフローの1段階
+
+    func は inputs の名前をキーワード引数として受け取り、outputs の順に値を返す
+    (outputs が1つの場合はその値を、0個の場合は None を返す)。
+    """
+
+    name: str
+    func: Callable[..., Any]
+    inputs: tuple[str, ...] = ()
+    outputs: tuple[str, ...] = ()
+
+
+class StageTiming(NamedTuple):
+    name: str
+    started_sec: float  # run() の開始からの経過秒数
+    finished_sec: float
+
+    @property
+    def duration_sec(self) -> float:
+        return self.finished_sec - self.started_sec
+
+
+class StepScheduler:
+    """入力が揃った Stage から順に、依存関係の無いものは並行して実行する
+
+    Stage が例外を送出した場合は、実行中の Stage の完了を待ってから例外を送出する
+    (まだ開始していない Stage は実行しない)。
+    """
+
+    stages: list[Stage]
+    max_workers: int
+    timings: list[StageTiming]
+
+    def __init__(self, *, stages: list[Stage], max_workers: int = 4):
+        names_output = set()
+        for stage in stages:
+            duplicated = names_output.intersection(stage.outputs)
+            if duplicated:
+                raise ValueError(f"outputs {duplicated} are produced more than once")
+            names_output.update(stage.outputs)
+        self.stages = stages
+        self.max_workers = max_workers
+        self.timings = []
+
+    def run(self, *, values: dict[str, Any]) -> dict[str, Any]:
+        """values を初期値として全 Stage を実行し、全ての出力を含む dict を返す"""
+        values = dict(values)
+        pending = list(self.stages)
+        running: dict[Future, Stage] = {}
+        counter_start = perf_counter()
+        self.timings = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for stage in [x for x in pending if set(x.inputs) <= values.keys()]:
+                    pending.remove(stage)
+                    kwargs = {k: values[k] for k in stage.inputs}
+                    future = executor.submit(
+                        self.run_stage,
+                        stage=stage,
+                        kwargs=kwargs,
+                        counter_start=counter_start,
+                    )
+                    running[future] = stage
+                if not running:
+                    names = [x.name for x in pending]
+                    raise ValueError(f"inputs of stages {names} are never produced")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    result, timing = future.result()
+                    self.timings.append(timing)
+                    values.update(parse_outputs(stage=stage, result=result))
+
+        logger.info(
+            "stage timings",
+            data={
+                "total_sec": perf_counter() - counter_start,
+                "stages": [
+                    {**x._asdict(), "duration_sec": x.duration_sec}
+                    for x in self.timings
+                ],
+            },
+        )
+        return values
+
+    @staticmethod
+    def run_stage(
+        *, stage: Stage, kwargs: dict[str, Any], counter_start: float
+    ) -> tuple[Any, StageTiming]:
+        started_sec = perf_counter() - counter_start
+        result = stage.func(**kwargs)
+        finished_sec = perf_counter() - counter_start
+        logger.debug(
+            f"stage `{stage.name}` finished",
+            data={"duration_sec": finished_sec - started_sec},
+        )
+        return result, StageTiming(
+            name=stage.name, started_sec=started_sec, finished_sec=finished_sec
+        )
+
+
+def parse_outputs(*, stage: Stage, result: Any) -> dict[str, Any]:
+    if len(stage.outputs) == 0:
+        return {}
+    if len(stage.outputs) == 1:
+        return {stage.outputs[0]: result}
+    return dict(zip(stage.outputs, result, strict=True))
@@ -1,3 +1,8 @@
 KEY_SUFFIX_MASTER_DATA = "master_data.zstd.json"
+KEY_SUFFIX_MASTER_DATA_MANIFEST = "master_data/manifest.json"
+KEY_SUFFIX_MASTER_DATA_SHARDS = "master_data/shards"
 FILENAME_LOG = "std.log"
+FILENAME_LOG_COMPRESSED = "std.log.zst"
 KEY_SUFFIX_BUILD_DATA = "build_data.json"
+KEY_SUFFIX_BUILD_DATA_MANIFEST = "build_data/manifest.json"
+KEY_SUFFIX_BUILD_DATA_SHARDS = "build_data/shards"
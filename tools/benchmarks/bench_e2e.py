@@ -0,0 +1,426 @@
+"""Contentful・Notion・S3 のスタブに対してワークフロー全体を実行し、性能を計測する
+
+    uv run python -m tools.benchmarks.bench_e2e --count-posts 1000 --output result.json
+
+合成したデータをスタブに投入し、初回 (S3 が空の状態) の実行のあとに、
+--change-rate の割合の記事を変更してから再実行することを --count-warm-runs 回繰り返す。
+各実行は別プロセスで行い、以下を計測する。
+- ステップごと (--target main の場合は main() 全体) の所要時間
+- スタブのエンドポイントごとのリクエスト数と送受信した bytes
+- レートリミッターで待機した秒数 (ホストごと、全スレッドの合計なので所要時間を超えうる)
+- プロセスのピークRSS
+結果は JSON で --output に書き出す (指定しない場合は表だけを表示する)。
+レート制限は本番と同じ設定で計測する。
+変える場合は --contentful-requests-per-sec などで指定する。
+"""
+
+import os
+import platform
+import subprocess
+import sys
+from argparse import SUPPRESS, ArgumentParser
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from random import Random
+from resource import RUSAGE_SELF, getrusage
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from urllib.request import urlopen
+
+import orjson
+
+BUCKET = "bench"
+KEY_PREFIX = "bench"
+REFERENCE_CATEGORY = "reinvent"
+DATA_SOURCE_ID = "bench-data-source"
+COUNT_CATEGORIES = 20
+COUNT_TAGS = 200
+TARGETS = ("steps", "main")
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--count-posts", type=int, default=1_000)
+    parser.add_argument("--count-authors", type=int, default=100)
+    parser.add_argument("--count-thumbnails", type=int, default=500)
+    parser.add_argument("--change-rate", type=float, default=0.01)
+    parser.add_argument("--count-new-posts", type=int, default=0)
+    parser.add_argument("--count-warm-runs", type=int, default=2)
+    parser.add_argument("--target", choices=TARGETS, default="steps")
+    parser.add_argument("--contentful-requests-per-sec", type=float)
+    parser.add_argument("--notion-requests-per-sec", type=float)
+    parser.add_argument("--logging-function-level")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output")
+    # 子プロセスでワークフローを実行する場合に指定する
+    parser.add_argument("--run", action="store_true", help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_workflow(target=args.target)
+        return
+
+    from tools.stub_servers import (
+        PATH_PREFIX_CONTENTFUL,
+        StubContentful,
+        StubNotion,
+        StubS3,
+        serve_stub_contentful,
+        serve_stub_notion,
+        serve_stub_s3,
+    )
+
+    random = Random(args.seed)
+    stub_contentful = StubContentful(reference_category=REFERENCE_CATEGORY)
+    stub_notion = StubNotion(data_source_id=DATA_SOURCE_ID)
+    stub_s3 = StubS3()
+    counter_start = perf_counter()
+    seed_stubs(
+        stub_contentful=stub_contentful,
+        count_posts=args.count_posts,
+        count_authors=args.count_authors,
+        count_thumbnails=args.count_thumbnails,
+    )
+    print(f"seeded in {perf_counter() - counter_start:.1f}s", file=sys.stderr)
+
+    dir_repo = os.getcwd()
+    runs = []
+    with ExitStack() as stack:
+        dir_tmp = stack.enter_context(TemporaryDirectory())
+        base_url_contentful = stack.enter_context(
+            serve_stub_contentful(stub=stub_contentful)
+        )
+        base_url_notion = stack.enter_context(serve_stub_notion(stub=stub_notion))
+        endpoint_url_s3 = stack.enter_context(serve_stub_s3(stub=stub_s3))
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join(
+                filter(None, [dir_repo, os.environ.get("PYTHONPATH")])
+            ),
+            "CONTENTFUL_TOKEN": "bench",
+            "NOTION_TOKEN": "bench",
+            "NOTION_DATA_SOURCE_ID": DATA_SOURCE_ID,
+            "BUCKET_NAME": BUCKET,
+            "KEY_PREFIX": KEY_PREFIX,
+            "REFERENCE_CATEGORY": REFERENCE_CATEGORY,
+            "BASE_URL_API_CONTENTFUL": base_url_contentful,
+            "BASE_URL_API_NOTION": base_url_notion,
+            "AWS_ENDPOINT_URL_S3": endpoint_url_s3,
+            "AWS_ACCESS_KEY_ID": "bench",
+            "AWS_SECRET_ACCESS_KEY": "bench",
+            "AWS_DEFAULT_REGION": "us-east-1",
+            "ENTITY_CACHE_PATH": os.path.join(dir_tmp, "cache", "entity.sqlite3"),
+            "BENCH_STATS_URLS": orjson.dumps(
+                {
+                    "contentful": base_url_contentful.removesuffix(
+                        PATH_PREFIX_CONTENTFUL
+                    ),
+                    "notion": base_url_notion,
+                    "s3": endpoint_url_s3,
+                }
+            ).decode(),
+        }
+        if args.contentful_requests_per_sec:
+            env["CONTENTFUL_REQUESTS_PER_SEC"] = str(args.contentful_requests_per_sec)
+        if args.notion_requests_per_sec:
+            env["NOTION_REQUESTS_PER_SEC"] = str(args.notion_requests_per_sec)
+        if args.logging_function_level:
+            env["LOGGING_FUNCTION_LEVEL"] = args.logging_function_level
+
+        for index in range(args.count_warm_runs + 1):
+            scenario = "cold" if index == 0 else f"warm-{index}"
+            changes = {}
+            if index > 0:
+                changes = apply_changes(
+                    stub_contentful=stub_contentful,
+                    stub_notion=stub_notion,
+                    change_rate=args.change_rate,
+                    count_new_posts=args.count_new_posts,
+                    count_authors=args.count_authors,
+                    count_thumbnails=args.count_thumbnails,
+                    random=random,
+                )
+            proc = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "tools.benchmarks.bench_e2e",
+                    "--run",
+                    f"--target={args.target}",
+                ],
+                capture_output=True,
+                cwd=dir_tmp,
+                env=env,
+            )
+            if proc.returncode != 0:
+                sys.stderr.write(proc.stderr.decode())
+                raise SystemExit(f"{scenario} failed with exit code {proc.returncode}")
+            result = orjson.loads(proc.stdout.splitlines()[-1])
+            runs.append({"scenario": scenario, "changes": changes, **result})
+            print_run(scenario=scenario, result=result)
+
+    output = {
+        "created_at": datetime.now(tz=timezone.utc).isoformat(),
+        "git_commit": parse_git_commit(dir_repo=dir_repo),
+        "python": platform.python_version(),
+        "parameters": {k: v for k, v in vars(args).items() if k != "run"},
+        "runs": runs,
+    }
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(orjson.dumps(output, option=orjson.OPT_INDENT_2))
+
+
+def create_slug(*, index: int) -> str:
+    return f"post-{index}"
+
+
+def seed_stubs(
+    *,
+    stub_contentful,
+    count_posts: int,
+    count_authors: int,
+    count_thumbnails: int,
+):
+    """記事・著者・サムネイルを投入する
+
+    Notion のページは初回の実行で作成される (master_data が空の場合は全記事分を作成する)。
+    """
+    for i in range(count_authors):
+        stub_contentful.put_author(
+            author_id=f"author-{i}",
+            slug=f"author-{i}",
+            display_name=f"著者 {i}",
+            thumbnail_url=f"https://images.example.com/authors/{i}.png",
+        )
+    for i in range(count_thumbnails):
+        stub_contentful.put_asset(
+            asset_id=f"asset-{i}", url=f"//images.example.com/assets/{i}.png"
+        )
+    for i in range(count_posts):
+        put_post(
+            stub_contentful=stub_contentful,
+            index=i,
+            title=f"記事のタイトル {i}",
+            count_authors=count_authors,
+            count_thumbnails=count_thumbnails,
+        )
+
+
+def put_post(
+    *,
+    stub_contentful,
+    index: int,
+    title: str,
+    count_authors: int,
+    count_thumbnails: int,
+):
+    stub_contentful.put_post(
+        entry_id=f"entry-{index}",
+        slug=create_slug(index=index),
+        title=title,
+        author_id=f"author-{index % count_authors}",
+        thumbnail_id=f"asset-{index % count_thumbnails}",
+    )
+
+
+def apply_changes(
+    *,
+    stub_contentful,
+    stub_notion,
+    change_rate: float,
+    count_new_posts: int,
+    count_authors: int,
+    count_thumbnails: int,
+    random: Random,
+) -> dict:
+    """記事のタイトル変更、Notion でのカテゴリ・タグの設定、記事の追加を行う"""
+    entry_ids = list(stub_contentful.posts)
+    count_changed = round(len(entry_ids) * change_rate)
+    for entry_id in random.sample(entry_ids, k=count_changed):
+        index = int(entry_id.removeprefix("entry-"))
+        put_post(
+            stub_contentful=stub_contentful,
+            index=index,
+            title=f"記事のタイトル {index} (rev {random.randrange(1 << 30)})",
+            count_authors=count_authors,
+            count_thumbnails=count_thumbnails,
+        )
+    # 編集者が Notion でカテゴリ・タグを付けて確定した状態を再現する
+    page_ids = list(stub_notion.pages)
+    for page_id in random.sample(page_ids, k=min(count_changed, len(page_ids))):
+        index_category = random.randrange(COUNT_CATEGORIES)
+        stub_notion.update_page(
+            page_id=page_id,
+            properties={
+                "category": {
+                    "select": {
+                        "id": f"category-{index_category}",
+                        "name": f"カテゴリ {index_category}",
+                    }
+                },
+                "tags": {
+                    "multi_select": [
+                        {"id": f"tag-{x}", "name": f"タグ {x}"}
+                        for x in random.sample(range(COUNT_TAGS), k=3)
+                    ]
+                },
+                "fixed": {"checkbox": True},
+            },
+        )
+    for index in range(len(entry_ids), len(entry_ids) + count_new_posts):
+        put_post(
+            stub_contentful=stub_contentful,
+            index=index,
+            title=f"記事のタイトル {index}",
+            count_authors=count_authors,
+            count_thumbnails=count_thumbnails,
+        )
+    return {
+        "posts_changed": count_changed,
+        "pages_changed": count_changed,
+        "posts_added": count_new_posts,
+    }
+
+
+def fetch_stats(*, stats_urls: dict[str, str]) -> dict[str, dict]:
+    from tools.stub_servers import PATH_STATS
+
+    result = {}
+    for service, base_url in stats_urls.items():
+        with urlopen(f"{base_url}{PATH_STATS}") as resp:
+            result[service] = orjson.loads(resp.read())
+    return result
+
+
+def diff_stats(*, before: dict[str, dict], after: dict[str, dict]) -> dict[str, dict]:
+    result = {}
+    for service, stats_after in after.items():
+        stats_before = before[service]
+        counts_before = stats_before["request_counts"]
+        result[service] = {
+            "request_counts": {
+                k: v - counts_before.get(k, 0)
+                for k, v in stats_after["request_counts"].items()
+                if v - counts_before.get(k, 0) > 0
+            },
+            "bytes_sent": stats_after["bytes_sent"] - stats_before["bytes_sent"],
+            "bytes_received": stats_after["bytes_received"]
+            - stats_before["bytes_received"],
+        }
+    return result
+
+
+def run_workflow(*, target: str):
+    """ベンチマーク用の子プロセスで実行される。結果を1行の JSON で出力する"""
+    from src.utils.rate_limiter import rate_limiter
+
+    stats_urls = orjson.loads(os.environ["BENCH_STATS_URLS"])
+    stages = []
+    stage_timings = []
+
+    def measure(name: str, func):
+        stats_before = fetch_stats(stats_urls=stats_urls)
+        slept_before = dict(rate_limiter.slept_sec)
+        counter_start = perf_counter()
+        result = func()
+        sec = perf_counter() - counter_start
+        stages.append(
+            {
+                "name": name,
+                "sec": sec,
+                "rate_limiter_slept_sec": {
+                    k: v - slept_before.get(k, 0.0)
+                    for k, v in rate_limiter.slept_sec.items()
+                    if v - slept_before.get(k, 0.0) > 0
+                },
+                "services": diff_stats(
+                    before=stats_before, after=fetch_stats(stats_urls=stats_urls)
+                ),
+            }
+        )
+        return result
+
+    if target == "main":
+        import main as module_main
+
+        timings = measure("main", module_main.main)
+        stage_timings = [
+            {**x._asdict(), "duration_sec": x.duration_sec} for x in timings
+        ]
+    else:
+        from src.steps.s01_initialize import step_01_initialize
+        from src.steps.s02_fetch_devio import step_02_fetch_devio
+        from src.steps.s03_fetch_notion import step_03_fetch_notion
+        from src.steps.s04_upload import step_04_upload
+
+        env, master_data, store = measure("step_01_initialize", step_01_initialize)
+        changeset = measure(
+            "step_02_fetch_devio",
+            lambda: step_02_fetch_devio(env=env, master_data=master_data),
+        )
+        changeset = changeset.merge(
+            measure(
+                "step_03_fetch_notion",
+                lambda: step_03_fetch_notion(
+                    env=env, master_data=master_data, changed_post_urls=changeset.posts
+                ),
+            )
+        )
+        measure(
+            "step_04_upload",
+            lambda: step_04_upload(
+                env=env, master_data=master_data, changeset=changeset, store=store
+            ),
+        )
+
+    print(
+        orjson.dumps(
+            {
+                "sec": sum(x["sec"] for x in stages),
+                # Linux の ru_maxrss は KiB 単位
+                "peak_rss_mib": getrusage(RUSAGE_SELF).ru_maxrss / 1024,
+                "stages": stages,
+                # --target main の場合の StepScheduler による段階ごとの実行時間
+                "stage_timings": stage_timings,
+            }
+        ).decode()
+    )
+
+
+def print_run(*, scenario: str, result: dict):
+    print(
+        f"[{scenario}] {result['sec']:.2f}s peak rss {result['peak_rss_mib']:.1f} MiB"
+    )
+    for stage in result["stages"]:
+        requests = ", ".join(
+            f"{service}.{endpoint}={count}"
+            for service, stats in stage["services"].items()
+            for endpoint, count in stats["request_counts"].items()
+        )
+        slept = sum(stage["rate_limiter_slept_sec"].values())
+        print(
+            f"  {stage['name']:<22} {stage['sec']:>8.2f}s slept {slept:>7.2f}s  {requests}"
+        )
+    for timing in result["stage_timings"]:
+        print(
+            f"    {timing['name']:<20} {timing['started_sec']:>8.2f}s -> {timing['finished_sec']:>8.2f}s"
+        )
+
+
+def parse_git_commit(*, dir_repo: str) -> str | None:
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            check=True,
+            capture_output=True,
+            cwd=dir_repo,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return proc.stdout.strip()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""logging_function の計装レベルごとの1呼び出しあたりのオーバーヘッドを計測する
+
+    uv run python -m tools.benchmarks.bench_logging_function
+
+ログは一時ディレクトリの std.log に書き出すため、作業ディレクトリは汚さない。
+"""
+
+import os
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+COUNT_CALLS = 20_000
+LEVELS = ("off", "timing", "sampled", "full")
+
+
+def main():
+    with TemporaryDirectory() as dir_tmp:
+        # create_logger は import 時にカレントディレクトリへ std.log を開くため先に移動する
+        os.chdir(dir_tmp)
+
+        from src.utils.logger import create_logger, logging_function, logging_settings
+        from src.utils.models import Post
+
+        logger = create_logger(__name__)
+
+        def baseline(*, value: int) -> int:
+            return value + 1
+
+        @logging_function(logger)
+        def trivial(*, value: int) -> int:
+            return value + 1
+
+        @logging_function(logger)
+        def large(*, mapping: dict[str, Post]) -> int:
+            return len(mapping)
+
+        mapping = {
+            f"https://example.com/{i}/": Post(
+                url=f"https://example.com/{i}/",
+                title=f"title {i}",
+                author_id="author",
+                thumbnail_id=None,
+                thumbnail_url=None,
+                date="2025.12.01",
+                unixtime=0,
+            )
+            for i in range(3000)
+        }
+
+        sec_baseline = measure(func=lambda: baseline(value=1))
+        print(f"{'level':<8} {'trivial (us/call)':>18} {'3000 posts (us/call)':>21}")
+        for level in LEVELS:
+            logging_settings.logging_function_level = level
+            sec_trivial = measure(func=lambda: trivial(value=1))
+            sec_large = measure(func=lambda: large(mapping=mapping))
+            print(
+                f"{level:<8} {(sec_trivial - sec_baseline) * 1e6:>18.2f} {(sec_large - sec_baseline) * 1e6:>21.2f}"
+            )
+
+
+def measure(*, func, count: int = COUNT_CALLS) -> float:
+    """1呼び出しあたりの秒数"""
+    counter_start = perf_counter()
+    for _ in range(count):
+        func()
+    return (perf_counter() - counter_start) / count
+
+
+if __name__ == "__main__":
+    main()
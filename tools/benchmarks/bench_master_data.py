@@ -0,0 +1,260 @@
+"""master_data の読み込み・書き出しとメモリ使用量を、旧形式・シャード (即時検証・遅延検証・コンパクト) で比較する
+
+    uv run python -m tools.benchmarks.bench_master_data --count-posts 100000
+
+合成した master_data をスタブの S3 に保存したものを一時ディレクトリに書き出し、
+それぞれの方式を別プロセスで実行して以下を計測する。
+- load: 読み込みにかかる時間
+- held: 読み込んだ master_data が保持している Python のメモリ (tracemalloc で計測)
+- load peak: 読み込み中の Python のメモリの最大値 (同上)
+- scan: 全記事の属性を1度ずつ参照する時間 (step_03 の突き合わせに相当)
+- save: 数件の記事を変更して保存し直す時間
+- dump: 全件を JSON に書き出す時間
+- peak rss: プロセスのピークRSS
+
+held と load peak は tracemalloc で遅くならないよう、時間の計測とは別のプロセスで計測する。
+RSS は解放済みのメモリを OS に返さない分を含むため、保持しているメモリの比較には使わない。
+"""
+
+import gc
+import os
+import pickle
+import subprocess
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from resource import RUSAGE_SELF, getrusage
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import orjson
+
+BUCKET = "bench"
+KEY_PREFIX = "bench"
+COUNT_CHANGED_POSTS = 10
+VARIANTS = ("legacy", "eager", "lazy", "compact")
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--count-posts", type=int, default=100_000)
+    parser.add_argument("--count-authors", type=int, default=2_000)
+    parser.add_argument("--variant", choices=VARIANTS)
+    parser.add_argument("--filename")
+    parser.add_argument("--trace-memory", action="store_true")
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args=args)
+        return
+
+    with TemporaryDirectory() as dir_tmp:
+        # create_logger は import 時にカレントディレクトリへ std.log を開くため先に移動する
+        dir_repo = os.getcwd()
+        os.chdir(dir_tmp)
+        filename = os.path.join(dir_tmp, "objects.pickle")
+        generate_objects(
+            filename=filename,
+            count_posts=args.count_posts,
+            count_authors=args.count_authors,
+        )
+        print(
+            f"{'variant':<8} {'load (s)':>9} {'scan (s)':>9} {'save (s)':>9} {'dump (s)':>9} {'held (MiB)':>11} {'load peak (MiB)':>16} {'peak rss (MiB)':>15}"
+        )
+        for variant in VARIANTS:
+            result = {}
+            for options in ([], ["--trace-memory"]):
+                proc = subprocess.run(
+                    [
+                        sys.executable,
+                        "-m",
+                        "tools.benchmarks.bench_master_data",
+                        f"--variant={variant}",
+                        f"--filename={filename}",
+                        *options,
+                    ],
+                    check=True,
+                    capture_output=True,
+                    cwd=dir_tmp,
+                    env={
+                        **os.environ,
+                        "PYTHONPATH": os.pathsep.join(
+                            filter(None, [dir_repo, os.environ.get("PYTHONPATH")])
+                        ),
+                        "LOGGING_FUNCTION_LEVEL": "timing",
+                    },
+                )
+                result.update(orjson.loads(proc.stdout.splitlines()[-1]))
+            print(
+                f"{variant:<8} {result['sec_load']:>9.2f} {result['sec_scan']:>9.2f} {result['sec_save']:>9.2f} {result['sec_dump']:>9.2f} {result['held_mib']:>11.1f} {result['load_peak_mib']:>16.1f} {result['peak_rss_mib']:>15.1f}"
+            )
+
+
+def generate_master_data(*, count_posts: int, count_authors: int):
+    from src.utils.models import Author, MasterData, MetaPost, Post
+
+    master_data = MasterData(
+        categories={f"category-{i}": f"カテゴリ {i}" for i in range(20)},
+        tags={f"tag-{i}": f"タグ {i}" for i in range(200)},
+    )
+    for i in range(count_authors):
+        master_data.authors[f"author-{i}"] = Author(
+            id=f"author-{i}",
+            name=f"著者 {i}",
+            thumbnail_url=f"https://images.example.com/authors/{i}.png",
+            url=f"https://dev.classmethod.jp/author/author-{i}/",
+        )
+    for i in range(count_posts):
+        url = f"https://dev.classmethod.jp/articles/post-{i}/"
+        # 2019年から2025年に分散させる
+        month = i % 84
+        master_data.posts[url] = Post(
+            url=url,
+            title=f"記事のタイトル {i}",
+            author_id=f"author-{i % count_authors}",
+            thumbnail_id=None,
+            thumbnail_url=f"https://images.example.com/posts/{i}.png",
+            date=f"{2019 + month // 12}.{month % 12 + 1:02}.{i % 28 + 1:02}",
+            unixtime=1_546_300_800_000 + i * 1000,
+        )
+        master_data.meta_posts[url] = MetaPost(
+            url=url,
+            notion_id=f"notion-{i}",
+            title=f"記事のタイトル {i}",
+            category=f"category-{i % 20}",
+            tags=[f"tag-{i % 200}", f"tag-{(i * 7) % 200}"],
+            fixed=i % 3 == 0,
+            old_title="",
+            unixtime_ms=1_546_300_800_000 + i * 1000,
+        )
+    return master_data
+
+
+def generate_objects(*, filename: str, count_posts: int, count_authors: int):
+    import compression.zstd as zstd
+
+    from src.utils.master_data_store import MasterDataStore
+    from src.utils.methods import create_key_master_data
+    from src.utils.models import Changeset
+    from tools.stub_servers import StubS3
+
+    master_data = generate_master_data(
+        count_posts=count_posts, count_authors=count_authors
+    )
+    client = StubS3()
+    client.put_object(
+        Body=zstd.compress(orjson.dumps(master_data.model_dump()), level=3),
+        Bucket=BUCKET,
+        Key=create_key_master_data(key_prefix=KEY_PREFIX),
+    )
+    store = MasterDataStore(bucket=BUCKET, key_prefix=KEY_PREFIX, client=client)
+    store.save(master_data=master_data, changeset=Changeset())
+    with open(filename, "wb") as f:
+        pickle.dump(client.objects, f)
+
+
+def run_variant(*, args):
+    import compression.zstd as zstd
+
+    from src.utils.methods import create_key_master_data
+    from src.utils.models import Changeset
+    from tools.stub_servers import StubS3
+
+    client = StubS3()
+    with open(args.filename, "rb") as f:
+        client.objects = pickle.load(f)
+    key_legacy = create_key_master_data(key_prefix=KEY_PREFIX)
+
+    if args.trace_memory:
+        # 読み込み前に確保済みのメモリ (スタブの S3 のオブジェクトなど) は含めない
+        tracemalloc.start()
+        master_data, _ = load_master_data(variant=args.variant, client=client)
+        gc.collect()
+        held, peak = tracemalloc.get_traced_memory()
+        print(
+            orjson.dumps(
+                {"held_mib": held / 1024 / 1024, "load_peak_mib": peak / 1024 / 1024}
+            ).decode()
+        )
+        return
+
+    counter_start = perf_counter()
+    master_data, store = load_master_data(variant=args.variant, client=client)
+    sec_load = perf_counter() - counter_start
+
+    counter_start = perf_counter()
+    for post in master_data.posts.values():
+        post.title, post.author_id
+    sec_scan = perf_counter() - counter_start
+
+    urls_changed = list(master_data.posts)[:COUNT_CHANGED_POSTS]
+    for url in urls_changed:
+        # コンパクトに保持する場合は取り出したモデルが複製なので、どの方式でも代入し直す
+        post = master_data.posts[url]
+        master_data.posts[url] = post.model_copy(
+            update={"title": post.title + " (updated)"}
+        )
+    counter_start = perf_counter()
+    if args.variant == "legacy":
+        client.put_object(
+            Body=zstd.compress(orjson.dumps(master_data.model_dump()), level=3),
+            Bucket=BUCKET,
+            Key=key_legacy,
+        )
+    else:
+        store.save(
+            master_data=master_data, changeset=Changeset(posts=set(urls_changed))
+        )
+    sec_save = perf_counter() - counter_start
+
+    counter_start = perf_counter()
+    if args.variant == "legacy":
+        orjson.dumps(master_data.model_dump())
+    else:
+        store.dump_shards(
+            master_data=master_data,
+            names=set(store.manifest.shards),
+            shard_names_post=store.shard_names_post,
+        )
+    sec_dump = perf_counter() - counter_start
+
+    print(
+        orjson.dumps(
+            {
+                "sec_load": sec_load,
+                "sec_scan": sec_scan,
+                "sec_save": sec_save,
+                "sec_dump": sec_dump,
+                # Linux の ru_maxrss は KiB 単位
+                "peak_rss_mib": getrusage(RUSAGE_SELF).ru_maxrss / 1024,
+            }
+        ).decode()
+    )
+
+
+def load_master_data(*, variant: str, client):
+    """master_data と、旧形式以外の場合は読み込みに使った MasterDataStore を返す"""
+    import compression.zstd as zstd
+
+    from src.utils.master_data_store import MasterDataStore
+    from src.utils.methods import create_key_master_data
+    from src.utils.models import MasterData
+
+    if variant == "legacy":
+        resp = client.get_object(
+            Bucket=BUCKET, Key=create_key_master_data(key_prefix=KEY_PREFIX)
+        )
+        bin_decompressed = zstd.decompress(resp["Body"].read())
+        return MasterData.model_validate(orjson.loads(bin_decompressed)), None
+    store = MasterDataStore(
+        bucket=BUCKET,
+        key_prefix=KEY_PREFIX,
+        client=client,
+        lazy=variant == "lazy",
+        compact=variant == "compact",
+    )
+    return store.load(), store
+
+
+if __name__ == "__main__":
+    main()
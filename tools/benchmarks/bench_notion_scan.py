@@ -0,0 +1,160 @@
+"""Notion のページ一覧の取得 (list_pages) で、1ページあたりの処理時間がページ数に依らないことを確かめる
+
+    uv run python -m tools.benchmarks.bench_notion_scan --count-pages 50000
+
+通信は行わず、メモリ上に生成したページを返すクライアントで list_pages を実行し、
+区間ごとの1ページあたりの処理時間を表示する。比較のため、ページごとにカテゴリ・タグの
+辞書を作り直し、生のページを記録していた旧実装の処理 (legacy) もあわせて計測する。
+ログは一時ディレクトリの std.log に書き出すため、作業ディレクトリは汚さない。
+"""
+
+import os
+from argparse import ArgumentParser
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from types import SimpleNamespace
+
+PAGE_SIZE = 100
+VARIANTS = ("legacy", "current")
+
+
+class InMemoryQuery:
+    """client.data_sources.query と同じ形で、生成済みのページを返す
+
+    ページを返した時刻を記録し、区間ごとの処理時間の計算に使う。
+    """
+
+    pages: list[dict]
+    counters: list[float]
+
+    def __init__(self, *, pages: list[dict]):
+        self.pages = pages
+        self.counters = []
+
+    def __call__(self, *, start_cursor: str | None = None, **kwargs) -> dict:
+        self.counters.append(perf_counter())
+        start = int(start_cursor or 0)
+        has_more = start + PAGE_SIZE < len(self.pages)
+        return {
+            "object": "list",
+            "results": self.pages[start : start + PAGE_SIZE],
+            "has_more": has_more,
+            "next_cursor": str(start + PAGE_SIZE) if has_more else None,
+        }
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--count-pages", type=int, default=50_000)
+    parser.add_argument("--count-categories", type=int, default=200)
+    parser.add_argument("--count-tags", type=int, default=20_000)
+    parser.add_argument("--count-sections", type=int, default=5)
+    parser.add_argument("--logging-function-level", default="timing")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as dir_tmp:
+        # create_logger は import 時にカレントディレクトリへ std.log を開くため先に移動する
+        os.chdir(dir_tmp)
+
+        from src.utils.logger import logging_settings
+
+        logging_settings.logging_function_level = args.logging_function_level
+        pages = generate_pages(
+            count_pages=args.count_pages,
+            count_categories=args.count_categories,
+            count_tags=args.count_tags,
+            seed=args.seed,
+        )
+        size_section = args.count_pages // args.count_sections
+
+        header = " ".join(
+            f"{f'{i * size_section // 1000}k-{(i + 1) * size_section // 1000}k':>10}"
+            for i in range(args.count_sections)
+        )
+        print(f"pages={args.count_pages}, us/page per section")
+        print(f"{'variant':<8} {header} {'total sec':>10}")
+        for variant in VARIANTS:
+            query = InMemoryQuery(pages=pages)
+            counter_start = perf_counter()
+            run_variant(variant=variant, query=query)
+            counter_end = perf_counter()
+
+            # 各区間の先頭のページを返した時刻の差から、区間ごとの処理時間を求める
+            counters = query.counters[:: size_section // PAGE_SIZE]
+            counters = counters[: args.count_sections] + [counter_end]
+            text = " ".join(
+                f"{(b - a) / size_section * 1e6:>10.2f}"
+                for a, b in zip(counters, counters[1:])
+            )
+            print(f"{variant:<8} {text} {counter_end - counter_start:>10.2f}")
+
+
+def run_variant(*, variant: str, query: InMemoryQuery):
+    from src.steps.s03_fetch_notion.s03_fetch_notion import (
+        convert_to_meta_post,
+        list_pages,
+        logger,
+    )
+
+    client = SimpleNamespace(data_sources=SimpleNamespace(query=query))
+    if variant == "current":
+        list_pages(data_source_id="ds", client=client, filter_properties=[])
+        return
+
+    # 旧実装: 生のページを記録し、ページごとにカテゴリ・タグの辞書を作り直す
+    mapping_meta_posts = {}
+    mapping_categories = {}
+    mapping_tags = {}
+    for i in range(0, len(query.pages), PAGE_SIZE):
+        response = query(start_cursor=str(i))
+        for page in response["results"]:
+            logger.debug("fetching page", data={"page": page})
+            c_post, c_mapping_categories, c_mapping_tags = convert_to_meta_post(
+                page=page
+            )
+            mapping_meta_posts[c_post.url] = c_post
+            mapping_categories = {**mapping_categories, **c_mapping_categories}
+            mapping_tags = {**mapping_tags, **c_mapping_tags}
+
+
+def generate_pages(
+    *, count_pages: int, count_categories: int, count_tags: int, seed: int
+) -> list[dict]:
+    from tools.stub_servers.notion import PROPERTY_TYPES, create_text
+
+    random = Random(seed)
+    pages = []
+    for i in range(count_pages):
+        category = random.randrange(count_categories)
+        tags = random.sample(range(count_tags), k=3)
+        properties = {
+            "title": {"title": [create_text(content=f"title {i}")]},
+            "old_title": {"rich_text": [create_text(content=f"title {i}")]},
+            "url": {"url": f"https://dev.classmethod.jp/articles/post-{i}/"},
+            "category": {
+                "select": {"id": f"category-{category}", "name": f"Category {category}"}
+            },
+            "tags": {
+                "multi_select": [{"id": f"tag-{x}", "name": f"Tag {x}"} for x in tags]
+            },
+            "fixed": {"checkbox": False},
+            "unixtime_ms": {"number": i},
+        }
+        pages.append(
+            {
+                "object": "page",
+                "id": f"page-{i}",
+                "last_edited_time": "2025-12-01T00:00:00.000Z",
+                "properties": {
+                    name: {"id": name, "type": PROPERTY_TYPES[name], **value}
+                    for name, value in properties.items()
+                },
+            }
+        )
+    return pages
+
+
+if __name__ == "__main__":
+    main()
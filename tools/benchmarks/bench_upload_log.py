@@ -0,0 +1,133 @@
+"""upload_log の旧実装 (全読み込み + level 22 圧縮) とストリーミング実装を比較する
+
+    uv run python -m tools.benchmarks.bench_upload_log --size-mb 32
+
+合成した未圧縮のログを一時ディレクトリに作り、それぞれの実装を別プロセスで実行して
+処理時間とピークRSSを計測する。アップロード先は読み捨てるだけのクライアントで代用する。
+"""
+
+import os
+import subprocess
+import sys
+from argparse import ArgumentParser
+from io import BytesIO
+from resource import RUSAGE_SELF, getrusage
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import orjson
+
+SIZE_READ = 1024 * 1024
+
+
+class DiscardingS3Client:
+    """upload_fileobj で渡されたストリームを読み切って捨てるだけのクライアント"""
+
+    count_bytes: int = 0
+
+    def upload_fileobj(self, *, Fileobj, Bucket, Key, ExtraArgs=None, Config=None):
+        while chunk := Fileobj.read(SIZE_READ):
+            self.count_bytes += len(chunk)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=32)
+    parser.add_argument("--legacy-level", type=int, default=22)
+    parser.add_argument("--streaming-level", type=int, default=3)
+    parser.add_argument("--variant", choices=("legacy", "streaming"))
+    parser.add_argument("--filename")
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args=args)
+        return
+
+    with TemporaryDirectory() as dir_tmp:
+        filename = os.path.join(dir_tmp, "std.log")
+        generate_log(filename=filename, size=args.size_mb * 1024 * 1024)
+        print(f"{'variant':<10} {'sec':>8} {'peak rss (MiB)':>15} {'output (MiB)':>13}")
+        for variant in ("legacy", "streaming"):
+            proc = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "tools.benchmarks.bench_upload_log",
+                    f"--variant={variant}",
+                    f"--filename={filename}",
+                    f"--legacy-level={args.legacy_level}",
+                    f"--streaming-level={args.streaming_level}",
+                ],
+                check=True,
+                capture_output=True,
+                cwd=dir_tmp,
+                env={
+                    **os.environ,
+                    "PYTHONPATH": os.pathsep.join(
+                        filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])
+                    ),
+                    "LOG_COMPRESSION": "0",
+                },
+            )
+            result = orjson.loads(proc.stdout)
+            print(
+                f"{variant:<10} {result['sec']:>8.2f} {result['peak_rss_mib']:>15.1f} {result['output_mib']:>13.2f}"
+            )
+
+
+def generate_log(*, filename: str, size: int):
+    with open(filename, "wb") as f:
+        index = 0
+        while f.tell() < size:
+            lines = [
+                orjson.dumps(
+                    {
+                        "level": "DEBUG",
+                        "message": "fetching page",
+                        "timestamp": "2025-12-01T00:00:00.000+00:00",
+                        "service": "src.steps.s03_fetch_notion.s03_fetch_notion",
+                        "data": {"page": {"id": f"page-{i}", "index": i}},
+                    }
+                )
+                for i in range(index, index + 1000)
+            ]
+            f.write(b"\n".join(lines) + b"\n")
+            index += 1000
+
+
+def run_variant(*, args):
+    from compression.zstd import compress
+
+    from src.upload_log.upload_log import LogStream
+
+    client = DiscardingS3Client()
+    counter_start = perf_counter()
+    if args.variant == "legacy":
+        with open(args.filename, "rb") as f:
+            binary = f.read()
+        client.upload_fileobj(
+            Fileobj=BytesIO(compress(data=binary, level=args.legacy_level)),
+            Bucket="",
+            Key="",
+        )
+    else:
+        stream = LogStream(
+            filenames=[args.filename], compression_level=args.streaming_level
+        )
+        client.upload_fileobj(Fileobj=stream, Bucket="", Key="")
+    sec = perf_counter() - counter_start
+
+    print(
+        orjson.dumps(
+            {
+                "sec": sec,
+                # Linux の ru_maxrss は KiB 単位
+                "peak_rss_mib": getrusage(RUSAGE_SELF).ru_maxrss / 1024,
+                "output_mib": client.count_bytes / 1024 / 1024,
+            }
+        ).decode()
+    )
+
+
+if __name__ == "__main__":
+    main()
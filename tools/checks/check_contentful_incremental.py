@@ -0,0 +1,186 @@
+"""Contentful のスタブに対して step_02_fetch_devio を実行し、差分取得の挙動を確かめる
+
+    uv run python -m tools.checks.check_contentful_incremental
+
+ネットワークには出ずに、以下を順に確認する (満たさない場合は AssertionError で終了する)。
+- 初回は全件を取得し、最も新しい sys.updatedAt を記録する
+- 2回目以降は記録した時刻を sys.updatedAt[gte] に指定して取得し、
+  同時刻の記事を取得し直しても変更として扱わない
+- 複数ページにわたる差分の取得中に記事が更新されても、記事を取りこぼさない
+- 著者・サムネイルの取得に失敗した場合は記録した時刻を進めず、次回に同じ記事を取得し直す
+- CONTENTFUL_FULL_SCAN を指定した場合は、記録した時刻があっても全件を取得する
+ログとエンティティキャッシュは一時ディレクトリに書き出すため、作業ディレクトリは汚さない。
+"""
+
+import os
+from tempfile import TemporaryDirectory
+
+REFERENCE_CATEGORY = "reinvent"
+PARAM_UPDATED_SINCE = "sys.updatedAt[gte]"
+
+
+def main():
+    with TemporaryDirectory() as dir_tmp:
+        # create_logger は import 時にカレントディレクトリへ std.log を開くため先に移動する
+        os.chdir(dir_tmp)
+
+        from src.utils.models import EnvironmentVariables, MasterData
+        from tools.stub_servers import StubContentful, serve_stub_contentful
+
+        stub = StubContentful(reference_category=REFERENCE_CATEGORY)
+        stub.put_author(author_id="a1", slug="alice", display_name="Alice")
+        stub.put_author(author_id="a2", slug="bob", display_name="Bob")
+        stub.put_asset(asset_id="t1", url="//images.example.com/t1.png")
+        stub.put_post(entry_id="p1", slug="p1", title="P1", author_id="a1")
+        stub.put_post(
+            entry_id="p2", slug="p2", title="P2", author_id="a2", thumbnail_id="t1"
+        )
+        stub.put_post(entry_id="p3", slug="p3", title="P3", author_id="a1")
+
+        with serve_stub_contentful(stub=stub) as base_url:
+            env = EnvironmentVariables(
+                contentful_token="check",
+                notion_token="check",
+                notion_data_source_id="check",
+                bucket_name="check",
+                key_prefix="check",
+                reference_category=REFERENCE_CATEGORY,
+                base_url_api_contentful=base_url,
+                contentful_requests_per_sec=1000,
+                contentful_full_scan=False,
+                entity_cache_path=os.path.join(dir_tmp, "cache", "entity.sqlite3"),
+            )
+            master_data = MasterData()
+            check_first_run(stub=stub, env=env, master_data=master_data)
+            check_updated_since(stub=stub, env=env, master_data=master_data)
+            check_failed_authors(stub=stub, env=env, master_data=master_data)
+            check_full_scan(stub=stub, env=env, master_data=master_data)
+            check_updated_during_scan(stub=stub, env=env, master_data=master_data)
+
+
+def run(*, stub, env, master_data) -> tuple:
+    """step_02_fetch_devio を実行し、(変更内容, 記事の取得で送ったクエリの一覧) を返す"""
+    from src.steps.s02_fetch_devio import step_02_fetch_devio
+
+    stub.posts_queries.clear()
+    changeset = step_02_fetch_devio(env=env, master_data=master_data)
+    return changeset, list(stub.posts_queries)
+
+
+def create_post_url(*, slug: str) -> str:
+    return f"https://dev.classmethod.jp/articles/{slug}/"
+
+
+def parse_updated_at(*, stub, entry_id: str) -> str:
+    return stub.posts[entry_id]["sys"]["updatedAt"]
+
+
+def check_first_run(*, stub, env, master_data):
+    changeset, (query,) = run(stub=stub, env=env, master_data=master_data)
+    assert PARAM_UPDATED_SINCE not in query, query
+    assert changeset.posts == {create_post_url(slug=x) for x in ("p1", "p2", "p3")}
+    assert master_data.authors.keys() == {"a1", "a2"}
+    assert master_data.thumbnails.keys() == {"t1"}
+    assert master_data.contentful_updated_at == parse_updated_at(
+        stub=stub, entry_id="p3"
+    )
+    print("ok: first run fetches all posts and records the newest sys.updatedAt")
+
+
+def check_updated_since(*, stub, env, master_data):
+    watermark = master_data.contentful_updated_at
+    stub.put_post(entry_id="p2", slug="p2", title="P2 (updated)", author_id="a2")
+    changeset, (query,) = run(stub=stub, env=env, master_data=master_data)
+    assert query.get(PARAM_UPDATED_SINCE) == watermark, query
+    assert query.get("order") == "sys.updatedAt,sys.id", query
+    # p3 は記録した時刻と同時刻なので取得し直されるが、内容が同じなので変更にはならない
+    refetched = {
+        x["sys"]["id"]
+        for x in stub.posts.values()
+        if x["sys"]["updatedAt"] >= watermark
+    }
+    assert refetched == {"p2", "p3"}, refetched
+    assert changeset.posts == {create_post_url(slug="p2")}, changeset.posts
+    assert master_data.posts[create_post_url(slug="p2")].title == "P2 (updated)"
+    assert master_data.contentful_updated_at == parse_updated_at(
+        stub=stub, entry_id="p2"
+    )
+    print("ok: later runs fetch posts updated since the watermark (gte)")
+
+
+def check_failed_authors(*, stub, env, master_data):
+    watermark = master_data.contentful_updated_at
+    stub.put_author(author_id="a3", slug="carol", display_name="Carol")
+    stub.put_post(entry_id="p4", slug="p4", title="P4", author_id="a3")
+
+    # 失敗した実行の master_data は保存されないので、複製に対して実行する
+    master_data_failed = master_data.model_copy(deep=True)
+    stub.failing_endpoints.add("authors")
+    try:
+        run(stub=stub, env=env, master_data=master_data_failed)
+    except Exception:
+        pass
+    else:
+        raise AssertionError("fetching authors should fail")
+    finally:
+        stub.failing_endpoints.clear()
+    # 記事は反映済みでも、著者を反映できていないので時刻は進めない
+    assert create_post_url(slug="p4") in master_data_failed.posts
+    assert master_data_failed.contentful_updated_at == watermark
+
+    changeset, (query,) = run(stub=stub, env=env, master_data=master_data)
+    assert query.get(PARAM_UPDATED_SINCE) == watermark, query
+    assert create_post_url(slug="p4") in changeset.posts, changeset.posts
+    assert "a3" in changeset.authors, changeset.authors
+    assert master_data.contentful_updated_at == parse_updated_at(
+        stub=stub, entry_id="p4"
+    )
+    print("ok: the watermark advances only after authors and thumbnails are applied")
+
+
+def check_full_scan(*, stub, env, master_data):
+    watermark = master_data.contentful_updated_at
+    changeset, (query,) = run(
+        stub=stub,
+        env=env.model_copy(update={"contentful_full_scan": True}),
+        master_data=master_data,
+    )
+    assert PARAM_UPDATED_SINCE not in query, query
+    assert "order" not in query, query
+    assert not changeset.posts, changeset.posts
+    assert master_data.contentful_updated_at == watermark
+    print("ok: CONTENTFUL_FULL_SCAN forces a full scan")
+
+
+def check_updated_during_scan(*, stub, env, master_data):
+    from src.steps.s02_fetch_devio.s02_fetch_devio import LIMIT_POSTS
+
+    watermark = master_data.contentful_updated_at
+    entry_ids = [f"m{i}" for i in range(LIMIT_POSTS * 2 + 50)]
+    for entry_id in entry_ids:
+        stub.put_post(entry_id=entry_id, slug=entry_id, title=entry_id, author_id="a1")
+
+    # 1ページ目を返した直後に、そのページの記事を更新して末尾へ移す
+    # (skip で読み進めると、以降の位置が1つずつずれて記事を取りこぼす)
+    def update_first_page(params: dict[str, str]):
+        stub.on_query_posts = None
+        stub.put_post(entry_id="m10", slug="m10", title="m10 (updated)", author_id="a1")
+
+    stub.on_query_posts = update_first_page
+    try:
+        changeset, queries = run(stub=stub, env=env, master_data=master_data)
+    finally:
+        stub.on_query_posts = None
+    assert len(queries) > 1, queries
+    assert queries[0].get(PARAM_UPDATED_SINCE) == watermark, queries[0]
+    missing = {create_post_url(slug=x) for x in entry_ids} - changeset.posts
+    assert not missing, sorted(missing)
+    assert master_data.posts[create_post_url(slug="m10")].title == "m10 (updated)"
+    assert master_data.contentful_updated_at == parse_updated_at(
+        stub=stub, entry_id="m10"
+    )
+    print("ok: posts updated during a multi-page scan are not skipped")
+
+
+if __name__ == "__main__":
+    main()
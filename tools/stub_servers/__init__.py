@@ -0,0 +1,15 @@
+from .contentful import PATH_PREFIX as PATH_PREFIX_CONTENTFUL
+from .contentful import PATH_STATS, StubContentful, serve_stub_contentful
+from .notion import StubNotion, serve_stub_notion
+from .s3 import StubS3, serve_stub_s3
+
+__all__ = [
+    "PATH_PREFIX_CONTENTFUL",
+    "PATH_STATS",
+    "StubContentful",
+    "serve_stub_contentful",
+    "StubNotion",
+    "serve_stub_notion",
+    "StubS3",
+    "serve_stub_s3",
+]
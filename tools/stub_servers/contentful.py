@@ -0,0 +1,255 @@
+"""ローカルで動作する Contentful のスタブサーバー
+
+step_02_fetch_devio が使うエンドポイントだけを実装しており、
+ネットワークに出ずに差分取得などの挙動を確認するために使う。
+
+    stub = StubContentful(reference_category="reinvent")
+    stub.put_author(author_id="a1", slug="alice", display_name="Alice")
+    stub.put_post(entry_id="p1", slug="hello", title="Hello", author_id="a1")
+    with serve_stub_contentful(stub=stub) as base_url:
+        ...  # BASE_URL_API_CONTENTFUL に base_url を指定して実行する
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Callable, Iterator
+from urllib.parse import parse_qs, urlsplit
+
+import orjson
+
+PATH_PREFIX = "/spaces/stub"
+PATH_STATS = "/__stats"  # ベンチマークがリクエスト数などを取得するためのパス
+
+
+class StubContentful:
+    reference_category: str
+    posts: dict[str, dict]  # key: entry id
+    authors: dict[str, dict]  # key: entry id
+    assets: dict[str, dict]  # key: asset id
+    request_counts: Counter[str]  # key: endpoint (posts / authors / assets)
+    posts_queries: list[dict[str, str]]  # 記事の取得で受け取ったクエリ (受け取った順)
+    failing_endpoints: set[str]  # 403 を返すエンドポイント (取得の失敗を再現する)
+    # 記事の一覧を返した後に呼ぶ関数 (取得の途中で記事が更新される場合を再現する)
+    on_query_posts: Callable[[dict[str, str]], None] | None
+    bytes_received: int  # クライアントへ返したレスポンスボディの bytes
+    dt_clock: datetime
+    lock: Lock
+
+    def __init__(self, *, reference_category: str):
+        self.reference_category = reference_category
+        self.posts = {}
+        self.authors = {}
+        self.assets = {}
+        self.request_counts = Counter()
+        self.posts_queries = []
+        self.failing_endpoints = set()
+        self.on_query_posts = None
+        self.bytes_received = 0
+        self.dt_clock = datetime(2025, 12, 1, tzinfo=timezone.utc)
+        self.lock = Lock()
+
+    def tick(self) -> str:
+        # sys.updatedAt が必ず単調増加するよう、呼ばれるたびに1秒進める
+        self.dt_clock += timedelta(seconds=1)
+        return self.dt_clock.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+    def put_post(
+        self,
+        *,
+        entry_id: str,
+        slug: str,
+        title: str,
+        author_id: str,
+        thumbnail_id: str | None = None,
+        wp_thumbnail: str | None = None,
+    ) -> dict:
+        with self.lock:
+            dt_text = self.tick()
+            prev = self.posts.get(entry_id)
+            fields = {
+                "slug": {"en-US": slug},
+                "title": {"en-US": title},
+                "author": {"en-US": {"sys": {"id": author_id}}},
+                "referenceCategory": {
+                    "en-US": {"sys": {"id": self.reference_category}}
+                },
+            }
+            if thumbnail_id:
+                fields["thumbnail"] = {"en-US": {"sys": {"id": thumbnail_id}}}
+            if wp_thumbnail:
+                fields["wpThumbnail"] = {"en-US": wp_thumbnail}
+            item = {
+                "sys": {
+                    "id": entry_id,
+                    "firstPublishedAt": (
+                        prev["sys"]["firstPublishedAt"] if prev else dt_text
+                    ),
+                    "updatedAt": dt_text,
+                },
+                "fields": fields,
+            }
+            self.posts[entry_id] = item
+            return item
+
+    def put_author(
+        self,
+        *,
+        author_id: str,
+        slug: str,
+        display_name: str,
+        thumbnail_url: str | None = None,
+    ) -> dict:
+        with self.lock:
+            fields = {
+                "slug": {"en-US": slug},
+                "displayName": {"en-US": display_name},
+            }
+            if thumbnail_url:
+                fields["thumbnail"] = {"en-US": thumbnail_url}
+            item = {
+                "sys": {"id": author_id, "updatedAt": self.tick()},
+                "fields": fields,
+            }
+            self.authors[author_id] = item
+            return item
+
+    def put_asset(self, *, asset_id: str, url: str) -> dict:
+        with self.lock:
+            item = {
+                "sys": {"id": asset_id, "updatedAt": self.tick()},
+                "fields": {"file": {"en-US": {"url": url}}},
+            }
+            self.assets[asset_id] = item
+            return item
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "request_counts": dict(self.request_counts),
+                "bytes_sent": 0,
+                "bytes_received": self.bytes_received,
+            }
+
+    def query_posts(self, *, params: dict[str, str]) -> dict:
+        with self.lock:
+            self.posts_queries.append(params)
+            items = [
+                x
+                for x in self.posts.values()
+                if x["fields"]["referenceCategory"]["en-US"]["sys"]["id"]
+                == params.get("fields.referenceCategory.en-US.sys.id")
+            ]
+        if updated_since := params.get("sys.updatedAt[gte]"):
+            items = [x for x in items if x["sys"]["updatedAt"] >= updated_since]
+        if order := params.get("order"):
+            # 対応するのは sys.updatedAt と sys.id の昇順のみ
+            fields = [x.removeprefix("sys.") for x in order.split(",")]
+            items.sort(key=lambda x: tuple(x["sys"][f] for f in fields))
+        payload = paginate(items=items, params=params)
+        if self.on_query_posts is not None:
+            self.on_query_posts(params)
+        return payload
+
+    def query_authors(self, *, params: dict[str, str]) -> dict:
+        with self.lock:
+            items = [
+                self.authors[x] for x in parse_ids(params=params) if x in self.authors
+            ]
+        return paginate(items=items, params=params)
+
+    def query_assets(self, *, params: dict[str, str]) -> dict:
+        with self.lock:
+            items = [
+                self.assets[x] for x in parse_ids(params=params) if x in self.assets
+            ]
+        return paginate(items=items, params=params)
+
+
+def parse_ids(*, params: dict[str, str]) -> list[str]:
+    text = params.get("sys.id[in]", "")
+    return [x for x in text.split(",") if x]
+
+
+def paginate(*, items: list[dict], params: dict[str, str]) -> dict:
+    skip = int(params.get("skip", 0))
+    limit = int(params.get("limit", 100))
+    return {
+        "total": len(items),
+        "skip": skip,
+        "limit": limit,
+        "items": items[skip : skip + limit],
+    }
+
+
+def create_handler(*, stub: StubContentful) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == PATH_STATS:
+                body = orjson.dumps(stub.get_stats())
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            split = urlsplit(self.path)
+            params = {k: v[0] for k, v in parse_qs(split.query).items()}
+            path = split.path.removeprefix(PATH_PREFIX)
+
+            if path == "/public/entries":
+                endpoint, payload = "posts", stub.query_posts(params=params)
+            elif path == "/entries" and params.get("content_type") == "authorProfile":
+                endpoint, payload = "authors", stub.query_authors(params=params)
+            elif path == "/assets":
+                endpoint, payload = "assets", stub.query_assets(params=params)
+            else:
+                self.send_error(404)
+                return
+            if endpoint in stub.failing_endpoints:
+                # 再試行されないステータスで失敗させる
+                self.send_error(403)
+                return
+
+            body = orjson.dumps(payload)
+            etag = f'"{sha256(body).hexdigest()}"'
+            is_not_modified = self.headers.get("If-None-Match") == etag
+            with stub.lock:
+                stub.request_counts[endpoint] += 1
+                if not is_not_modified:
+                    stub.bytes_received += len(body)
+            if is_not_modified:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@contextmanager
+def serve_stub_contentful(*, stub: StubContentful) -> Iterator[str]:
+    """スタブサーバーを起動し、BASE_URL_API_CONTENTFUL として使えるURLを返す"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), create_handler(stub=stub))
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address[:2]
+        yield f"http://{host}:{port}{PATH_PREFIX}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
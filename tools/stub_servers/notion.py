@@ -0,0 +1,269 @@
+"""ローカルで動作する Notion API のスタブサーバー
+
+step_03_fetch_notion が使うエンドポイント (データソースの取得・クエリ、ページの作成・更新)
+だけを実装しており、ネットワークに出ずに挙動や性能を確認するために使う。
+
+    stub = StubNotion(data_source_id="ds")
+    stub.put_page(url="https://dev.classmethod.jp/articles/hello/", title="Hello")
+    with serve_stub_notion(stub=stub) as base_url:
+        ...  # BASE_URL_API_NOTION に base_url を指定して実行する
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Iterator
+from urllib.parse import parse_qs, urlsplit
+from uuid import uuid4
+
+import orjson
+
+PROPERTY_TYPES = {
+    "title": "title",
+    "old_title": "rich_text",
+    "url": "url",
+    "category": "select",
+    "tags": "multi_select",
+    "fixed": "checkbox",
+    "unixtime_ms": "number",
+}
+PATH_STATS = "/__stats"  # ベンチマークがリクエスト数などを取得するためのパス
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 100
+
+
+class StubNotion:
+    data_source_id: str
+    pages: dict[str, dict]  # key: page id (作成順)
+    request_counts: Counter[str]  # key: endpoint (retrieve / query / create / update)
+    bytes_sent: int  # クライアントから送られたリクエストボディの bytes
+    bytes_received: int  # クライアントへ返したレスポンスボディの bytes
+    dt_clock: datetime
+    lock: Lock
+
+    def __init__(self, *, data_source_id: str):
+        self.data_source_id = data_source_id
+        self.pages = {}
+        self.request_counts = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.dt_clock = datetime(2025, 12, 1, tzinfo=timezone.utc)
+        self.lock = Lock()
+
+    def tick(self) -> str:
+        # Notion と同じく last_edited_time は分単位に丸める
+        self.dt_clock += timedelta(seconds=1)
+        return self.dt_clock.strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+    def put_page(
+        self,
+        *,
+        url: str,
+        title: str,
+        old_title: str | None = None,
+        unixtime_ms: int = 0,
+        category: tuple[str, str] | None = None,  # (id, name)
+        tags: list[tuple[str, str]] | None = None,  # [(id, name)]
+        fixed: bool = False,
+    ) -> dict:
+        properties = {
+            "title": {"title": [create_text(content=title)]},
+            "old_title": {"rich_text": [create_text(content=old_title or title)]},
+            "url": {"url": url},
+            "category": {
+                "select": (
+                    {"id": category[0], "name": category[1]} if category else None
+                )
+            },
+            "tags": {"multi_select": [{"id": i, "name": n} for i, n in tags or []]},
+            "fixed": {"checkbox": fixed},
+            "unixtime_ms": {"number": unixtime_ms},
+        }
+        with self.lock:
+            page_id = str(uuid4())
+            page = {
+                "object": "page",
+                "id": page_id,
+                "last_edited_time": self.tick(),
+                "parent": {"data_source_id": self.data_source_id},
+                "properties": {
+                    name: {"id": name, "type": PROPERTY_TYPES[name], **value}
+                    for name, value in properties.items()
+                },
+            }
+            self.pages[page_id] = page
+            return page
+
+    def update_page(self, *, page_id: str, properties: dict) -> dict | None:
+        with self.lock:
+            page = self.pages.get(page_id)
+            if page is None:
+                return None
+            for name, value in properties.items():
+                page["properties"][name].update(convert_property(value=value))
+            page["last_edited_time"] = self.tick()
+            return page
+
+    def create_page(self, *, properties: dict) -> dict:
+        converted = {
+            name: convert_property(value=value) for name, value in properties.items()
+        }
+        page = self.put_page(
+            url=converted["url"]["url"],
+            title=converted["title"]["title"][0]["plain_text"],
+            old_title=converted["old_title"]["rich_text"][0]["plain_text"],
+            unixtime_ms=converted["unixtime_ms"]["number"],
+        )
+        return page
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "request_counts": dict(self.request_counts),
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+            }
+
+    def retrieve_data_source(self) -> dict:
+        return {
+            "object": "data_source",
+            "id": self.data_source_id,
+            "properties": {
+                name: {"id": name, "name": name, "type": type_}
+                for name, type_ in PROPERTY_TYPES.items()
+            },
+        }
+
+    def query(self, *, body: dict, filter_properties: list[str]) -> dict:
+        with self.lock:
+            pages = list(self.pages.values())
+        if condition := body.get("filter"):
+            edited_since = condition["last_edited_time"]["on_or_after"]
+            pages = [x for x in pages if x["last_edited_time"] >= edited_since]
+
+        start = int(body.get("start_cursor") or 0)
+        size = min(int(body.get("page_size") or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+        results = pages[start : start + size]
+        if filter_properties:
+            results = [
+                {
+                    **x,
+                    "properties": {
+                        k: v
+                        for k, v in x["properties"].items()
+                        if v["id"] in filter_properties
+                    },
+                }
+                for x in results
+            ]
+        has_more = start + size < len(pages)
+        return {
+            "object": "list",
+            "results": results,
+            "has_more": has_more,
+            "next_cursor": str(start + size) if has_more else None,
+        }
+
+
+def create_text(*, content: str) -> dict:
+    return {"type": "text", "text": {"content": content}, "plain_text": content}
+
+
+def convert_property(*, value: dict) -> dict:
+    """リクエストのプロパティ値をレスポンスの形式にする (テキストに plain_text を付ける)"""
+    result = {}
+    for type_, v in value.items():
+        if type_ in ("title", "rich_text"):
+            result[type_] = [create_text(content=x["text"]["content"]) for x in v]
+        else:
+            result[type_] = v
+    return result
+
+
+def create_handler(*, stub: StubNotion) -> type[BaseHTTPRequestHandler]:
+    prefix_data_source = f"/v1/data_sources/{stub.data_source_id}"
+
+    class Handler(BaseHTTPRequestHandler):
+        # notion-client (httpx) は keep-alive で接続を使い回す
+        protocol_version = "HTTP/1.1"
+
+        def read_body(self) -> dict:
+            length = int(self.headers.get("Content-Length", 0))
+            binary = self.rfile.read(length) if length else b""
+            with stub.lock:
+                stub.bytes_sent += len(binary)
+            return orjson.loads(binary) if binary else {}
+
+        def send_json(self, *, endpoint: str, payload: dict | None):
+            if payload is None:
+                self.send_error(404)
+                return
+            body = orjson.dumps(payload)
+            with stub.lock:
+                stub.request_counts[endpoint] += 1
+                stub.bytes_received += len(body)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == PATH_STATS:
+                body = orjson.dumps(stub.get_stats())
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif urlsplit(self.path).path == prefix_data_source:
+                self.send_json(endpoint="retrieve", payload=stub.retrieve_data_source())
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            split = urlsplit(self.path)
+            body = self.read_body()
+            if split.path == f"{prefix_data_source}/query":
+                filter_properties = parse_qs(split.query).get("filter_properties", [])
+                payload = stub.query(body=body, filter_properties=filter_properties)
+                self.send_json(endpoint="query", payload=payload)
+            elif split.path == "/v1/pages":
+                payload = stub.create_page(properties=body["properties"])
+                self.send_json(endpoint="create", payload=payload)
+            else:
+                self.send_error(404)
+
+        def do_PATCH(self):
+            path = urlsplit(self.path).path
+            body = self.read_body()
+            if path.startswith("/v1/pages/"):
+                payload = stub.update_page(
+                    page_id=path.removeprefix("/v1/pages/"),
+                    properties=body.get("properties", {}),
+                )
+                self.send_json(endpoint="update", payload=payload)
+            else:
+                self.send_error(404)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@contextmanager
+def serve_stub_notion(*, stub: StubNotion) -> Iterator[str]:
+    """スタブサーバーを起動し、BASE_URL_API_NOTION として使えるURLを返す"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), create_handler(stub=stub))
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address[:2]
+        yield f"http://{host}:{port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
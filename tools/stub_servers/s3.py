@@ -0,0 +1,303 @@
+"""メモリ上で動作する S3 のスタブ
+
+boto3 の S3 クライアントのうち、このリポジトリで使う操作だけを実装している。
+client_s3 を受け取る関数にそのまま渡すか、serve_stub_s3 で HTTP サーバーとして起動し
+AWS_ENDPOINT_URL_S3 に指定して boto3 のクライアントから使う。
+
+    stub = StubS3()
+    master_data = MasterDataStore(bucket="b", key_prefix="k", client=stub).load()
+
+    with serve_stub_s3(stub=stub) as endpoint_url:
+        ...  # AWS_ENDPOINT_URL_S3 に endpoint_url を指定して実行する
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from hashlib import md5
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from threading import Lock, Thread
+from typing import Iterator
+from urllib.parse import parse_qs, unquote, urlsplit
+from uuid import uuid4
+
+import orjson
+from botocore.exceptions import ClientError
+
+SIZE_READ = 1024 * 1024
+PATH_STATS = "/__stats"  # ベンチマークがリクエスト数などを取得するためのパス
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+class StubS3:
+    class exceptions:
+        NoSuchKey = NoSuchKey
+
+    objects: dict[tuple[str, str], bytes]  # key: (bucket, key)
+    uploads: dict[str, dict[int, bytes]]  # key: upload id, value: パート番号ごとの内容
+    request_counts: Counter[str]  # key: 操作名 (GetObject など)
+    bytes_sent: int  # クライアントからアップロードされた bytes
+    bytes_received: int  # クライアントがダウンロードした bytes
+    lock: Lock
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.request_counts = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.lock = Lock()
+
+    @staticmethod
+    def calculate_etag(binary: bytes) -> str:
+        return f'"{md5(binary).hexdigest()}"'
+
+    def get_object(self, *, Bucket: str, Key: str, **kwargs) -> dict:
+        with self.lock:
+            self.request_counts["GetObject"] += 1
+            binary = self.objects.get((Bucket, Key))
+            if binary is None:
+                raise NoSuchKey(Key)
+            self.bytes_received += len(binary)
+        return {"Body": BytesIO(binary), "ETag": self.calculate_etag(binary)}
+
+    def put_object(
+        self,
+        *,
+        Body: bytes,
+        Bucket: str,
+        Key: str,
+        IfMatch: str | None = None,
+        IfNoneMatch: str | None = None,
+        **kwargs,
+    ) -> dict:
+        with self.lock:
+            self.request_counts["PutObject"] += 1
+            self.bytes_sent += len(Body)
+            current = self.objects.get((Bucket, Key))
+            if (IfNoneMatch == "*" and current is not None) or (
+                IfMatch is not None
+                and (current is None or self.calculate_etag(current) != IfMatch)
+            ):
+                raise ClientError(
+                    {"Error": {"Code": "PreconditionFailed"}}, "PutObject"
+                )
+            self.objects[(Bucket, Key)] = bytes(Body)
+        return {"ETag": self.calculate_etag(Body)}
+
+    def upload_fileobj(
+        self, *, Fileobj, Bucket: str, Key: str, ExtraArgs=None, Config=None
+    ):
+        chunks = []
+        while chunk := Fileobj.read(SIZE_READ):
+            chunks.append(chunk)
+        self.put_object(Body=b"".join(chunks), Bucket=Bucket, Key=Key)
+
+    def delete_object(self, *, Bucket: str, Key: str, **kwargs) -> dict:
+        with self.lock:
+            self.request_counts["DeleteObject"] += 1
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "request_counts": dict(self.request_counts),
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+            }
+
+    def create_multipart_upload(self) -> str:
+        with self.lock:
+            self.request_counts["CreateMultipartUpload"] += 1
+            upload_id = str(uuid4())
+            self.uploads[upload_id] = {}
+            return upload_id
+
+    def upload_part(self, *, upload_id: str, part_number: int, binary: bytes) -> str:
+        with self.lock:
+            self.request_counts["UploadPart"] += 1
+            self.bytes_sent += len(binary)
+            self.uploads[upload_id][part_number] = binary
+        return self.calculate_etag(binary)
+
+    def complete_multipart_upload(
+        self, *, upload_id: str, bucket: str, key: str
+    ) -> str:
+        with self.lock:
+            self.request_counts["CompleteMultipartUpload"] += 1
+            parts = self.uploads.pop(upload_id)
+            binary = b"".join(parts[x] for x in sorted(parts))
+            self.objects[(bucket, key)] = binary
+        return self.calculate_etag(binary)
+
+
+def decode_aws_chunked(*, binary: bytes) -> bytes:
+    """aws-chunked (チェックサムのトレーラー付き) で送られたボディを元に戻す"""
+    result = []
+    position = 0
+    while True:
+        end = binary.index(b"\r\n", position)
+        size = int(binary[position:end].split(b";")[0], 16)
+        if size == 0:
+            return b"".join(result)
+        result.append(binary[end + 2 : end + 2 + size])
+        position = end + 2 + size + 2
+
+
+def create_error_body(*, code: str) -> bytes:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f"<Error><Code>{code}</Code><Message>{code}</Message></Error>"
+    ).encode()
+
+
+def create_handler(*, stub: StubS3) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def parse_target(self) -> tuple[str, str, dict[str, str]]:
+            # path-style (/bucket/key) のみ対応する
+            split = urlsplit(self.path)
+            bucket, _, key = unquote(split.path).lstrip("/").partition("/")
+            params = {
+                k: v[0]
+                for k, v in parse_qs(split.query, keep_blank_values=True).items()
+            }
+            return bucket, key, params
+
+        def read_body(self) -> bytes:
+            if self.headers.get("Transfer-Encoding") == "chunked":
+                chunks = []
+                while True:
+                    size = int(self.rfile.readline().split(b";")[0], 16)
+                    if size == 0:
+                        # トレーラーを読み捨てる
+                        while self.rfile.readline() not in (b"\r\n", b""):
+                            pass
+                        break
+                    chunks.append(self.rfile.read(size))
+                    self.rfile.readline()
+                binary = b"".join(chunks)
+            else:
+                binary = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if "aws-chunked" in self.headers.get("Content-Encoding", ""):
+                binary = decode_aws_chunked(binary=binary)
+            return binary
+
+        def send(self, *, status: int, body: bytes = b"", headers: dict | None = None):
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_s3_error(self, *, status: int, code: str):
+            self.send(
+                status=status,
+                body=create_error_body(code=code),
+                headers={"Content-Type": "application/xml"},
+            )
+
+        def do_GET(self):
+            if self.path == PATH_STATS:
+                body = orjson.dumps(stub.get_stats())
+                self.send(
+                    status=200, body=body, headers={"Content-Type": "application/json"}
+                )
+                return
+            bucket, key, _ = self.parse_target()
+            try:
+                resp = stub.get_object(Bucket=bucket, Key=key)
+            except NoSuchKey:
+                self.send_s3_error(status=404, code="NoSuchKey")
+                return
+            self.send(
+                status=200, body=resp["Body"].read(), headers={"ETag": resp["ETag"]}
+            )
+
+        def do_PUT(self):
+            bucket, key, params = self.parse_target()
+            binary = self.read_body()
+            if "uploadId" in params:
+                etag = stub.upload_part(
+                    upload_id=params["uploadId"],
+                    part_number=int(params["partNumber"]),
+                    binary=binary,
+                )
+                self.send(status=200, headers={"ETag": etag})
+                return
+            try:
+                resp = stub.put_object(
+                    Body=binary,
+                    Bucket=bucket,
+                    Key=key,
+                    IfMatch=self.headers.get("If-Match"),
+                    IfNoneMatch=self.headers.get("If-None-Match"),
+                )
+            except ClientError:
+                self.send_s3_error(status=412, code="PreconditionFailed")
+                return
+            self.send(status=200, headers={"ETag": resp["ETag"]})
+
+        def do_POST(self):
+            bucket, key, params = self.parse_target()
+            self.read_body()
+            if "uploads" in params:
+                upload_id = stub.create_multipart_upload()
+                body = (
+                    "<InitiateMultipartUploadResult>"
+                    f"<Bucket>{bucket}</Bucket><Key>{key}</Key>"
+                    f"<UploadId>{upload_id}</UploadId>"
+                    "</InitiateMultipartUploadResult>"
+                )
+            elif "uploadId" in params:
+                etag = stub.complete_multipart_upload(
+                    upload_id=params["uploadId"], bucket=bucket, key=key
+                )
+                body = (
+                    "<CompleteMultipartUploadResult>"
+                    f"<Bucket>{bucket}</Bucket><Key>{key}</Key><ETag>{etag}</ETag>"
+                    "</CompleteMultipartUploadResult>"
+                )
+            else:
+                self.send_s3_error(status=400, code="InvalidRequest")
+                return
+            self.send(
+                status=200,
+                body=body.encode(),
+                headers={"Content-Type": "application/xml"},
+            )
+
+        def do_DELETE(self):
+            bucket, key, params = self.parse_target()
+            if "uploadId" in params:
+                with stub.lock:
+                    stub.uploads.pop(params["uploadId"], None)
+            else:
+                stub.delete_object(Bucket=bucket, Key=key)
+            self.send(status=204)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@contextmanager
+def serve_stub_s3(*, stub: StubS3) -> Iterator[str]:
+    """スタブサーバーを起動し、AWS_ENDPOINT_URL_S3 として使えるURLを返す"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), create_handler(stub=stub))
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address[:2]
+        yield f"http://{host}:{port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()